@@ -0,0 +1,149 @@
+"""Body size limits and admission control for expensive routes.
+
+Both are plain ASGI middleware so they act before FastAPI reads the body:
+BodySizeLimitMiddleware rejects a request as soon as its Content-Length or
+the bytes received so far exceed the route's limit, and
+ConcurrencyLimitMiddleware caps how many upload requests run at once, so a
+burst of large uploads cannot take the memory and CPU the catalog routes
+need. Requests over the cap wait in a short queue; when the queue is full
+they get 429, and when they wait too long they get 503, both with
+Retry-After.
+"""
+
+import asyncio
+import json
+from typing import Dict, Optional, Set, Tuple
+
+from fastapi import HTTPException
+
+Route = Tuple[str, str]  # (method, path)
+
+
+class BodyTooLarge(HTTPException):
+    def __init__(self, limit: int):
+        super().__init__(status_code=413, detail=f"Request body is larger than {limit} bytes")
+
+
+async def send_error(send, status: int, detail: str, headers: Optional[Dict[str, str]] = None) -> None:
+    body = json.dumps({"detail": detail}).encode()
+    raw_headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    for name, value in (headers or {}).items():
+        raw_headers.append((name.lower().encode(), value.encode()))
+    await send({"type": "http.response.start", "status": status, "headers": raw_headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+class BodySizeLimitMiddleware:
+    def __init__(self, app, default_limit: int, route_limits: Optional[Dict[Route, int]] = None):
+        self.app = app
+        self.default_limit = default_limit
+        self.route_limits = route_limits or {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        limit = self.route_limits.get((scope["method"], scope["path"]), self.default_limit)
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length and content_length.isdigit() and int(content_length) > limit:
+            error = BodyTooLarge(limit)
+            await send_error(send, error.status_code, error.detail)
+            return
+
+        received = 0
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # FastAPI re-raises HTTPExceptions from body parsing, so this becomes a 413
+                    raise BodyTooLarge(limit)
+            return message
+
+        async def tracking_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except BodyTooLarge as error:
+            # Read outside FastAPI's body parsing (e.g. a raw request.stream())
+            if response_started:
+                raise
+            await send_error(send, error.status_code, error.detail)
+
+
+class ConcurrencyLimiter:
+    def __init__(self, limit: int, queue_size: int, queue_timeout: float, retry_after: int = 1):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so it belongs to the serving event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        return self._semaphore
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+
+class ConcurrencyLimitMiddleware:
+    def __init__(self, app, limiter: ConcurrencyLimiter, routes: Set[Route]):
+        self.app = app
+        self.limiter = limiter
+        self.routes = routes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (scope["method"], scope["path"]) not in self.routes:
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.limiter
+        retry_after = {"Retry-After": str(limiter.retry_after)}
+        if limiter.semaphore.locked():
+            if limiter.waiting >= limiter.queue_size:
+                limiter.rejected += 1
+                await send_error(send, 429, "Too many uploads in progress, retry shortly", retry_after)
+                return
+            limiter.waiting += 1
+            try:
+                await asyncio.wait_for(limiter.semaphore.acquire(), limiter.queue_timeout)
+            except asyncio.TimeoutError:
+                limiter.timed_out += 1
+                await send_error(send, 503, "Server is busy, retry shortly", retry_after)
+                return
+            finally:
+                limiter.waiting -= 1
+        else:
+            await limiter.semaphore.acquire()
+
+        limiter.admitted += 1
+        limiter.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.in_flight -= 1
+            limiter.semaphore.release()
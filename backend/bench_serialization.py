@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Serialization benchmark for the list routes.
+
+Seeds an embedded store (see embedded_store.py) in a temporary directory
+and calls the server's own GET /api/coloring-pages and GET /api/artworks
+in-process, once with Pydantic models and once with FAST_SERIALIZATION.
+The catalog cache is cleared before every request so each one renders its
+body. Reports requests/sec, the time the routes spent in to_models and
+encode_json per request (from the response_serialization_seconds
+histogram), the peak memory allocated per request, and checks that both
+modes return the same body:
+
+    python bench_serialization.py
+    python bench_serialization.py --sizes 100 500 --duration 5
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import tempfile
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+from typing import List
+
+import httpx
+
+import server
+from blob_store import create_blob_store
+from embedded_store import EmbeddedClient
+
+SVG = "<svg xmlns='http://www.w3.org/2000/svg' viewBox='0 0 300 300'>" + "<circle cx='150' cy='120' r='60' fill='none' stroke='black' stroke-width='3'/>" * 12 + "</svg>"
+USER_ID = "çocuk_123"
+MODES = {"models": False, "fast": True}
+
+
+def make_documents(kind: str, count: int) -> List[dict]:
+    start = datetime(2024, 1, 1)
+    if kind == "coloring_pages":
+        return [{
+            "id": str(uuid.uuid4()),
+            "name": f"Sayfa {n}",
+            "category": "animals",
+            "difficulty": "medium",
+            "svg_content": SVG,
+            "thumbnail": None,
+            "created_at": start + timedelta(seconds=n, milliseconds=123),
+        } for n in range(count)]
+    docs = [{
+        "id": str(uuid.uuid4()),
+        "user_id": USER_ID,
+        "coloring_page_id": str(uuid.uuid4()),
+        "artwork_data": None,
+        "image_hash": uuid.uuid4().hex * 2,
+        "image_size": 180000,
+        "content_type": "image/png",
+        "thumbnail": f"/api/thumbnails/{uuid.uuid4().hex}",
+        "completed_at": start + timedelta(seconds=n, milliseconds=456),
+        "title": "Benim Güzel Kedim",
+        "format": "image",
+    } for n in range(count)]
+    # Saved before format and the stroke fields existed
+    for doc in docs[::2]:
+        del doc["format"]
+    return docs
+
+
+def serialization_seconds(mode: str) -> float:
+    total = 0.0
+    for stage in ("validate", "encode"):
+        series = server.metrics.serialization_duration.series.get((stage, mode))
+        if series is not None:
+            total += series[-1]
+    return total
+
+
+async def get(client: httpx.AsyncClient, url: str) -> httpx.Response:
+    # Catalog routes would otherwise serve the cached body after the first request
+    server.catalog_cache.invalidate()
+    response = await client.get(url)
+    response.raise_for_status()
+    return response
+
+
+async def throughput(client: httpx.AsyncClient, url: str, mode: str, duration: float):
+    requests = 0
+    serialized = serialization_seconds(mode)
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        await get(client, url)
+        requests += 1
+    rps = requests / (time.perf_counter() - start)
+    return rps, (serialization_seconds(mode) - serialized) / requests
+
+
+async def peak_allocation(client: httpx.AsyncClient, url: str, repeat: int = 3) -> int:
+    peaks = []
+    for _ in range(repeat):
+        tracemalloc.start()
+        await get(client, url)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return min(peaks)
+
+
+async def run(sizes: List[int], duration: float) -> None:
+    limit = min(max(sizes), server.MAX_PAGE_LIMIT)
+    server.db = EmbeddedClient(tempfile.mkdtemp(prefix="bench-serialization-"))["bench"]
+    server.blob_store = create_blob_store(server.db)
+    await server.ensure_indexes(server.db)
+    for kind in ("coloring_pages", "user_artworks"):
+        await server.db[kind].insert_many(make_documents(kind, limit))
+
+    routes = {"coloring_pages": "/api/coloring-pages", "user_artworks": f"/api/artworks?user_id={USER_ID}"}
+    print(f"{'route':<22}{'docs':>6}  {'path':<7}{'req/s':>9}{'serialize ms':>14}{'peak KiB/req':>14}{'bytes':>10}")
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for size in sizes:
+            size = min(size, server.MAX_PAGE_LIMIT)
+            for kind, route in routes.items():
+                url = f"{route}{'&' if '?' in route else '?'}limit={size}"
+                results, bodies = {}, {}
+                for mode, fast in MODES.items():
+                    server.FAST_SERIALIZATION = fast
+                    bodies[mode] = (await get(client, url)).content
+                    rps, seconds = await throughput(client, url, mode, duration)
+                    peak = await peak_allocation(client, url)
+                    results[mode] = rps
+                    print(f"{kind:<22}{size:>6}  {mode:<7}{rps:>9.1f}{seconds * 1000:>14.2f}"
+                          f"{peak / 1024:>14.1f}{len(bodies[mode]):>10}")
+                same = "same body" if json.loads(bodies["models"]) == json.loads(bodies["fast"]) else "BODIES DIFFER"
+                print(f"{'':<30}speedup {results['fast'] / results['models']:.2f}x, {same}")
+    server.FAST_SERIALIZATION = False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 500],
+                        help=f"documents per page (at most {server.MAX_PAGE_LIMIT})")
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds per measurement")
+    args = parser.parse_args()
+    # server configures INFO logging on import; one line per request would drown the table
+    logging.getLogger().setLevel(logging.WARNING)
+    asyncio.run(run(args.sizes, args.duration))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Deferred garbage collection for shared artwork blobs.
+
+Blobs are shared by content hash, so deleting an artwork can only delete
+its image and thumbnail once nothing else refers to them, and a save of
+the same image can be racing the delete: the blob store sees the blob
+already there and skips writing it, but the new artwork document is not
+in Mongo yet. Deleting the blob straight away would leave that artwork
+pointing at nothing.
+
+Instead, an unreferenced blob gets a tombstone in the blob_gc collection,
+due `delay` seconds later. A sweeper in every worker claims due
+tombstones one by one (find_one_and_delete, so only one worker handles
+each), checks references again and only then deletes the blob. The
+delay gives in-flight saves, including write-behind batches, time to
+land. For a save that lands during the sweep itself, the blob is read
+before it is deleted and put back if a reference shows up afterwards;
+savers check that their blob still exists once their document is
+visible, which covers the other ordering.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Iterable, Optional
+
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+
+class BlobCollector:
+    def __init__(self, delay: float = 300, interval: float = 60, batch: int = 100):
+        self.delay = delay
+        self.interval = interval
+        self.batch = batch
+        self.collection = None
+        self.blob_store = None
+        self.is_referenced: Optional[Callable[[str], Awaitable[bool]]] = None
+        self.task: Optional[asyncio.Task] = None
+        self.scheduled = 0
+        self.deleted = 0
+        self.kept = 0
+        self.restored = 0
+
+    def start(self, collection, blob_store, is_referenced: Callable[[str], Awaitable[bool]]) -> None:
+        """Start sweeping ``collection``'s due tombstones every ``interval`` seconds.
+
+        ``is_referenced(blob_hash)`` tells whether any artwork still uses a blob.
+        """
+        self.collection = collection
+        self.blob_store = blob_store
+        self.is_referenced = is_referenced
+        if self.interval > 0:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def schedule(self, blob_hashes: Iterable[str]) -> None:
+        """Mark blobs for deletion once the delay has passed."""
+        due_at = datetime.utcnow() + timedelta(seconds=self.delay)
+        for blob_hash in blob_hashes:
+            # A later release pushes the deadline back
+            await self.collection.update_one({"hash": blob_hash}, {"$set": {"due_at": due_at}}, upsert=True)
+            self.scheduled += 1
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep()
+            except PyMongoError:
+                logger.exception("Blob sweep failed")
+
+    async def sweep(self) -> int:
+        """Collect up to ``batch`` due tombstones; returns how many blobs were deleted."""
+        deleted = 0
+        for _ in range(self.batch):
+            tombstone = await self.collection.find_one_and_delete(
+                {"due_at": {"$lte": datetime.utcnow()}}, {"_id": 0, "hash": 1}, sort=[("due_at", 1)]
+            )
+            if tombstone is None:
+                break
+            if await self._collect(tombstone["hash"]):
+                deleted += 1
+        return deleted
+
+    async def _collect(self, blob_hash: str) -> bool:
+        if await self.is_referenced(blob_hash):
+            self.kept += 1
+            return False
+        chunks = await self.blob_store.open(blob_hash)
+        if chunks is None:
+            return False
+        data = b"".join([chunk async for chunk in chunks])
+        await self.blob_store.delete(blob_hash)
+        # A save that found the blob just before the delete is visible by now
+        if await self.is_referenced(blob_hash):
+            await self.blob_store.put_bytes(data)
+            self.restored += 1
+            return False
+        self.deleted += 1
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "scheduled": self.scheduled,
+            "deleted": self.deleted,
+            "kept": self.kept,
+            "restored": self.restored,
+        }
@@ -0,0 +1,164 @@
+"""Content-addressed storage for artwork images.
+
+Blobs are keyed by the sha256 of their bytes, so saving the same image twice
+only stores it once. Two backends are available: a plain directory tree
+(default) and MongoDB GridFS for deployments without a shared disk.
+"""
+
+import asyncio
+import hashlib
+import os
+import uuid
+from pathlib import Path
+from typing import AsyncIterator, NamedTuple, Optional
+
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from gridfs.errors import NoFile
+
+
+BLOB_CHUNK_SIZE = 64 * 1024
+
+
+class BlobInfo(NamedTuple):
+    hash: str
+    size: int
+
+
+async def iter_upload(upload, chunk_size: int = BLOB_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Yield an UploadFile's content in chunks without reading it all at once."""
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+class FileSystemBlobStore:
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.tmp_dir = self.root / 'tmp'
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, blob_hash: str) -> Path:
+        return self.root / blob_hash[:2] / blob_hash[2:4] / blob_hash
+
+    async def put_stream(self, chunks: AsyncIterator[bytes]) -> BlobInfo:
+        """Write chunks to a temp file while hashing, then move it into place."""
+        digest = hashlib.sha256()
+        size = 0
+        tmp_path = self.tmp_dir / uuid.uuid4().hex
+        f = await asyncio.to_thread(open, tmp_path, 'wb')
+        try:
+            async for chunk in chunks:
+                digest.update(chunk)
+                size += len(chunk)
+                await asyncio.to_thread(f.write, chunk)
+        except BaseException:
+            await asyncio.to_thread(f.close)
+            tmp_path.unlink(missing_ok=True)
+            raise
+        await asyncio.to_thread(f.close)
+
+        blob_hash = digest.hexdigest()
+        path = self._path(blob_hash)
+        if path.exists():
+            tmp_path.unlink(missing_ok=True)
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_path, path)
+        return BlobInfo(blob_hash, size)
+
+    async def put_bytes(self, data: bytes) -> BlobInfo:
+        async def one_chunk():
+            yield data
+        return await self.put_stream(one_chunk())
+
+    async def exists(self, blob_hash: str) -> bool:
+        return self._path(blob_hash).exists()
+
+    async def open(self, blob_hash: str) -> Optional[AsyncIterator[bytes]]:
+        """Return an async chunk iterator over the blob, or None if missing."""
+        path = self._path(blob_hash)
+        if not path.exists():
+            return None
+
+        async def reader():
+            f = await asyncio.to_thread(open, path, 'rb')
+            try:
+                while True:
+                    chunk = await asyncio.to_thread(f.read, BLOB_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+            finally:
+                await asyncio.to_thread(f.close)
+        return reader()
+
+    async def delete(self, blob_hash: str) -> None:
+        self._path(blob_hash).unlink(missing_ok=True)
+
+
+class GridFSBlobStore:
+    def __init__(self, db, bucket_name: str = 'artwork_blobs'):
+        self.bucket = AsyncIOMotorGridFSBucket(db, bucket_name=bucket_name)
+        self.files = db[f'{bucket_name}.files']
+
+    async def put_stream(self, chunks: AsyncIterator[bytes]) -> BlobInfo:
+        """Upload under a temporary name, then rename to the content hash.
+
+        The hash is only known once the last chunk has arrived, so a duplicate
+        upload is discarded after the fact instead of being stored twice.
+        """
+        digest = hashlib.sha256()
+        size = 0
+        grid_in = self.bucket.open_upload_stream(f'tmp-{uuid.uuid4().hex}')
+        try:
+            async for chunk in chunks:
+                digest.update(chunk)
+                size += len(chunk)
+                await grid_in.write(chunk)
+        except BaseException:
+            await grid_in.abort()
+            raise
+        await grid_in.close()
+
+        blob_hash = digest.hexdigest()
+        if await self.files.find_one({'filename': blob_hash}, {'_id': 1}):
+            await self.bucket.delete(grid_in._id)
+        else:
+            await self.bucket.rename(grid_in._id, blob_hash)
+        return BlobInfo(blob_hash, size)
+
+    async def put_bytes(self, data: bytes) -> BlobInfo:
+        async def one_chunk():
+            yield data
+        return await self.put_stream(one_chunk())
+
+    async def exists(self, blob_hash: str) -> bool:
+        return await self.files.find_one({'filename': blob_hash}, {'_id': 1}) is not None
+
+    async def open(self, blob_hash: str) -> Optional[AsyncIterator[bytes]]:
+        try:
+            grid_out = await self.bucket.open_download_stream_by_name(blob_hash)
+        except NoFile:
+            return None
+
+        async def reader():
+            while True:
+                chunk = await grid_out.readchunk()
+                if not chunk:
+                    break
+                yield chunk
+        return reader()
+
+    async def delete(self, blob_hash: str) -> None:
+        async for f in self.files.find({'filename': blob_hash}, {'_id': 1}):
+            await self.bucket.delete(f['_id'])
+
+
+def create_blob_store(db):
+    backend = os.environ.get('BLOB_STORE', 'filesystem')
+    if backend == 'gridfs':
+        return GridFSBlobStore(db)
+    root = os.environ.get('BLOB_STORE_PATH', str(Path(__file__).parent / 'blobs'))
+    return FileSystemBlobStore(Path(root))
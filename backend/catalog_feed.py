@@ -0,0 +1,177 @@
+"""Catalog change feed fanned out to Server-Sent Events clients.
+
+One CatalogFeed per worker process watches for coloring page and sticker
+changes and broadcasts each one to every connected client through a small
+per-client queue, so the database sees one watcher however many clients
+are listening. The watcher is a MongoDB change stream, which also picks up
+writes made by other workers. Where change streams are unavailable
+(standalone mongod, mongomock) the feed falls back to the events the
+routes publish locally, which only covers writes made in this process.
+
+Recent events are kept in a ring buffer so a reconnecting EventSource can
+resume from its Last-Event-ID; a client that fell too far behind is told
+to reload instead. When the worker starts draining every stream is ended,
+so EventSource reconnects to another worker instead of holding this one's
+shutdown up until the streams time out.
+"""
+
+import asyncio
+import logging
+import uuid
+from collections import deque
+from typing import Callable, List, Optional
+
+import fast_json
+
+logger = logging.getLogger(__name__)
+
+# collection -> event type sent to clients
+WATCHED_COLLECTIONS = {"coloring_pages": "page", "stickers": "sticker"}
+# Seconds before reopening a lost change stream, and before probing again
+# where change streams were never available
+CHANGE_STREAM_RETRY_DELAY = 5.0
+CHANGE_STREAM_PROBE_DELAY = 60.0
+
+
+class CatalogFeed:
+    def __init__(self, history: int = 256, client_queue_size: int = 64):
+        self.client_queue_size = client_queue_size
+        self.history: deque = deque(maxlen=history)
+        self.subscribers = set()
+        # Event ids are "<epoch>:<n>"; another worker's (or a restarted one's) ids never match
+        self.epoch = uuid.uuid4().hex[:8]
+        self.last_id = 0
+        self.watching = False
+        self.dropped_clients = 0
+        self.on_change: Optional[Callable] = None
+        self.closing = False
+        self.tasks: List[asyncio.Task] = []
+
+    def start(self, db, on_change: Optional[Callable] = None, stopping: Optional[asyncio.Event] = None) -> None:
+        """Start the change stream watcher.
+
+        ``on_change(kind, op, doc)`` runs for every change the stream reports.
+        Once ``stopping`` is set, open streams are ended and new ones end
+        straight away.
+        """
+        self.on_change = on_change
+        self.closing = False
+        self.tasks = [asyncio.create_task(self._watch(db))]
+        if stopping is not None:
+            self.tasks.append(asyncio.create_task(self._close_when(stopping)))
+
+    async def stop(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self.tasks = []
+        self.close_streams()
+
+    def close_streams(self) -> None:
+        """End every open stream; EventSource reconnects to another worker."""
+        self.closing = True
+        for queue in list(self.subscribers):
+            self._close(queue)
+
+    async def _close_when(self, stopping: asyncio.Event) -> None:
+        await stopping.wait()
+        if self.subscribers:
+            logger.info("Ending %d catalog streams for shutdown", len(self.subscribers))
+        self.close_streams()
+
+    def publish_local(self, kind: str, op: str, doc: dict) -> None:
+        """Publish a change made by this process unless the change stream will report it."""
+        if not self.watching:
+            self._broadcast(kind, op, doc)
+
+    def subscribe(self, last_event_id: Optional[str] = None):
+        """Register a client; returns its queue and the events it missed.
+
+        Missed events are None when ``last_event_id`` is from another
+        process or older than the history, in which case the client has to
+        reload the catalog.
+        """
+        queue = asyncio.Queue(maxsize=self.client_queue_size)
+        if self.closing:
+            queue.put_nowait(None)
+            return queue, []
+        self.subscribers.add(queue)
+        if last_event_id is None:
+            return queue, []
+        epoch, _, number = last_event_id.partition(":")
+        if epoch != self.epoch or not number.isdigit():
+            return queue, None
+        number = int(number)
+        if number >= self.last_id:
+            return queue, []
+        missed = [event for event in self.history if event[0] > number]
+        if not missed or missed[0][0] != number + 1:
+            return queue, None
+        return queue, missed
+
+    def event_id(self, number: int) -> str:
+        return f"{self.epoch}:{number}"
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self.subscribers.discard(queue)
+
+    def _broadcast(self, kind: str, op: str, doc: dict) -> None:
+        doc = {key: value for key, value in doc.items() if key != "_id"}
+        self.last_id += 1
+        event = (self.last_id, kind, fast_json.dumps({"op": op, "doc": doc}).decode())
+        self.history.append(event)
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # A client this far behind resumes from Last-Event-ID or reloads
+                self.dropped_clients += 1
+                self._close(queue)
+
+    def _close(self, queue: asyncio.Queue) -> None:
+        self.subscribers.discard(queue)
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    async def _watch(self, db) -> None:
+        pipeline = [{"$match": {
+            "ns.coll": {"$in": list(WATCHED_COLLECTIONS)},
+            "operationType": {"$in": ["insert", "update", "replace"]},
+        }}]
+        reported = False
+        while True:
+            try:
+                async with db.watch(pipeline, full_document="updateLookup") as stream:
+                    self.watching = True
+                    logger.info("Catalog feed is following the change stream")
+                    async for change in stream:
+                        doc = change.get("fullDocument")
+                        if doc is None:
+                            continue
+                        kind = WATCHED_COLLECTIONS[change["ns"]["coll"]]
+                        op = "insert" if change["operationType"] == "insert" else "update"
+                        self._broadcast(kind, op, doc)
+                        if self.on_change is not None:
+                            self.on_change(kind, op, doc)
+            except Exception as e:
+                # Standalone servers reject $changeStream; keep serving local events
+                if self.watching:
+                    logger.warning("Catalog change stream lost, retrying: %s", e)
+                elif not reported:
+                    logger.info("Change streams unavailable, catalog feed uses local events: %s", e)
+                reported = True
+            lost = self.watching
+            self.watching = False
+            await asyncio.sleep(CHANGE_STREAM_RETRY_DELAY if lost else CHANGE_STREAM_PROBE_DELAY)
+
+    def stats(self) -> dict:
+        return {
+            "clients": len(self.subscribers),
+            "last_event_id": self.last_id,
+            "change_stream": self.watching,
+            "dropped_clients": self.dropped_clients,
+        }
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""Stream coloring pages and stickers into the catalog from NDJSON bundles.
+
+A bundle has one JSON object per line, each with a "type" of "page" or
+"sticker" and the fields of the matching create model:
+
+    {"type": "page", "name": "Kedi", "category": "animals", "difficulty": "easy", "svg_content": "<svg ...>"}
+    {"type": "sticker", "id": "star", "name": "Yıldız", "category": "shapes", "svg_content": "<svg ...>"}
+
+Bundles may be gzipped; they are decompressed and parsed as they stream
+in, so memory use stays flat however large the bundle is. Records are
+upserted by id (derived from category, difficulty and name when missing)
+in bounded batches by server.import_catalog:
+
+    python catalog_import.py bundle.ndjson.gz [--keep-existing]
+
+The same import is served at POST /api/catalog/import.
+"""
+
+import asyncio
+import json
+import zlib
+from typing import AsyncIterator, Tuple, Union
+
+IMPORT_CHUNK_SIZE = 64 * 1024
+# Longer lines are reported and skipped instead of being buffered
+MAX_IMPORT_LINE_BYTES = 1024 * 1024
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+async def decompress_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Gunzip chunks if the stream starts with the gzip magic, else pass them through.
+
+    Output is produced in pieces of at most IMPORT_CHUNK_SIZE bytes, so a
+    highly compressed chunk cannot expand all at once.
+    """
+    decompressor = None
+    async for chunk in chunks:
+        if decompressor is None:
+            if not chunk:
+                continue
+            if not chunk.startswith(GZIP_MAGIC):
+                yield chunk
+                async for rest in chunks:
+                    yield rest
+                return
+            decompressor = zlib.decompressobj(wbits=31)
+        data = chunk
+        while data:
+            piece = decompressor.decompress(data, IMPORT_CHUNK_SIZE)
+            if piece:
+                yield piece
+            if decompressor.unconsumed_tail:
+                data = decompressor.unconsumed_tail
+            elif decompressor.eof:
+                # Concatenated gzip members (e.g. from `cat a.gz b.gz`)
+                data = decompressor.unused_data
+                decompressor = zlib.decompressobj(wbits=31)
+            else:
+                data = b''
+    if decompressor is not None:
+        tail = decompressor.flush()
+        if tail:
+            yield tail
+
+
+async def read_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Union[dict, str]]]:
+    """Yield ``(line_number, record)`` for every non-blank line.
+
+    Lines that are not a JSON object come back with an error message
+    instead of a record, so the caller can report them and carry on.
+    """
+    buffer = bytearray()
+    line_number = 0
+    skipping = False  # inside a line that was too long
+
+    def parse(line: bytes) -> Union[dict, str]:
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            return f"invalid JSON: {e}"
+        if not isinstance(record, dict):
+            return "line is not a JSON object"
+        return record
+
+    async for chunk in decompress_chunks(chunks):
+        buffer += chunk
+        start = 0
+        while True:
+            end = buffer.find(b'\n', start)
+            if end == -1:
+                break
+            line_number += 1
+            line = bytes(buffer[start:end]).strip()
+            start = end + 1
+            if skipping:
+                skipping = False
+                continue
+            if line:
+                yield line_number, parse(line)
+        del buffer[:start]
+        if len(buffer) > MAX_IMPORT_LINE_BYTES:
+            if not skipping:
+                yield line_number + 1, f"line is longer than {MAX_IMPORT_LINE_BYTES} bytes"
+                skipping = True
+            buffer.clear()
+
+    line = bytes(buffer).strip()
+    if line and not skipping:
+        yield line_number + 1, parse(line)
+
+
+async def iter_file(path, chunk_size: int = IMPORT_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Yield a file's content in chunks, reading it off the event loop."""
+    f = await asyncio.to_thread(open, path, 'rb')
+    try:
+        while True:
+            chunk = await asyncio.to_thread(f.read, chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        await asyncio.to_thread(f.close)
+
+
+def main():
+    import sys
+    import server
+
+    args = sys.argv[1:]
+    keep_existing = '--keep-existing' in args
+    paths = [arg for arg in args if arg != '--keep-existing']
+    if len(paths) != 1:
+        print("usage: python catalog_import.py BUNDLE.ndjson[.gz] [--keep-existing]")
+        sys.exit(2)
+
+    def report(progress: dict) -> None:
+        print(
+            f"\r📦 line {progress['lines']}: "
+            f"{progress['pages']['inserted']} pages and {progress['stickers']['inserted']} stickers added, "
+            f"{progress['pages']['updated'] + progress['stickers']['updated']} updated, "
+            f"{progress['error_count']} errors",
+            end='', flush=True,
+        )
+
+    async def run():
+        client = server.create_client()
+        db = client[server.db_name]
+        try:
+            await server.ensure_indexes(db)
+            result = await server.import_catalog(
+                db, read_ndjson(iter_file(paths[0])), overwrite=not keep_existing, on_progress=report,
+            )
+        finally:
+            client.close()
+        print()
+        for error in result.errors:
+            print(f"  line {error.line}: {error.error}")
+        if result.error_count > len(result.errors):
+            print(f"  ... and {result.error_count - len(result.errors)} more errors")
+        # The API's thumbnail worker is not running here
+        print("🖼️  Run `python thumbnails.py backfill` to render thumbnails for new pages")
+        sys.exit(1 if result.error_count else 0)
+
+    asyncio.run(run())
+
+
+if __name__ == '__main__':
+    main()
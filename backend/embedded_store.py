@@ -0,0 +1,748 @@
+"""Embedded document store on SQLite for single-node installs without MongoDB.
+
+With STORAGE_BACKEND=sqlite, server.create_client returns an EmbeddedClient
+instead of a Motor client. It implements the part of Motor's client,
+database, collection and cursor API that the routes use:
+
+- filters with equality, $in/$nin, $ne, $gt/$gte/$lt/$lte, $exists and
+  $or/$and on top-level or dotted fields
+- projections, sort, skip, limit and batched cursors
+- $set, $unset, $inc, $setOnInsert and $push (with $each/$position/$slice)
+  updates, with upsert
+- insert_many and bulk_write with per-document errors, find_one_and_update
+- unique (with null keys equal, as in Mongo), sparse and TTL indexes
+
+The routes therefore run unchanged on either engine. Equality on array
+elements, aggregation and change streams are not supported; anything
+outside the subset raises OperationFailure, as a server would. The catalog
+feed falls back to local events, as it does on a standalone mongod.
+
+Each collection is a table of JSON documents. Filters and sorts compile
+to SQL over json_extract(doc, '$."field"'), and create_indexes turns each
+IndexModel into an expression index over the same expressions, so
+SQLite's planner uses the indexes that Mongo would.
+
+The database runs in WAL mode, so readers never wait for the writer.
+Writes go through a single writer thread, which makes read-modify-write
+updates atomic; reads run on a small pool of connections. Datetimes and
+bytes are stored as tagged strings so they round-trip with their types,
+and datetimes sort correctly.
+"""
+
+import asyncio
+import base64
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Seconds between sweeps of expired documents in TTL-indexed collections,
+# matching mongod's TTL monitor
+TTL_SWEEP_INTERVAL = 60.0
+# Seconds a connection waits for another process's write lock
+BUSY_TIMEOUT = 5.0
+MAX_IDLE_READERS = 8
+DEFAULT_BATCH_SIZE = 100
+
+_NAME_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+_FIELD_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z0-9_]+)*$')
+
+# Prefix of strings that stand for a non-JSON value: D datetime, B bytes,
+# S a stored string that itself started with the prefix
+_TAG = '\ue000'
+# Stands in for null in unique indexes; encode_value never produces it
+_NULL_KEY = _TAG + 'N'
+
+
+def encode_value(value: Any) -> Any:
+    if isinstance(value, str):
+        return _TAG + 'S' + value if value.startswith(_TAG) else value
+    if isinstance(value, dict):
+        return {key: encode_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [encode_value(item) for item in value]
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        # Fixed width, so stored datetimes compare and sort as strings
+        return _TAG + 'D' + value.isoformat(timespec='microseconds')
+    if isinstance(value, (bytes, bytearray)):
+        return _TAG + 'B' + base64.b64encode(value).decode('ascii')
+    if isinstance(value, ObjectId):
+        return str(value)
+    return value
+
+
+def decode_value(value: Any) -> Any:
+    if isinstance(value, str):
+        if not value.startswith(_TAG):
+            return value
+        kind, rest = value[1:2], value[2:]
+        if kind == 'D':
+            return datetime.fromisoformat(rest)
+        if kind == 'B':
+            return base64.b64decode(rest)
+        return rest
+    if isinstance(value, dict):
+        return {key: decode_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [decode_value(item) for item in value]
+    return value
+
+
+def dumps(doc: dict) -> str:
+    doc = encode_value(doc)
+    if orjson is not None:
+        return orjson.dumps(doc).decode('utf-8')
+    return json.dumps(doc, ensure_ascii=False, separators=(',', ':'))
+
+
+def loads(text: str) -> dict:
+    return decode_value(orjson.loads(text) if orjson is not None else json.loads(text))
+
+
+def quote_name(name: str) -> str:
+    if not _NAME_RE.match(name):
+        raise ValueError(f'Unsupported collection or index name {name!r}')
+    return f'"{name}"'
+
+
+def json_path(field: str) -> str:
+    if not _FIELD_RE.match(field):
+        raise OperationFailure(f'Unsupported field name {field!r}', code=2)
+    return "'$." + '.'.join(f'"{part}"' for part in field.split('.')) + "'"
+
+
+def field_expr(field: str) -> str:
+    return f'json_extract(doc, {json_path(field)})'
+
+
+def compile_filter(query: Optional[dict]) -> Tuple[str, list]:
+    """Translate a Mongo filter into a SQL condition and its parameters."""
+    clauses: List[str] = []
+    params: list = []
+    for key, condition in (query or {}).items():
+        if key in ('$or', '$and'):
+            parts = [compile_filter(sub) for sub in condition]
+            if not parts:
+                raise OperationFailure(f'{key} needs a non-empty array')
+            joiner = ' OR ' if key == '$or' else ' AND '
+            clauses.append('(' + joiner.join(sql for sql, _ in parts) + ')')
+            for _, sub_params in parts:
+                params.extend(sub_params)
+        elif key.startswith('$'):
+            raise OperationFailure(f'Unsupported query operator {key}', code=2)
+        elif isinstance(condition, dict) and condition and all(op.startswith('$') for op in condition):
+            for op, value in condition.items():
+                sql, op_params = compile_operator(key, op, value)
+                clauses.append(sql)
+                params.extend(op_params)
+        else:
+            sql, op_params = compile_operator(key, '$eq', condition)
+            clauses.append(sql)
+            params.extend(op_params)
+    return (' AND '.join(clauses) or '1'), params
+
+
+def compile_operator(field: str, op: str, value: Any) -> Tuple[str, list]:
+    expr = field_expr(field)
+    if op in ('$eq', '$ne'):
+        if isinstance(value, (dict, list)):
+            raise OperationFailure('Equality on documents and arrays is not supported', code=2)
+        if value is None:
+            # Like Mongo, null matches missing fields too
+            return f'{expr} IS {"NOT " if op == "$ne" else ""}NULL', []
+        if op == '$eq':
+            return f'{expr} = ?', [encode_value(value)]
+        return f'({expr} IS NULL OR {expr} != ?)', [encode_value(value)]
+    if op in ('$in', '$nin'):
+        values = [encode_value(item) for item in value if item is not None]
+        has_null = any(item is None for item in value)
+        matches = f'{expr} IN ({", ".join("?" * len(values))})' if values else '0'
+        if has_null:
+            matches = f'({matches} OR {expr} IS NULL)'
+        if op == '$in':
+            return matches, values
+        if has_null:
+            return f'NOT {matches}', values
+        return f'({expr} IS NULL OR NOT {matches})', values
+    if op in ('$gt', '$gte', '$lt', '$lte'):
+        symbol = {'$gt': '>', '$gte': '>=', '$lt': '<', '$lte': '<='}[op]
+        return f'{expr} {symbol} ?', [encode_value(value)]
+    if op == '$exists':
+        return f'json_type(doc, {json_path(field)}) IS {"NOT " if value else ""}NULL', []
+    raise OperationFailure(f'Unsupported query operator {op}', code=2)
+
+
+def compile_sort(sort: List[Tuple[str, int]]) -> str:
+    terms = [f'{field_expr(field)} {"DESC" if direction < 0 else "ASC"}' for field, direction in sort]
+    # Insertion order breaks ties, like Mongo's natural order
+    return ' ORDER BY ' + ', '.join(terms + ['pk'])
+
+
+def split_projection(projection: Optional[dict]) -> Tuple[Optional[List[str]], List[str]]:
+    """Return (fields to include or None for all, fields to exclude)."""
+    if not projection:
+        return None, []
+    include = [field for field, flag in projection.items() if flag and field != '_id']
+    if include or all(projection.values()):
+        if projection.get('_id', 1):
+            include.append('_id')
+        return include, []
+    return None, [field for field, flag in projection.items() if not flag]
+
+
+def apply_projection(doc: dict, include: Optional[List[str]]) -> dict:
+    if include is None:
+        return doc
+    return {key: value for key, value in doc.items() if key in include}
+
+
+def project(doc: dict, projection: Optional[dict]) -> dict:
+    """Apply a projection in Python, for documents that did not come from a SELECT."""
+    include, exclude = split_projection(projection)
+    doc = apply_projection(doc, include)
+    return {key: value for key, value in doc.items() if key not in exclude}
+
+
+def get_path(doc: dict, field: str):
+    parts = field.split('.')
+    for part in parts[:-1]:
+        doc = doc.setdefault(part, {})
+    return doc, parts[-1]
+
+
+def apply_update(doc: dict, update: dict, inserting: bool) -> None:
+    for op, fields in update.items():
+        if op == '$setOnInsert' and not inserting:
+            continue
+        if op in ('$set', '$setOnInsert'):
+            for field, value in fields.items():
+                parent, key = get_path(doc, field)
+                parent[key] = value
+        elif op == '$unset':
+            for field in fields:
+                parent, key = get_path(doc, field)
+                parent.pop(key, None)
+        elif op == '$inc':
+            for field, amount in fields.items():
+                parent, key = get_path(doc, field)
+                parent[key] = parent.get(key, 0) + amount
+        elif op == '$push':
+            for field, spec in fields.items():
+                parent, key = get_path(doc, field)
+                array = parent.setdefault(key, [])
+                if isinstance(spec, dict) and '$each' in spec:
+                    items, position, size = list(spec['$each']), spec.get('$position'), spec.get('$slice')
+                else:
+                    items, position, size = [spec], None, None
+                if position is None:
+                    array.extend(items)
+                else:
+                    array[position:position] = items
+                if size is not None:
+                    array[:] = array[:size] if size >= 0 else array[size:]
+        else:
+            raise OperationFailure(f'Unsupported update operator {op}', code=9)
+
+
+def upsert_seed(query: dict) -> dict:
+    """Fields an upsert takes from its filter's equality conditions."""
+    doc = {}
+    for key, condition in query.items():
+        if key.startswith('$') or '.' in key:
+            continue
+        if isinstance(condition, dict) and any(op.startswith('$') for op in condition):
+            if '$eq' in condition:
+                doc[key] = condition['$eq']
+            continue
+        doc[key] = condition
+    return doc
+
+
+class EmbeddedCursor:
+    def __init__(self, collection: 'EmbeddedCollection', query: Optional[dict], projection: Optional[dict]):
+        self.collection = collection
+        self._query = query or {}
+        self._include, self._exclude = split_projection(projection)
+        self._sort: List[Tuple[str, int]] = []
+        self._skip = 0
+        self._limit = 0
+        self._batch_size = DEFAULT_BATCH_SIZE
+        self._buffer: List[dict] = []
+        self._conn: Optional[sqlite3.Connection] = None
+        self._rows = None
+        self._exhausted = False
+
+    def sort(self, key_or_list, direction: Optional[int] = None) -> 'EmbeddedCursor':
+        if isinstance(key_or_list, str):
+            self._sort = [(key_or_list, direction or 1)]
+        else:
+            self._sort = list(key_or_list)
+        return self
+
+    def skip(self, skip: int) -> 'EmbeddedCursor':
+        self._skip = skip
+        return self
+
+    def limit(self, limit: int) -> 'EmbeddedCursor':
+        self._limit = limit
+        return self
+
+    def batch_size(self, batch_size: int) -> 'EmbeddedCursor':
+        self._batch_size = max(1, batch_size)
+        return self
+
+    def _sql(self, limit: int = 0) -> Tuple[str, list]:
+        where, params = compile_filter(self._query)
+        source = 'doc'
+        if self._exclude:
+            # Heavy fields (svg_content, artwork_data) never leave SQLite
+            source = f'json_remove(doc, {", ".join(json_path(field) for field in self._exclude)})'
+        sql = f'SELECT {source} FROM {self.collection.table} WHERE {where}'
+        if self._sort:
+            sql += compile_sort(self._sort)
+        if limit or self._skip:
+            sql += f' LIMIT {int(limit) if limit else -1} OFFSET {int(self._skip)}'
+        return sql, params
+
+    def _decode(self, rows) -> List[dict]:
+        return [apply_projection(loads(row[0]), self._include) for row in rows]
+
+    async def to_list(self, length: Optional[int] = None) -> List[dict]:
+        limits = [n for n in (self._limit, length) if n]
+        sql, params = self._sql(min(limits) if limits else 0)
+        await self.collection._prepare()
+        rows = await self.collection.database._read(lambda conn: conn.execute(sql, params).fetchall())
+        return self._decode(rows)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> dict:
+        if not self._buffer:
+            if self._exhausted:
+                raise StopAsyncIteration
+            await self.collection._prepare()
+            self._buffer = await asyncio.to_thread(self._fetch_batch)
+            if not self._buffer:
+                raise StopAsyncIteration
+        return self._buffer.pop(0)
+
+    def _fetch_batch(self) -> List[dict]:
+        # The cursor keeps one pooled connection until it is exhausted or closed
+        if self._rows is None:
+            self._conn = self.collection.database._acquire()
+            sql, params = self._sql(self._limit)
+            self._rows = self._conn.execute(sql, params)
+        rows = self._rows.fetchmany(self._batch_size)
+        if len(rows) < self._batch_size:
+            self.close()
+        return self._decode(rows)
+
+    def close(self) -> None:
+        self._exhausted = True
+        if self._rows is not None:
+            self._rows.close()
+            self._rows = None
+        if self._conn is not None:
+            self.collection.database._release(self._conn)
+            self._conn = None
+
+    def __del__(self):
+        # An abandoned `async for` would otherwise keep its read snapshot open
+        if self._conn is not None:
+            self.close()
+
+
+class EmbeddedCollection:
+    def __init__(self, database: 'EmbeddedDatabase', name: str):
+        self.database = database
+        self.name = name
+        self.table = quote_name(name)
+        self._created = False
+        self._ttl: Optional[Tuple[str, int]] = None  # (field, seconds)
+        self._swept_at = 0.0
+
+    async def _prepare(self) -> None:
+        if not self._created:
+            await self.database._write(
+                lambda conn: conn.execute(
+                    f'CREATE TABLE IF NOT EXISTS {self.table} (pk INTEGER PRIMARY KEY, doc TEXT NOT NULL)'
+                )
+            )
+            self._created = True
+        if self._ttl is not None and time.monotonic() - self._swept_at > TTL_SWEEP_INTERVAL:
+            self._swept_at = time.monotonic()
+            field, seconds = self._ttl
+            cutoff = encode_value(datetime.utcnow() - timedelta(seconds=seconds))
+            await self.database._write(
+                lambda conn: conn.execute(f'DELETE FROM {self.table} WHERE {field_expr(field)} < ?', [cutoff])
+            )
+
+    async def create_indexes(self, indexes) -> List[str]:
+        await self._prepare()
+        names = []
+        for index in indexes:
+            spec = index.document
+            keys = list(spec['key'].items())
+            base_name = f'{self.name}__' + re.sub(r'[^A-Za-z0-9_]', '_', spec['name'])
+            name = quote_name(base_name)
+            columns = ', '.join(f'{field_expr(field)} {"DESC" if direction == -1 else "ASC"}' for field, direction in keys)
+            sql = f'CREATE {"UNIQUE " if spec.get("unique") else ""}INDEX IF NOT EXISTS {name} ON {self.table} ({columns})'
+            if spec.get('sparse'):
+                sql += ' WHERE ' + ' AND '.join(f'{field_expr(field)} IS NOT NULL' for field, _ in keys)
+            await self.database._write(lambda conn, sql=sql: self._create_index(conn, sql))
+            if spec.get('unique') and not spec.get('sparse'):
+                await self._create_null_key_index(base_name, keys)
+            if 'expireAfterSeconds' in spec:
+                self._ttl = (keys[0][0], int(spec['expireAfterSeconds']))
+            names.append(spec['name'])
+        return names
+
+    async def _create_null_key_index(self, base_name: str, keys: List[Tuple[str, int]]) -> None:
+        """Make null (or missing) key fields equal to each other, as they are in Mongo.
+
+        SQLite treats NULLs as distinct, so the plain unique index lets any
+        number of documents with a null key through. This partial index only
+        holds those documents, with null replaced by a placeholder.
+        """
+        columns = ', '.join(f"IFNULL({field_expr(field)}, '{_NULL_KEY}')" for field, _ in keys)
+        where = ' OR '.join(f'{field_expr(field)} IS NULL' for field, _ in keys)
+        sql = f'CREATE UNIQUE INDEX IF NOT EXISTS {quote_name(base_name + "__nulls")} ON {self.table} ({columns}) WHERE {where}'
+        await self.database._write(lambda conn: self._create_index(conn, sql))
+
+    def _create_index(self, conn: sqlite3.Connection, sql: str) -> None:
+        try:
+            conn.execute(sql)
+        except sqlite3.IntegrityError as e:
+            # Existing documents already break the unique constraint
+            raise DuplicateKeyError(f'E11000 duplicate key error collection: {self.name}: {e}', 11000)
+
+    def find(self, filter: Optional[dict] = None, projection: Optional[dict] = None) -> EmbeddedCursor:
+        return EmbeddedCursor(self, filter, projection)
+
+    async def find_one(self, filter: Optional[dict] = None, projection: Optional[dict] = None) -> Optional[dict]:
+        docs = await self.find(filter, projection).to_list(1)
+        return docs[0] if docs else None
+
+    async def count_documents(self, filter: dict) -> int:
+        await self._prepare()
+        where, params = compile_filter(filter)
+        sql = f'SELECT COUNT(*) FROM {self.table} WHERE {where}'
+        return await self.database._read(lambda conn: conn.execute(sql, params).fetchone()[0])
+
+    async def estimated_document_count(self) -> int:
+        return await self.count_documents({})
+
+    # Write helpers below run on the writer thread inside a transaction
+
+    def _insert(self, conn: sqlite3.Connection, doc: dict) -> Any:
+        doc.setdefault('_id', ObjectId())
+        try:
+            conn.execute(f'INSERT INTO {self.table} (doc) VALUES (?)', [dumps(doc)])
+        except sqlite3.IntegrityError as e:
+            raise DuplicateKeyError(f'E11000 duplicate key error collection: {self.name}: {e}', 11000)
+        return doc['_id']
+
+    def _update(self, conn: sqlite3.Connection, query: dict, update: dict, upsert: bool,
+                many: bool = False, sort: Optional[List[Tuple[str, int]]] = None):
+        """Returns (matched, modified, upserted_id, document before, document after)."""
+        where, params = compile_filter(query)
+        sql = f'SELECT pk, doc FROM {self.table} WHERE {where}'
+        if sort:
+            sql += compile_sort(sort)
+        rows = conn.execute(sql if many else sql + ' LIMIT 1', params).fetchall()
+        if not rows:
+            if not upsert:
+                return 0, 0, None, None, None
+            doc = upsert_seed(query)
+            apply_update(doc, update, inserting=True)
+            upserted_id = self._insert(conn, doc)
+            return 0, 0, upserted_id, None, doc
+        modified = 0
+        for pk, text in rows:
+            before = loads(text)
+            after = loads(text)
+            apply_update(after, update, inserting=False)
+            new_text = dumps(after)
+            if new_text != text:
+                try:
+                    conn.execute(f'UPDATE {self.table} SET doc = ? WHERE pk = ?', [new_text, pk])
+                except sqlite3.IntegrityError as e:
+                    raise DuplicateKeyError(f'E11000 duplicate key error collection: {self.name}: {e}', 11000)
+                modified += 1
+        return len(rows), modified, None, before, after
+
+    async def insert_one(self, document: dict) -> InsertOneResult:
+        await self._prepare()
+        inserted_id = await self.database._transaction(lambda conn: self._insert(conn, document))
+        return InsertOneResult(inserted_id, True)
+
+    async def insert_many(self, documents: List[dict], ordered: bool = True) -> InsertManyResult:
+        await self._prepare()
+        documents = list(documents)
+
+        def run(conn):
+            inserted, errors = [], []
+            for index, doc in enumerate(documents):
+                try:
+                    # A savepoint per document, so one duplicate does not undo the rest
+                    conn.execute('SAVEPOINT doc')
+                    inserted.append(self._insert(conn, doc))
+                    conn.execute('RELEASE doc')
+                except DuplicateKeyError as e:
+                    conn.execute('ROLLBACK TO doc')
+                    conn.execute('RELEASE doc')
+                    errors.append({'index': index, 'code': 11000, 'errmsg': str(e), 'op': doc})
+                    if ordered:
+                        break
+            return inserted, errors
+
+        inserted, errors = await self.database._transaction(run)
+        if errors:
+            raise BulkWriteError({
+                'writeErrors': errors, 'writeConcernErrors': [], 'nInserted': len(inserted),
+                'nUpserted': 0, 'nMatched': 0, 'nModified': 0, 'nRemoved': 0, 'upserted': [],
+            })
+        return InsertManyResult(inserted, True)
+
+    async def update_one(self, filter: dict, update: dict, upsert: bool = False) -> UpdateResult:
+        await self._prepare()
+        matched, modified, upserted_id, _, _ = await self.database._transaction(
+            lambda conn: self._update(conn, filter, update, upsert)
+        )
+        raw = {'n': matched or int(upserted_id is not None), 'nModified': modified}
+        if upserted_id is not None:
+            raw['upserted'] = upserted_id
+        return UpdateResult(raw, True)
+
+    async def update_many(self, filter: dict, update: dict, upsert: bool = False) -> UpdateResult:
+        await self._prepare()
+        matched, modified, upserted_id, _, _ = await self.database._transaction(
+            lambda conn: self._update(conn, filter, update, upsert, many=True)
+        )
+        raw = {'n': matched or int(upserted_id is not None), 'nModified': modified}
+        if upserted_id is not None:
+            raw['upserted'] = upserted_id
+        return UpdateResult(raw, True)
+
+    async def find_one_and_update(
+        self, filter: dict, update: dict, projection: Optional[dict] = None,
+        sort: Optional[List[Tuple[str, int]]] = None, upsert: bool = False, return_document: bool = False,
+    ) -> Optional[dict]:
+        await self._prepare()
+        _, _, _, before, after = await self.database._transaction(
+            lambda conn: self._update(conn, filter, update, upsert, sort=sort)
+        )
+        doc = after if return_document else before
+        return None if doc is None else project(doc, projection)
+
+    async def find_one_and_delete(
+        self, filter: dict, projection: Optional[dict] = None, sort: Optional[List[Tuple[str, int]]] = None,
+    ) -> Optional[dict]:
+        await self._prepare()
+        where, params = compile_filter(filter)
+        sql = f'SELECT pk, doc FROM {self.table} WHERE {where}' + (compile_sort(sort) if sort else '') + ' LIMIT 1'
+
+        def run(conn):
+            row = conn.execute(sql, params).fetchone()
+            if row is None:
+                return None
+            conn.execute(f'DELETE FROM {self.table} WHERE pk = ?', [row[0]])
+            return loads(row[1])
+
+        doc = await self.database._transaction(run)
+        return None if doc is None else project(doc, projection)
+
+    async def bulk_write(self, requests, ordered: bool = True) -> BulkWriteResult:
+        await self._prepare()
+        requests = list(requests)
+
+        def run(conn):
+            result = {'nInserted': 0, 'nUpserted': 0, 'nMatched': 0, 'nModified': 0, 'nRemoved': 0,
+                      'upserted': [], 'writeErrors': [], 'writeConcernErrors': []}
+            for index, request in enumerate(requests):
+                try:
+                    conn.execute('SAVEPOINT op')
+                    if isinstance(request, InsertOne):
+                        self._insert(conn, request._doc)
+                        result['nInserted'] += 1
+                    elif isinstance(request, UpdateOne):
+                        matched, modified, upserted_id, _, _ = self._update(
+                            conn, request._filter, request._doc, bool(request._upsert)
+                        )
+                        result['nMatched'] += matched
+                        result['nModified'] += modified
+                        if upserted_id is not None:
+                            result['nUpserted'] += 1
+                            result['upserted'].append({'index': index, '_id': upserted_id})
+                    else:
+                        raise OperationFailure(f'Unsupported bulk operation {type(request).__name__}', code=2)
+                    conn.execute('RELEASE op')
+                except DuplicateKeyError as e:
+                    conn.execute('ROLLBACK TO op')
+                    conn.execute('RELEASE op')
+                    result['writeErrors'].append({'index': index, 'code': 11000, 'errmsg': str(e)})
+                    if ordered:
+                        break
+            return result
+
+        result = await self.database._transaction(run)
+        if result['writeErrors']:
+            raise BulkWriteError(result)
+        return BulkWriteResult(result, True)
+
+    async def delete_one(self, filter: dict) -> DeleteResult:
+        return await self._delete(filter, ' LIMIT 1')
+
+    async def delete_many(self, filter: dict) -> DeleteResult:
+        return await self._delete(filter, '')
+
+    async def _delete(self, filter: dict, limit: str) -> DeleteResult:
+        await self._prepare()
+        where, params = compile_filter(filter)
+        sql = f'DELETE FROM {self.table} WHERE pk IN (SELECT pk FROM {self.table} WHERE {where}{limit})'
+        deleted = await self.database._transaction(lambda conn: conn.execute(sql, params).rowcount)
+        return DeleteResult({'n': deleted}, True)
+
+
+class EmbeddedDatabase:
+    def __init__(self, path: Path, name: str):
+        self.path = path
+        self.name = name
+        self._collections: Dict[str, EmbeddedCollection] = {}
+        self._idle: List[sqlite3.Connection] = []
+        self._idle_lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'sqlite-{name}')
+        self._write_conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path, timeout=BUSY_TIMEOUT, isolation_level=None, check_same_thread=False
+        )
+        conn.execute('PRAGMA journal_mode=WAL')
+        # With WAL this only risks the last commits on power loss, never corruption
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        with self._idle_lock:
+            if self._idle:
+                return self._idle.pop()
+        return self._connect()
+
+    def _release(self, conn: sqlite3.Connection) -> None:
+        with self._idle_lock:
+            if len(self._idle) < MAX_IDLE_READERS:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    async def _read(self, func):
+        def run():
+            conn = self._acquire()
+            try:
+                return func(conn)
+            finally:
+                self._release(conn)
+        return await asyncio.to_thread(run)
+
+    async def _write(self, func):
+        def run():
+            if self._write_conn is None:
+                self._write_conn = self._connect()
+            return func(self._write_conn)
+        return await asyncio.get_running_loop().run_in_executor(self._writer, run)
+
+    async def _transaction(self, func):
+        def run(conn):
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                result = func(conn)
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+            return result
+        return await self._write(run)
+
+    def __getitem__(self, name: str) -> EmbeddedCollection:
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = EmbeddedCollection(self, name)
+        return collection
+
+    def __getattr__(self, name: str) -> EmbeddedCollection:
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+    async def command(self, command, **kwargs) -> dict:
+        if command != 'ping':
+            raise OperationFailure(f'Unsupported command {command!r}', code=59)
+        await self._read(lambda conn: conn.execute('SELECT 1').fetchone())
+        return {'ok': 1.0}
+
+    def watch(self, *args, **kwargs):
+        raise OperationFailure('The embedded store has no change streams', code=40573)
+
+    def close(self) -> None:
+        if self._write_conn is not None:
+            conn, self._write_conn = self._write_conn, None
+            self._writer.submit(conn.close).result()
+        self._writer.shutdown(wait=True)
+        with self._idle_lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+class _Admin:
+    def __init__(self, client: 'EmbeddedClient'):
+        self.client = client
+
+    async def command(self, command, **kwargs) -> dict:
+        if command != 'ping':
+            raise OperationFailure(f'Unsupported command {command!r}', code=59)
+        return {'ok': 1.0}
+
+
+class EmbeddedClient:
+    """Stands in for AsyncIOMotorClient; each database is one SQLite file in ``directory``."""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._databases: Dict[str, EmbeddedDatabase] = {}
+        self.admin = _Admin(self)
+
+    def __getitem__(self, name: str) -> EmbeddedDatabase:
+        database = self._databases.get(name)
+        if database is None:
+            quote_name(name)
+            database = self._databases[name] = EmbeddedDatabase(self.directory / f'{name}.sqlite3', name)
+        return database
+
+    def close(self) -> None:
+        for database in self._databases.values():
+            database.close()
+        self._databases.clear()
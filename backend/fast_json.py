@@ -0,0 +1,65 @@
+"""JSON encoding for trusted Mongo documents without building Pydantic models.
+
+Documents we wrote ourselves already hold valid field values, so in fast
+mode list routes only reshape them with project() and hand the dicts
+straight to orjson (or the stdlib json module when orjson is not
+installed) instead of validating every document into a model. project()
+keeps the response identical to the model path: internal fields are
+dropped and fields older documents lack get the model's default.
+Datetimes are written in the same ISO 8601 form Pydantic produces.
+"""
+
+import json
+from datetime import datetime
+from typing import Any, List, Type
+
+from pydantic import BaseModel
+from pydantic_core import PydanticUndefined
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    # bson.ObjectId and friends
+    return str(obj)
+
+
+def strip_ids(content: Any) -> Any:
+    """Drop Mongo's _id from a document or a list of documents, in place."""
+    if isinstance(content, dict):
+        content.pop("_id", None)
+    elif isinstance(content, list):
+        for doc in content:
+            if isinstance(doc, dict):
+                doc.pop("_id", None)
+    return content
+
+
+def _field_default(field) -> Any:
+    value = field.get_default(call_default_factory=True)
+    return None if value is PydanticUndefined else value
+
+
+def project(model: Type[BaseModel], docs: List[dict]) -> List[dict]:
+    """Reduce documents to ``model``'s fields, filling in defaults for missing ones."""
+    fields = model.model_fields
+    return [
+        {name: doc[name] if name in doc else _field_default(field) for name, field in fields.items()}
+        for doc in docs
+    ]
+
+
+def dumps(content: Any) -> bytes:
+    content = strip_ids(content)
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(
+        content, default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
@@ -0,0 +1,125 @@
+"""In-flight request tracking for graceful shutdown.
+
+RequestTracker counts HTTP requests that have started but not yet sent
+their last byte. Draining has to start before the server stops listening:
+by the time the lifespan shutdown runs, uvicorn has already closed its
+sockets and waited for open connections. So install_drain_signal_handlers
+wraps the server's SIGTERM/SIGINT handlers. The first signal marks the
+app as draining (readiness starts failing, so the load balancer stops
+routing here, and long-lived streams end) and hands the signal on to the
+server `delay` seconds later; a second signal is handed on at once.
+
+The lifespan shutdown still waits for the count to reach zero, up to the
+drain timeout, before closing the Mongo client and the thumbnail pool, in
+case the server gave up on connections it was draining.
+"""
+
+import asyncio
+import functools
+import logging
+import signal
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class RequestTracker:
+    def __init__(self):
+        self.in_flight = 0
+        self.draining = False
+        # Set when draining starts; long-lived responses wait on it
+        self.stopping = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def start_draining(self) -> None:
+        if not self.draining:
+            logger.info("Draining: readiness fails from now on")
+        self.draining = True
+        self.stopping.set()
+
+    def started(self) -> None:
+        self.in_flight += 1
+        self._idle.clear()
+
+    def finished(self) -> None:
+        self.in_flight -= 1
+        if self.in_flight == 0:
+            self._idle.set()
+
+    async def drain(self, timeout: float) -> bool:
+        """Stop reporting ready and wait for in-flight requests to finish.
+
+        Returns False if requests were still running when the timeout hit.
+        """
+        self.start_draining()
+        if self.in_flight:
+            logger.info("Draining %d in-flight requests", self.in_flight)
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Shutting down with %d requests still in flight", self.in_flight)
+            return False
+        return True
+
+
+class RequestTrackerMiddleware:
+    def __init__(self, app, tracker: RequestTracker):
+        self.app = app
+        self.tracker = tracker
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        self.tracker.started()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.tracker.finished()
+
+
+def install_drain_signal_handlers(tracker: RequestTracker, delay: float) -> None:
+    """Start draining on SIGTERM/SIGINT, before the server's own handler runs.
+
+    Only signals the server already handles are wrapped, so this is a no-op
+    where nothing captures them (tests, other threads). Both ways a server
+    can handle them are covered: signal.signal (uvicorn 0.29 and later)
+    and loop.add_signal_handler (earlier uvicorn), where signal.getsignal
+    only sees asyncio's no-op handler.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        # asyncio keeps loop signal handlers in a private dict
+        loop_handler = getattr(loop, '_signal_handlers', {}).get(signum)
+        if loop_handler is not None:
+            hand_over = functools.partial(loop_handler._callback, *loop_handler._args)
+            loop.add_signal_handler(signum, _deferred(loop, tracker, delay, hand_over))
+            continue
+        server_handler = signal.getsignal(signum)
+        if not callable(server_handler):
+            continue
+        deferred = _deferred(loop, tracker, delay, functools.partial(server_handler, signum, None))
+        # Python signal handlers run between bytecodes, possibly inside the loop
+        signal.signal(signum, lambda signum, frame, deferred=deferred: loop.call_soon_threadsafe(deferred))
+
+
+def _deferred(loop, tracker: RequestTracker, delay: float, hand_over):
+    """A loop callback that drains first and calls ``hand_over`` ``delay`` seconds later."""
+    pending = None
+
+    def on_signal():
+        nonlocal pending
+        if not tracker.draining:
+            tracker.start_draining()
+            pending = loop.call_later(delay, hand_over)
+            return
+        # Another signal: the server's handler runs now, and only once
+        if pending is not None:
+            pending.cancel()
+            pending = None
+        hand_over()
+
+    return on_signal
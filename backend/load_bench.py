@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+In-process load and latency benchmark for the Coloring Game API.
+
+Drives server.app through httpx's ASGI transport against mongomock (an
+in-memory Mongo stand-in) and a temporary blob store, so it needs no live
+server or database. Concurrent virtual users run a weighted mix of catalog
+browsing, artwork saves with 200KB-2MB PNGs and gallery listing; the report
+gives throughput and p50/p95/p99 latency per route.
+
+    python load_bench.py                         # run and print the report
+    python load_bench.py --save-baseline         # record bench_baseline.json
+    python load_bench.py --compare               # compare with the baseline
+    python load_bench.py --storage mongo sqlite  # compare storage backends
+
+Absolute throughput and latency depend on the machine, so --compare only
+fails (exit 1) against a baseline recorded on the same machine; against
+any other baseline it reports the differences and exits 0. In CI, record
+the baseline in the same job before comparing:
+
+    git checkout $BASE && python load_bench.py --save-baseline
+    git checkout $HEAD && python load_bench.py --compare
+
+--storage runs the same mix against each backend in turn: mongomock, the
+embedded SQLite store in a temporary directory, or the MongoDB at
+MONGO_URL (in a throwaway database that is dropped afterwards).
+"""
+
+import argparse
+import asyncio
+import base64
+import io
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+BASELINE_FILE = Path(__file__).parent / 'bench_baseline.json'
+
+# action -> relative weight in the traffic mix
+DEFAULT_MIX = {
+    "browse_catalog": 6,
+    "open_page": 3,
+    "save_artwork": 1,
+    "view_gallery": 3,
+}
+
+STORAGE_BACKENDS = ("mongomock", "sqlite", "mongo")
+# server.create_client as imported, before a mongomock run replaces it
+create_client = None
+
+
+def make_png(target_size: int, rng: random.Random) -> bytes:
+    """Noise PNG of roughly target_size bytes (noise barely compresses)."""
+    from PIL import Image
+
+    side = max(16, int((target_size / 3) ** 0.5))
+    image = Image.frombytes('RGB', (side, side), rng.randbytes(side * side * 3))
+    out = io.BytesIO()
+    image.save(out, format='PNG')
+    return out.getvalue()
+
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class LoadBench:
+    def __init__(self, client, rng: random.Random, pngs, mix):
+        self.client = client
+        self.rng = rng
+        self.pngs = pngs
+        self.actions = list(mix)
+        self.weights = [mix[action] for action in self.actions]
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.page_ids = []
+
+    async def request(self, label: str, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        response = await self.client.request(method, url, **kwargs)
+        self.latencies[label].append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            self.errors[label] += 1
+        return response
+
+    async def browse_catalog(self, user_id: str):
+        category = self.rng.choice([None, "animals", "vehicles", "nature"])
+        params = {"fields": "summary", **({"category": category} if category else {})}
+        await self.request("GET /api/coloring-pages", "GET", "/api/coloring-pages", params=params)
+        await self.request("GET /api/stickers", "GET", "/api/stickers")
+
+    async def open_page(self, user_id: str):
+        page_id = self.rng.choice(self.page_ids)
+        await self.request(
+            "GET /api/coloring-pages/{id}/svg", "GET", f"/api/coloring-pages/{page_id}/svg",
+            params={"w": 500, "h": 350},
+        )
+
+    async def save_artwork(self, user_id: str):
+        png = self.rng.choice(self.pngs)
+        page_id = self.rng.choice(self.page_ids)
+        if self.rng.random() < 0.8:
+            await self.request(
+                "POST /api/artworks/upload", "POST", "/api/artworks/upload",
+                data={"user_id": user_id, "coloring_page_id": page_id, "title": "Bench"},
+                files={"file": ("artwork.png", png, "image/png")},
+            )
+        else:
+            await self.request("POST /api/artworks", "POST", "/api/artworks", json={
+                "user_id": user_id,
+                "coloring_page_id": page_id,
+                "artwork_data": base64.b64encode(png).decode(),
+                "title": "Bench",
+            })
+
+    async def view_gallery(self, user_id: str):
+        response = await self.request(
+            "GET /api/artworks", "GET", "/api/artworks", params={"user_id": user_id, "fields": "summary"}
+        )
+        artworks = response.json() if response.status_code == 200 else []
+        if artworks:
+            artwork = self.rng.choice(artworks)
+            await self.request("GET /api/artworks/{id}/image", "GET", f"/api/artworks/{artwork['id']}/image")
+
+    async def virtual_user(self, user_id: str, deadline: float):
+        while time.perf_counter() < deadline:
+            action = self.rng.choices(self.actions, self.weights)[0]
+            await getattr(self, action)(user_id)
+
+    def report(self, elapsed: float) -> dict:
+        routes = {}
+        for label, values in sorted(self.latencies.items()):
+            values.sort()
+            routes[label] = {
+                "requests": len(values),
+                "errors": self.errors[label],
+                "rps": round(len(values) / elapsed, 2),
+                "p50_ms": round(percentile(values, 50) * 1000, 2),
+                "p95_ms": round(percentile(values, 95) * 1000, 2),
+                "p99_ms": round(percentile(values, 99) * 1000, 2),
+            }
+        total = sum(route["requests"] for route in routes.values())
+        return {"elapsed_s": round(elapsed, 2), "total_rps": round(total / elapsed, 2), "routes": routes}
+
+
+async def run(args, storage: str = "mongomock") -> dict:
+    import httpx
+    import mongomock_motor
+
+    # Point the app at a fresh store before any request is served
+    os.environ['BLOB_STORE'] = 'filesystem'
+    os.environ['BLOB_STORE_PATH'] = tempfile.mkdtemp(prefix='bench-blobs-')
+    import server
+
+    global create_client
+    create_client = create_client or server.create_client
+    server.create_client = create_client
+    server.STORAGE_BACKEND = 'mongo'
+    if storage == "mongomock":
+        server.create_client = mongomock_motor.AsyncMongoMockClient
+    elif storage == "sqlite":
+        server.STORAGE_BACKEND = 'sqlite'
+        server.EMBEDDED_STORE_PATH = tempfile.mkdtemp(prefix='bench-sqlite-')
+    else:
+        server.db_name = f"load_bench_{os.getpid()}"
+    # Earlier runs in this process must not serve their cached catalog
+    server.catalog_cache.invalidate()
+    await server.app.router.startup()
+
+    rng = random.Random(args.seed)
+    sizes = [rng.randint(200_000, 2_000_000) for _ in range(args.png_variants)]
+    pngs = [make_png(size, rng) for size in sizes]
+
+    transport = httpx.ASGITransport(app=server.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            await client.post("/api/initialize-data")
+            bench = LoadBench(client, rng, pngs, DEFAULT_MIX)
+            bench.page_ids = [page["id"] for page in (await client.get("/api/coloring-pages")).json()]
+
+            # Warm-up fills caches and indexes so the measured window is steady state
+            await asyncio.gather(*(bench.browse_catalog("warmup") for _ in range(args.users)))
+            bench.latencies.clear()
+            bench.errors.clear()
+
+            start = time.perf_counter()
+            deadline = start + args.duration
+            await asyncio.gather(*(
+                bench.virtual_user(f"user-{n % max(1, args.users // 4)}", deadline) for n in range(args.users)
+            ))
+            return bench.report(time.perf_counter() - start)
+    finally:
+        if storage == "mongo":
+            await server.client.drop_database(server.db_name)
+        await server.app.router.shutdown()
+
+
+def print_report(result: dict) -> None:
+    print(f"{'route':<36}{'reqs':>7}{'err':>5}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for label, route in result["routes"].items():
+        print(f"{label:<36}{route['requests']:>7}{route['errors']:>5}{route['rps']:>9.1f}"
+              f"{route['p50_ms']:>9.2f}{route['p95_ms']:>9.2f}{route['p99_ms']:>9.2f}")
+    print(f"\n📊 {result['total_rps']:.1f} req/s over {result['elapsed_s']}s")
+
+
+def print_storage_comparison(results: dict) -> None:
+    """Side-by-side p50/p95 and throughput per route for each storage backend."""
+    labels = sorted({label for result in results.values() for label in result["routes"]})
+    print(f"{'route':<36}" + "".join(f"{storage + ' p50/p95 ms':>26}" for storage in results))
+    for label in labels:
+        cells = []
+        for result in results.values():
+            route = result["routes"].get(label)
+            cells.append(f"{route['p50_ms']:.2f} / {route['p95_ms']:.2f}" if route else "-")
+        print(f"{label:<36}" + "".join(f"{cell:>26}" for cell in cells))
+    print(f"{'req/s':<36}" + "".join(f"{result['total_rps']:>26.1f}" for result in results.values()))
+
+
+def machine() -> str:
+    """Identifies the host a run was measured on."""
+    return f"{platform.node()} {platform.machine()} {os.cpu_count()} CPUs Python {platform.python_version()}"
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list:
+    """Return regressions where p95 grew or throughput fell by more than tolerance."""
+    regressions = []
+    for label, base in baseline["routes"].items():
+        current = result["routes"].get(label)
+        if current is None:
+            regressions.append(f"{label}: no requests in this run")
+            continue
+        if current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{label}: p95 {base['p95_ms']}ms -> {current['p95_ms']}ms")
+        if current["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{label}: {base['rps']} -> {current['rps']} req/s")
+        if current["errors"]:
+            regressions.append(f"{label}: {current['errors']} error responses")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=15.0, help="measured seconds")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--png-variants", type=int, default=6, help="distinct upload images")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true",
+                        help="report regressions against the baseline; fail if it was recorded on this machine")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    parser.add_argument("--storage", nargs="+", choices=STORAGE_BACKENDS, default=["mongomock"],
+                        help="storage backends to run against, one after the other")
+    args = parser.parse_args()
+    if args.compare and not args.save_baseline and not args.baseline.is_file():
+        parser.error(f"no baseline at {args.baseline}; record one first with --save-baseline")
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    os.environ.setdefault("THUMBNAIL_WORKERS", "1")
+
+    results = {}
+    for storage in args.storage:
+        if len(args.storage) > 1:
+            print(f"\n🗄️  {storage}")
+        results[storage] = asyncio.run(run(args, storage))
+        print_report(results[storage])
+    if len(results) > 1:
+        print()
+        print_storage_comparison(results)
+    result = results[args.storage[-1]]
+
+    result["machine"] = machine()
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(result, indent=2, ensure_ascii=False) + "\n")
+        print(f"💾 Baseline saved to {args.baseline}")
+    if args.compare:
+        baseline = json.loads(args.baseline.read_text())
+        regressions = compare(result, baseline, args.tolerance)
+        same_machine = baseline.get("machine") == result["machine"]
+        if not same_machine:
+            print(f"\nℹ️  Baseline was recorded on {baseline.get('machine', 'an unknown machine')}; "
+                  "reporting only")
+        if regressions:
+            print("\n⚠️  Regressions against baseline:")
+            for regression in regressions:
+                print(f"  • {regression}")
+            if same_machine:
+                sys.exit(1)
+        else:
+            print("\n🎉 No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""Request and MongoDB metrics in Prometheus text format.
+
+MetricsMiddleware is a plain ASGI middleware (no per-request task or body
+buffering) that records latency, body sizes and status per route template.
+MongoCommandListener is a pymongo command listener that times every
+command by collection and command name. Both only bump counters under a
+lock, so they are cheap enough to leave on in production.
+"""
+
+import bisect
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, Tuple
+
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.values: Dict[Tuple[str, ...], float] = defaultdict(float)
+        self.lock = threading.Lock()
+
+    def inc(self, labels: Tuple[str, ...], amount: float = 1.0) -> None:
+        with self.lock:
+            self.values[labels] += amount
+
+    def render(self) -> Iterable[str]:
+        yield f'# HELP {self.name} {self.help_text}'
+        yield f'# TYPE {self.name} counter'
+        with self.lock:
+            items = list(self.values.items())
+        for labels, value in items:
+            yield f'{self.name}{_labels(self.label_names, labels)} {value:g}'
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...], buckets: Tuple[float, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self.series: Dict[Tuple[str, ...], list] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, labels: Tuple[str, ...], value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> Iterable[str]:
+        yield f'# HELP {self.name} {self.help_text}'
+        yield f'# TYPE {self.name} histogram'
+        with self.lock:
+            items = [(labels, list(series)) for labels, series in self.series.items()]
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = 'le="%g"' % bound
+                yield f'{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}'
+            cumulative += series[len(self.buckets)]
+            le = 'le="+Inf"'
+            yield f'{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}'
+            yield f'{self.name}_sum{_labels(self.label_names, labels)} {series[-1]:.9g}'
+            yield f'{self.name}_count{_labels(self.label_names, labels)} {cumulative}'
+
+
+class Metrics:
+    def __init__(self):
+        route = ('method', 'route')
+        self.request_duration = Histogram(
+            'http_request_duration_seconds', 'Time from request start to the last response byte.',
+            route, LATENCY_BUCKETS)
+        self.request_size = Histogram(
+            'http_request_size_bytes', 'Request body size.', route, SIZE_BUCKETS)
+        self.response_size = Histogram(
+            'http_response_size_bytes', 'Response body size as sent (after compression).', route, SIZE_BUCKETS)
+        self.responses = Counter(
+            'http_responses_total', 'Responses by route and status code.', route + ('status',))
+        self.serialization_duration = Histogram(
+            'response_serialization_seconds',
+            'Time spent building response models (validate) and encoding bodies to JSON (encode).',
+            ('stage', 'mode'), LATENCY_BUCKETS)
+        self.mongo_duration = Histogram(
+            'mongodb_command_duration_seconds', 'MongoDB command round-trip time.',
+            ('collection', 'command'), LATENCY_BUCKETS)
+        self.write_behind_flush_duration = Histogram(
+            'write_behind_flush_seconds', 'insert_many time per write-behind batch.', (), LATENCY_BUCKETS)
+        self.write_behind_lag = Histogram(
+            'write_behind_lag_seconds', 'How long the oldest save in a batch waited before being written.',
+            (), LATENCY_BUCKETS)
+        self.mongo_failures = Counter(
+            'mongodb_command_failures_total', 'MongoDB commands that returned an error.',
+            ('collection', 'command'))
+
+    def render(self, extra: Iterable[str] = ()) -> str:
+        lines = []
+        for metric in (self.request_duration, self.request_size, self.response_size, self.responses,
+                       self.serialization_duration, self.mongo_duration, self.mongo_failures,
+                       self.write_behind_flush_duration, self.write_behind_lag):
+            lines.extend(metric.render())
+        lines.extend(extra)
+        return '\n'.join(lines) + '\n'
+
+
+def gauge(name: str, help_text: str, value: float, kind: str = 'gauge') -> Iterable[str]:
+    yield f'# HELP {name} {help_text}'
+    yield f'# TYPE {name} {kind}'
+    yield f'{name} {value:g}'
+
+
+class MetricsMiddleware:
+    def __init__(self, app, metrics: Metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        request_bytes = 0
+        response_bytes = 0
+        status = '500'
+
+        async def counting_receive():
+            nonlocal request_bytes
+            message = await receive()
+            if message['type'] == 'http.request':
+                request_bytes += len(message.get('body', b''))
+            return message
+
+        async def counting_send(message):
+            nonlocal response_bytes, status
+            if message['type'] == 'http.response.start':
+                status = str(message['status'])
+            elif message['type'] == 'http.response.body':
+                response_bytes += len(message.get('body', b''))
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            # The route template, not the raw path, keeps label cardinality bounded
+            route = scope.get('route')
+            labels = (scope['method'], getattr(route, 'path', 'unmatched'))
+            self.metrics.request_duration.observe(labels, time.perf_counter() - start)
+            self.metrics.request_size.observe(labels, request_bytes)
+            self.metrics.response_size.observe(labels, response_bytes)
+            self.metrics.responses.inc(labels + (status,))
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+        self.in_flight: Dict[Tuple, Tuple[str, str]] = {}
+
+    def started(self, event):
+        value = event.command.get(event.command_name)
+        if isinstance(value, str):
+            collection = value
+        else:
+            # getMore carries the cursor id under its name and the collection separately
+            collection = event.command.get('collection', '-')
+        self.in_flight[(event.connection_id, event.request_id)] = (collection, event.command_name)
+
+    def _finish(self, event):
+        return self.in_flight.pop((event.connection_id, event.request_id), ('-', event.command_name))
+
+    def succeeded(self, event):
+        labels = self._finish(event)
+        self.metrics.mongo_duration.observe(labels, event.duration_micros / 1e6)
+
+    def failed(self, event):
+        labels = self._finish(event)
+        self.metrics.mongo_duration.observe(labels, event.duration_micros / 1e6)
+        self.metrics.mongo_failures.inc(labels)
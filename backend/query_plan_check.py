@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Query plan guard for the Coloring Game API.
+
+Creates the indexes declared in server.INDEXES, runs explain() on the query
+shape of every route and exits non-zero if any winning plan contains a
+COLLSCAN. Run it against a disposable database:
+
+    DB_NAME=coloring_game_plancheck python query_plan_check.py
+
+tests/test_query_plans.py runs the same check against the mongod at
+MONGO_URL and is skipped when none is reachable.
+"""
+
+import asyncio
+import sys
+from datetime import datetime
+
+import server
+
+# (route, collection, filter, sort) for every query the routes issue
+ROUTE_QUERIES = [
+    ("GET /api/coloring-pages", "coloring_pages", {},
+     [("created_at", 1), ("id", 1)]),
+    ("GET /api/coloring-pages?category", "coloring_pages", {"category": "animals"},
+     [("created_at", 1), ("id", 1)]),
+    ("GET /api/coloring-pages?after", "coloring_pages",
+     {"$or": [{"created_at": {"$gt": datetime(2024, 1, 1)}},
+              {"created_at": datetime(2024, 1, 1), "id": {"$gt": "x"}}]},
+     [("created_at", 1), ("id", 1)]),
+    ("GET /api/coloring-pages/{page_id}", "coloring_pages", {"id": "x"}, None),
+    ("GET /api/artworks", "user_artworks", {},
+     [("completed_at", -1), ("id", -1)]),
+    ("GET /api/artworks?user_id", "user_artworks", {"user_id": "u"},
+     [("completed_at", -1), ("id", -1)]),
+    ("GET /api/artworks?user_id&after", "user_artworks",
+     {"user_id": "u",
+      "$or": [{"completed_at": {"$lt": datetime(2024, 1, 1)}},
+              {"completed_at": datetime(2024, 1, 1), "id": {"$lt": "x"}}]},
+     [("completed_at", -1), ("id", -1)]),
+    ("GET /api/artworks/{artwork_id}/image", "user_artworks", {"id": "x"}, None),
+    ("GET /api/artworks/export", "user_artworks",
+     {"user_id": "u", "completed_at": {"$lte": datetime(2024, 1, 1)}},
+     [("completed_at", -1), ("id", -1)]),
+    ("DELETE /api/artworks/{artwork_id}", "user_artworks", {"id": "x"}, None),
+    ("DELETE /api/artworks/{artwork_id} (blob refs)", "user_artworks",
+     {"$or": [{"image_hash": "x"}, {"thumbnail": "/api/thumbnails/x"}]}, None),
+    ("blob GC sweep", "blob_gc", {"due_at": {"$lte": datetime(2024, 1, 1)}}, [("due_at", 1)]),
+    ("POST /api/artworks (thumbnail reuse)", "user_artworks",
+     {"image_hash": "x", "thumbnail": {"$ne": None}}, None),
+    ("POST /api/artworks (Idempotency-Key)", "idempotency_keys", {"user_id": "u", "key": "k"}, None),
+    ("write-behind flush failure (Idempotency-Key release)", "idempotency_keys",
+     {"artwork_id": {"$in": ["x", "y"]}}, None),
+    ("PATCH /api/artworks/{artwork_id}/strokes", "artwork_strokes", {"id": "x", "version": 1}, None),
+    ("GET /api/stickers", "stickers", {},
+     [("created_at", 1), ("id", 1)]),
+    ("GET /api/stickers?category", "stickers", {"category": "shapes"},
+     [("created_at", 1), ("id", 1)]),
+    ("GET /api/stickers/sprite?category", "stickers", {"category": "shapes"},
+     [("created_at", 1), ("id", 1)]),
+    ("thumbnail backfill (pages)", "coloring_pages", {"thumbnail": None}, None),
+    ("thumbnail backfill (artworks)", "user_artworks",
+     {"thumbnail": None,
+      "$or": [{"image_hash": {"$ne": None}}, {"artwork_data": {"$nin": [None, ""]}}]}, None),
+    ("POST /api/catalog/import (pages)", "coloring_pages", {"id": {"$in": ["x", "y"]}}, None),
+    ("POST /api/catalog/import (stickers)", "stickers", {"id": {"$in": ["x", "y"]}}, None),
+]
+
+
+def find_stages(plan, stage):
+    """Yield every node of an explain plan tree with the given stage name."""
+    if isinstance(plan, dict):
+        if plan.get("stage") == stage:
+            yield plan
+        for value in plan.values():
+            yield from find_stages(value, stage)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from find_stages(item, stage)
+
+
+async def check_query_plans(database):
+    """Return the list of routes whose winning plan scans a whole collection."""
+    await server.ensure_indexes(database)
+    failures = []
+    for route, collection_name, query, sort in ROUTE_QUERIES:
+        cursor = database[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = await cursor.explain()
+        winning_plan = plan["queryPlanner"]["winningPlan"]
+        if any(find_stages(winning_plan, "COLLSCAN")):
+            failures.append(route)
+            print(f"❌ {route}: COLLSCAN on {collection_name}")
+        else:
+            print(f"✅ {route}")
+    return failures
+
+
+def main():
+    client = server.create_client()
+    try:
+        failures = asyncio.run(check_query_plans(client[server.db_name]))
+    finally:
+        client.close()
+    if failures:
+        print(f"\n⚠️  {len(failures)} route queries scan a whole collection")
+        sys.exit(1)
+    print("\n🎉 Every route query is index-backed")
+
+
+if __name__ == "__main__":
+    main()
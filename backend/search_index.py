@@ -0,0 +1,227 @@
+"""In-memory prefix index over coloring page and sticker names.
+
+Names are folded before indexing and querying: Turkish case rules first
+(İ -> i, I -> ı), then accents and the Turkish letters are reduced to
+their plain Latin base (ı -> i, ş -> s, ğ -> g, ç -> c, ö -> o, ü -> u), so
+"kedi", "KEDİ" and "Kedı" all match "Sevimli Kedi" and "hizli" matches
+"Hızlı Araba". Each folded word is a key in a sorted term list pointing at
+the documents that contain it; a prefix lookup is a bisect into that list,
+so autocomplete never touches Mongo. Short prefixes match much of the
+catalog, so ranked results are cached per query until the index changes;
+keystrokes from different users mostly repeat the same few prefixes.
+
+Each worker process keeps its own index, built at startup and updated
+from catalog_changed and the catalog change feed. Without change streams
+another worker's writes only show up at the next periodic rebuild.
+"""
+
+import asyncio
+import heapq
+import logging
+import re
+import unicodedata
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (kind, id), kind being "page" or "sticker"
+DocKey = Tuple[str, str]
+
+_TURKISH_UPPER = str.maketrans({"İ": "i", "I": "ı"})
+_TURKISH_BASE = str.maketrans({"ı": "i", "ş": "s", "ğ": "g", "ç": "c", "ö": "o", "ü": "u"})
+_WORD = re.compile(r"\w+")
+
+
+def fold(text: str) -> str:
+    """Lowercase with Turkish rules and strip accents, for matching only."""
+    text = text.translate(_TURKISH_UPPER).lower().translate(_TURKISH_BASE)
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def tokenize(text: str) -> List[str]:
+    return _WORD.findall(fold(text))
+
+
+class SearchEntry(NamedTuple):
+    kind: str
+    id: str
+    name: str
+    category: str
+    folded: str
+    terms: Tuple[str, ...]
+
+
+class SearchIndex:
+    def __init__(self, max_results: int = 50, cache_size: int = 1024):
+        self.max_results = max_results
+        self.cache_size = cache_size
+        self.entries: Dict[DocKey, SearchEntry] = {}
+        self.postings: Dict[str, Set[DocKey]] = {}
+        self.terms: List[str] = []  # sorted keys of postings
+        # (words, kind) -> up to max_results ranked entries
+        self.results: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.task: Optional[asyncio.Task] = None
+        self.builds = 0
+        # One list per rebuild in progress, collecting the changes made meanwhile
+        self.recorders: List[list] = []
+
+    async def start(self, load: Callable[[], Awaitable[list]], refresh_interval: float = 0, build_now: bool = True) -> None:
+        """Build the index from ``load()``'s ``(kind, doc)`` pairs, then rebuild periodically.
+
+        A failed first build is retried by the refresh loop instead of
+        holding up startup; ``build_now=False`` skips it altogether.
+        """
+        if build_now:
+            try:
+                await self.rebuild(load)
+            except Exception:
+                logger.exception("Could not build the search index")
+        if refresh_interval > 0:
+            self.task = asyncio.create_task(self._refresh(load, refresh_interval))
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def _refresh(self, load, refresh_interval: float) -> None:
+        while True:
+            await asyncio.sleep(refresh_interval)
+            try:
+                await self.rebuild(load)
+            except Exception:
+                logger.exception("Could not rebuild the search index")
+
+    def add(self, kind: str, doc: dict) -> None:
+        """Index a document, replacing any earlier version of it."""
+        for changes in self.recorders:
+            changes.append(("add", kind, doc))
+        key = (kind, doc["id"])
+        self._unindex(*key)
+        self.results.clear()
+        terms = tuple(dict.fromkeys(tokenize(doc["name"])))
+        self.entries[key] = SearchEntry(kind, doc["id"], doc["name"], doc.get("category", ""), fold(doc["name"]), terms)
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = set()
+                insort(self.terms, term)
+            posting.add(key)
+
+    def remove(self, kind: str, doc_id: str) -> None:
+        for changes in self.recorders:
+            changes.append(("remove", kind, doc_id))
+        self._unindex(kind, doc_id)
+
+    def _unindex(self, kind: str, doc_id: str) -> None:
+        entry = self.entries.pop((kind, doc_id), None)
+        if entry is None:
+            return
+        self.results.clear()
+        for term in entry.terms:
+            posting = self.postings[term]
+            posting.discard((kind, doc_id))
+            if not posting:
+                del self.postings[term]
+                del self.terms[bisect_left(self.terms, term)]
+
+    async def rebuild(self, load: Callable[[], Awaitable[list]]) -> None:
+        """Rebuild from ``load()``'s ``(kind, doc)`` pairs.
+
+        Documents added or removed while ``load()`` runs may be missing
+        from (or still in) its snapshot, so those calls are replayed onto
+        the new index before it is swapped in.
+        """
+        changes: list = []
+        self.recorders.append(changes)
+        try:
+            docs = await load()
+        finally:
+            self.recorders.remove(changes)
+        self.replace(docs, changes)
+
+    def replace(self, docs: Iterable[Tuple[str, dict]], changes: Iterable[tuple] = ()) -> None:
+        """Rebuild from ``(kind, doc)`` pairs, swapping the new index in at the end.
+
+        ``changes`` are ``(method name, *args)`` calls recorded by rebuild, applied on top.
+        """
+        fresh = SearchIndex()
+        for kind, doc in docs:
+            fresh.add(kind, doc)
+        for method, *args in changes:
+            getattr(fresh, method)(*args)
+        self.entries, self.postings, self.terms = fresh.entries, fresh.postings, fresh.terms
+        self.results.clear()
+        self.builds += 1
+
+    def _prefix_matches(self, prefix: str) -> Set[DocKey]:
+        matches: Set[DocKey] = set()
+        for index in range(bisect_left(self.terms, prefix), len(self.terms)):
+            term = self.terms[index]
+            if not term.startswith(prefix):
+                break
+            matches |= self.postings[term]
+        return matches
+
+    def search(self, query: str, kind: Optional[str] = None, limit: int = 20) -> List[SearchEntry]:
+        """Documents whose words start with every word of ``query``, best first.
+
+        Whole-word matches rank above prefix matches, names starting with
+        the query above the rest, then shorter names first. At most
+        max_results are returned.
+        """
+        words = tuple(tokenize(query))
+        if not words:
+            return []
+        key = (words, kind)
+        results = self.results.get(key)
+        if results is not None:
+            self.hits += 1
+            self.results.move_to_end(key)
+        else:
+            self.misses += 1
+            results = self._rank(words, kind)
+            self.results[key] = results
+            if len(self.results) > self.cache_size:
+                self.results.popitem(last=False)
+        return results[:limit]
+
+    def _rank(self, words: Tuple[str, ...], kind: Optional[str]) -> List[SearchEntry]:
+        # Most selective (longest) prefix first keeps the intersections small
+        candidates: Optional[Set[DocKey]] = None
+        for word in sorted(set(words), key=len, reverse=True):
+            matches = self._prefix_matches(word)
+            candidates = matches if candidates is None else candidates & matches
+            if not candidates:
+                return []
+        if kind is not None:
+            candidates = {key for key in candidates if key[0] == kind}
+
+        folded_query = " ".join(words)
+        unique_words = set(words)
+
+        def rank(key: DocKey):
+            entry = self.entries[key]
+            whole_words = len(unique_words.intersection(entry.terms))
+            return (-whole_words, not entry.folded.startswith(folded_query), len(entry.folded), entry.folded, key)
+
+        return [self.entries[key] for key in heapq.nsmallest(self.max_results, candidates, key=rank)]
+
+    def stats(self) -> dict:
+        return {
+            "documents": len(self.entries),
+            "terms": len(self.terms),
+            "builds": self.builds,
+            "cached_queries": len(self.results),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -1,16 +1,42 @@
-from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File
+from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form, Header, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, IndexModel, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
 import os
+import asyncio
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, Field, ValidationError, field_validator
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 import base64
+import binascii
+import json
+import time
+import xml.etree.ElementTree as ET
+from collections import Counter
 
+from admission import BodySizeLimitMiddleware, ConcurrencyLimiter, ConcurrencyLimitMiddleware
+from blob_gc import BlobCollector
+from blob_store import create_blob_store, iter_upload
+import fast_json
+from lifecycle import RequestTracker, RequestTrackerMiddleware, install_drain_signal_handlers
+from metrics import Metrics, MetricsMiddleware, MongoCommandListener, gauge
+from catalog_feed import WATCHED_COLLECTIONS, CatalogFeed
+from catalog_import import iter_file, read_ndjson
+from embedded_store import EmbeddedClient
+from catalog_cache import CachedBody, CatalogCache, etag_matches, make_etag, negotiate_encoding
+from search_index import SearchIndex
+from strokes import COORDINATE_MAX, COORDINATE_MIN, pack_points, rasterize_strokes
+from svg_transform import build_sprite, minify_svg, render_variant, symbol_id
+from zip_stream import ZipStreamWriter
+from write_behind import WriteBehindQueue
+from thumbnails import THUMBNAIL_URL_PREFIX, ThumbnailJob, ThumbnailWorker, sniff_content_type
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -18,8 +44,180 @@ load_dotenv(ROOT_DIR / '.env')
 # MongoDB connection
 mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
 db_name = os.environ.get('DB_NAME', 'coloring_game_db')
-client = AsyncIOMotorClient(mongo_url)
-db = client[db_name]
+# Pool settings are per worker process; size them for WEB_CONCURRENCY workers
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '50'))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '5'))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '5000'))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+# Seconds between SIGTERM and the server closing its listener, during which
+# readiness fails so the load balancer can stop routing here; set it to at
+# least the load balancer's readiness probe interval
+SHUTDOWN_READINESS_DELAY = float(os.environ.get('SHUTDOWN_READINESS_DELAY', '5'))
+# Seconds to wait for in-flight requests on shutdown before closing the client
+SHUTDOWN_DRAIN_TIMEOUT = float(os.environ.get('SHUTDOWN_DRAIN_TIMEOUT', '20'))
+READINESS_TIMEOUT = float(os.environ.get('READINESS_TIMEOUT', '2'))
+# Startup pings Mongo once with this timeout; if it does not answer, the
+# steps that need it (indexes, search index) are retried in the background
+# every STARTUP_RETRY_INTERVAL seconds instead of each waiting out the
+# server selection timeout in turn
+STARTUP_PING_TIMEOUT = float(os.environ.get('STARTUP_PING_TIMEOUT', '2'))
+STARTUP_RETRY_INTERVAL = float(os.environ.get('STARTUP_RETRY_INTERVAL', '5'))
+
+# "mongo", or "sqlite" for the embedded single-node store (see embedded_store.py)
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'mongo')
+EMBEDDED_STORE_PATH = os.environ.get('EMBEDDED_STORE_PATH', str(ROOT_DIR / 'data'))
+if STORAGE_BACKEND == 'sqlite' and os.environ.get('BLOB_STORE') == 'gridfs':
+    raise RuntimeError("BLOB_STORE=gridfs needs MongoDB; use the filesystem blob store with STORAGE_BACKEND=sqlite")
+
+# Request and Mongo command timings, exported at /api/metrics
+metrics = Metrics()
+request_tracker = RequestTracker()
+
+def create_client() -> AsyncIOMotorClient:
+    if STORAGE_BACKEND == 'sqlite':
+        return EmbeddedClient(EMBEDDED_STORE_PATH)
+    return AsyncIOMotorClient(
+        mongo_url,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        event_listeners=[MongoCommandListener(metrics)],
+    )
+
+# Created per worker process in the connect_db startup hook: a client made
+# at import time would be shared across fork() by multi-worker servers
+client: Optional[AsyncIOMotorClient] = None
+db = None
+# Whether Mongo answered the startup ping, and the task finishing startup once it does
+mongo_reachable = False
+deferred_startup: Optional[asyncio.Task] = None
+
+# How long a retried POST with the same Idempotency-Key returns the original artwork
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', str(24 * 3600)))
+# Seconds a claimed key answers "in progress" while its artwork is missing;
+# after that a retry takes the key over, e.g. when the first request crashed
+IDEMPOTENCY_LEASE = int(os.environ.get('IDEMPOTENCY_LEASE', '60'))
+
+# Indexes backing every route's filter and sort; see query_plan_check.py
+INDEXES = {
+    "coloring_pages": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("created_at", ASCENDING), ("id", ASCENDING)]),
+        IndexModel([("category", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)]),
+        IndexModel([("thumbnail", ASCENDING)]),
+    ],
+    "user_artworks": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("completed_at", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("completed_at", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("image_hash", ASCENDING)], sparse=True),
+        # Not sparse, so the thumbnail backfill's {"thumbnail": None} can use it;
+        # ("id") keeps it apart from the sparse index older databases still have
+        IndexModel([("thumbnail", ASCENDING), ("id", ASCENDING)]),
+    ],
+    "artwork_strokes": [
+        IndexModel([("id", ASCENDING)], unique=True),
+    ],
+    "stickers": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("created_at", ASCENDING), ("id", ASCENDING)]),
+        IndexModel([("category", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)]),
+    ],
+    "idempotency_keys": [
+        IndexModel([("user_id", ASCENDING), ("key", ASCENDING)], unique=True),
+        IndexModel([("created_at", ASCENDING)], expireAfterSeconds=IDEMPOTENCY_KEY_TTL),
+        IndexModel([("artwork_id", ASCENDING)]),
+    ],
+    "blob_gc": [
+        IndexModel([("hash", ASCENDING)], unique=True),
+        IndexModel([("due_at", ASCENDING)]),
+    ],
+}
+
+async def ensure_indexes(database) -> None:
+    # createIndexes is a no-op for indexes that already exist with the same spec
+    for collection_name, indexes in INDEXES.items():
+        try:
+            await database[collection_name].create_indexes(indexes)
+        except PyMongoError:
+            logger.exception("Could not create indexes on %s", collection_name)
+
+async def warm_up_pool(mongo_client) -> None:
+    """Open minPoolSize connections before the first request needs them."""
+    await asyncio.gather(*(mongo_client.admin.command("ping") for _ in range(max(1, MONGO_MIN_POOL_SIZE))))
+
+async def ping_mongo(mongo_client) -> bool:
+    try:
+        await asyncio.wait_for(mongo_client.admin.command("ping"), STARTUP_PING_TIMEOUT)
+    except Exception as e:
+        logger.warning("Mongo is not reachable: %r", e)
+        return False
+    return True
+
+# Artwork images uploaded as files are stored by content hash outside Mongo;
+# set alongside db in connect_db since the GridFS store needs the database
+blob_store = None
+
+# Blobs no artwork refers to any more are deleted BLOB_GC_DELAY seconds
+# later, so saves of the same image racing the delete can land first
+blob_collector = BlobCollector(
+    delay=float(os.environ.get('BLOB_GC_DELAY', '300')),
+    interval=float(os.environ.get('BLOB_GC_INTERVAL', '60')),
+)
+
+# Serve list routes straight from Mongo documents, skipping Pydantic models
+FAST_SERIALIZATION = os.environ.get('FAST_SERIALIZATION', '0') == '1'
+
+# Rendered catalog responses (coloring pages and stickers)
+catalog_cache = CatalogCache(
+    max_entries=int(os.environ.get('CATALOG_CACHE_MAX_ENTRIES', '256')),
+    ttl=float(os.environ.get('CATALOG_CACHE_TTL', '60')),
+)
+
+# Catalog changes pushed to /api/catalog/stream clients. Streams are closed
+# when the worker starts draining, and after SSE_MAX_STREAM_SECONDS so
+# clients spread over workers again; EventSource reconnects and resumes
+# from its Last-Event-ID.
+catalog_feed = CatalogFeed()
+SSE_HEARTBEAT_SECONDS = float(os.environ.get('SSE_HEARTBEAT_SECONDS', '15'))
+SSE_MAX_STREAM_SECONDS = float(os.environ.get('SSE_MAX_STREAM_SECONDS', '300'))
+
+# Name search and autocomplete over the catalog, served from memory; rebuilt
+# every SEARCH_INDEX_REFRESH seconds to pick up other workers' writes when
+# change streams are unavailable (0 disables)
+MAX_SEARCH_RESULTS = 50
+search_index = SearchIndex(max_results=MAX_SEARCH_RESULTS)
+SEARCH_INDEX_REFRESH = float(os.environ.get('SEARCH_INDEX_REFRESH', '300'))
+
+# Request bodies are capped while they stream in; uploads get a larger cap
+MAX_REQUEST_BODY_BYTES = int(os.environ.get('MAX_REQUEST_BODY_BYTES', str(4 * 1024 * 1024)))
+MAX_UPLOAD_BODY_BYTES = int(os.environ.get('MAX_UPLOAD_BODY_BYTES', str(10 * 1024 * 1024)))
+# Catalog bundles are parsed as they stream in, so only the network bounds them
+MAX_IMPORT_BODY_BYTES = int(os.environ.get('MAX_IMPORT_BODY_BYTES', str(512 * 1024 * 1024)))
+UPLOAD_ROUTES = {("POST", "/api/artworks"), ("POST", "/api/artworks/upload")}
+
+# Uploads beyond UPLOAD_CONCURRENCY wait briefly, then get 429/503 with Retry-After
+upload_limiter = ConcurrencyLimiter(
+    limit=int(os.environ.get('UPLOAD_CONCURRENCY', '8')),
+    queue_size=int(os.environ.get('UPLOAD_QUEUE_SIZE', '16')),
+    queue_timeout=float(os.environ.get('UPLOAD_QUEUE_TIMEOUT', '2')),
+)
+
+# Optional write-behind for artwork saves: acknowledged once queued, inserted in batches
+WRITE_BEHIND = os.environ.get('WRITE_BEHIND', '0') == '1'
+artwork_writer = WriteBehindQueue(
+    max_batch=int(os.environ.get('WRITE_BEHIND_MAX_BATCH', '100')),
+    max_delay=float(os.environ.get('WRITE_BEHIND_MAX_DELAY', '0.2')),
+    max_queue=int(os.environ.get('WRITE_BEHIND_MAX_QUEUE', '5000')),
+)
+# blob hash -> queued artworks using it, so the blob GC keeps their blobs
+queued_artwork_blobs: Counter = Counter()
+# artwork id -> queued document, so Idempotency-Key retries find it before its flush
+queued_artworks: Dict[str, dict] = {}
+
+# Thumbnails are rendered off the request path in a process pool
+thumbnail_worker = ThumbnailWorker()
 
 # Create the main app without a prefix
 app = FastAPI()
@@ -38,6 +236,14 @@ class ColoringPage(BaseModel):
     thumbnail: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+class ColoringPageSummary(BaseModel):
+    id: str
+    name: str
+    category: str
+    difficulty: str
+    thumbnail: Optional[str] = None
+    created_at: datetime
+
 class ColoringPageCreate(BaseModel):
     name: str
     category: str
@@ -49,9 +255,16 @@ class UserArtwork(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: Optional[str] = None
     coloring_page_id: str
-    artwork_data: str  # base64 encoded image
+    artwork_data: Optional[str] = None  # base64 encoded image (legacy inline storage)
+    image_hash: Optional[str] = None  # sha256 of the image in the blob store
+    image_size: Optional[int] = None
+    content_type: Optional[str] = None
+    thumbnail: Optional[str] = None
     completed_at: datetime = Field(default_factory=datetime.utcnow)
     title: Optional[str] = None
+    format: str = "image"  # "strokes" for vector artworks saved with PATCH .../strokes
+    width: Optional[int] = None
+    height: Optional[int] = None
 
 class UserArtworkCreate(BaseModel):
     user_id: Optional[str] = None
@@ -59,6 +272,43 @@ class UserArtworkCreate(BaseModel):
     artwork_data: str
     title: Optional[str] = None
 
+# Stroke-based artworks
+MAX_STROKE_POINTS = 2000
+MAX_STROKES_PER_PATCH = 500
+MAX_ARTWORK_STROKES = 1000
+
+class Stroke(BaseModel):
+    color: str = Field(..., pattern="^#[0-9A-Fa-f]{6}$")
+    width: int = Field(..., ge=1, le=100)
+    points: List[float] = Field(..., min_length=2, max_length=2 * MAX_STROKE_POINTS)  # x0, y0, x1, y1, ...
+
+    @field_validator("points")
+    @classmethod
+    def check_points(cls, points: List[float]) -> List[float]:
+        if len(points) % 2:
+            raise ValueError("points must be flat x, y pairs")
+        if any(not COORDINATE_MIN <= value <= COORDINATE_MAX for value in points):
+            raise ValueError("point outside the drawable range")
+        return points
+
+class StrokeArtworkCreate(BaseModel):
+    user_id: Optional[str] = None
+    coloring_page_id: str
+    title: Optional[str] = None
+    width: int = Field(500, ge=1, le=4096)
+    height: int = Field(350, ge=1, le=4096)
+    strokes: List[Stroke] = Field(default_factory=list, max_length=MAX_STROKES_PER_PATCH)
+
+class StrokesPatch(BaseModel):
+    offset: int = Field(..., ge=0)  # index of the first stroke in this patch
+    strokes: List[Stroke] = Field(default_factory=list, max_length=MAX_STROKES_PER_PATCH)
+    title: Optional[str] = None
+
+class StrokesPatchResult(BaseModel):
+    id: str
+    stroke_count: int
+    version: int
+
 class Sticker(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str
@@ -66,140 +316,1205 @@ class Sticker(BaseModel):
     svg_content: str
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+class StickerSummary(BaseModel):
+    id: str
+    name: str
+    category: str
+    created_at: datetime
+
+class StickerCreate(BaseModel):
+    name: str
+    category: str
+    svg_content: str
+
+# Search
+class SearchResult(BaseModel):
+    type: str  # "page" or "sticker"
+    id: str
+    name: str
+    category: str
+
+# Bulk operations
+MAX_BATCH_SIZE = 500
+
+class BatchItemResult(BaseModel):
+    index: int
+    id: Optional[str] = None
+    error: Optional[str] = None
+
+class BatchInsertResult(BaseModel):
+    inserted: List[BatchItemResult]
+    errors: List[BatchItemResult]
+
+class ArtworkBatchDelete(BaseModel):
+    ids: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+
+class BatchDeleteResult(BaseModel):
+    deleted: List[str]
+    not_found: List[str]
+
+# Catalog import
+IMPORT_BATCH_SIZE = MAX_BATCH_SIZE
+MAX_REPORTED_IMPORT_ERRORS = 100
+
+class ImportCounts(BaseModel):
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    skipped: int = 0  # repeats of an id seen earlier in the same import
+
+class ImportLineError(BaseModel):
+    line: int
+    error: str
+
+class CatalogImportResult(BaseModel):
+    lines: int = 0
+    pages: ImportCounts = Field(default_factory=ImportCounts)
+    stickers: ImportCounts = Field(default_factory=ImportCounts)
+    errors: List[ImportLineError] = Field(default_factory=list)  # the first MAX_REPORTED_IMPORT_ERRORS
+    error_count: int = 0
+
+    def add_error(self, line: int, error: str) -> None:
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_IMPORT_ERRORS:
+            self.errors.append(ImportLineError(line=line, error=error))
+
+    def progress(self) -> dict:
+        return self.dict(exclude={"errors"})
+
+# Heavy fields left out of list responses when fields=summary
+SUMMARY_EXCLUDED_FIELDS = {
+    "coloring_pages": ["svg_content"],
+    "user_artworks": ["artwork_data"],
+    "stickers": ["svg_content"],
+}
+
+# List pagination
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(doc: dict, sort_field: str) -> str:
+    raw = json.dumps([doc[sort_field].isoformat(), doc["id"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, last_id = json.loads(raw)
+        return datetime.fromisoformat(value), str(last_id)
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+async def find_page(
+    collection,
+    query: dict,
+    sort_field: str,
+    direction: int,
+    limit: int,
+    after: Optional[str],
+    summary: bool,
+):
+    """Fetch one keyset-paginated page, sorted by (sort_field, id).
+
+    Returns the documents and the cursor for the following page, which
+    routes send in the X-Next-Cursor header so list bodies stay plain
+    JSON arrays.
+    """
+    if after:
+        value, last_id = decode_cursor(after)
+        op = "$lt" if direction < 0 else "$gt"
+        query = {
+            **query,
+            "$or": [
+                {sort_field: {op: value}},
+                {sort_field: value, "id": {op: last_id}},
+            ],
+        }
+    projection = {"_id": 0}
+    if summary:
+        projection.update({field: 0 for field in SUMMARY_EXCLUDED_FIELDS[collection.name]})
+
+    cursor = collection.find(query, projection).sort([(sort_field, direction), ("id", direction)])
+    docs = await cursor.limit(limit + 1).to_list(limit + 1)
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1], sort_field)
+    return docs, next_cursor
+
+def to_models(model, docs: List[dict]) -> list:
+    """Build response models from documents, or shape them like the models in fast mode."""
+    start = time.perf_counter()
+    if FAST_SERIALIZATION:
+        models = fast_json.project(model, docs)
+    else:
+        models = [model(**doc) for doc in docs]
+    mode = "fast" if FAST_SERIALIZATION else "models"
+    metrics.serialization_duration.observe(("validate", mode), time.perf_counter() - start)
+    return models
+
+def encode_json(content) -> bytes:
+    start = time.perf_counter()
+    if FAST_SERIALIZATION:
+        body = fast_json.dumps(content)
+    else:
+        body = JSONResponse(jsonable_encoder(content)).body
+    mode = "fast" if FAST_SERIALIZATION else "models"
+    metrics.serialization_duration.observe(("encode", mode), time.perf_counter() - start)
+    return body
+
+def catalog_changed(collection_name: str, docs: List[dict], op: str = "insert") -> None:
+    """Drop cached catalog bodies, index the documents for search and announce them to stream clients."""
+    catalog_cache.invalidate()
+    kind = WATCHED_COLLECTIONS[collection_name]
+    for doc in docs:
+        search_index.add(kind, doc)
+        catalog_feed.publish_local(kind, op, doc)
+
+def catalog_stream_changed(kind: str, op: str, doc: dict) -> None:
+    """Apply a change reported by the change stream, possibly made by another worker."""
+    catalog_cache.invalidate()
+    search_index.add(kind, doc)
+
+async def load_search_documents() -> List[tuple]:
+    projection = {"_id": 0, "id": 1, "name": 1, "category": 1}
+    docs = []
+    for collection_name, kind in WATCHED_COLLECTIONS.items():
+        async for doc in db[collection_name].find({}, projection):
+            docs.append((kind, doc))
+    return docs
+
+async def cached_catalog_response(request: Request, build, media_type: str = "application/json") -> Response:
+    """Serve a catalog route from catalog_cache, rendering it on a miss.
+
+    ``build`` returns the response content and any extra headers. The key
+    covers the route path and every query parameter (category, fields,
+    limit, after). Content is JSON-encoded unless a media type other than
+    JSON is given, in which case it must already be a string.
+
+    Bodies are compressed with br or gzip per Accept-Encoding; each encoding
+    is computed once and kept on the cache entry, and gets its own ETag.
+    """
+    key = (request.url.path, tuple(sorted(request.query_params.multi_items())))
+    cached = catalog_cache.get(key)
+    if cached is None:
+        version = catalog_cache.version
+        content, headers = await build()
+        if media_type == "application/json":
+            body = encode_json(content)
+        else:
+            body = content.encode("utf-8")
+        cached = CachedBody(body, make_etag(body), headers, {})
+        catalog_cache.set(key, cached, version)
+
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"), len(cached.body))
+    etag = cached.etag if encoding is None else f'{cached.etag[:-1]}-{encoding}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding", **cached.headers}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    if encoding is None:
+        return Response(content=cached.body, media_type=media_type, headers=headers)
+
+    body = cached.encoded.get(encoding)
+    if body is None:
+        body = await asyncio.to_thread(cached.encode, encoding)
+    headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=media_type, headers=headers)
+
+def normalize_svg(svg_content: str) -> str:
+    try:
+        return minify_svg(svg_content)
+    except (ET.ParseError, ValueError):
+        raise HTTPException(status_code=422, detail="svg_content is not a valid SVG document")
+
+def validation_message(e: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+
+async def insert_batch(collection, items: List[Dict[str, Any]], create_model, model):
+    """Validate items one by one and insert the valid ones in a single unordered insert_many.
+
+    A bad item is reported by its index in the request instead of failing
+    the whole batch. Returns the result and the inserted documents.
+    """
+    if len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_SIZE} items per batch")
+
+    errors = []
+    docs, indexes = [], []
+    for index, item in enumerate(items):
+        try:
+            data = create_model(**item).dict()
+            data["svg_content"] = normalize_svg(data["svg_content"])
+        except ValidationError as e:
+            errors.append(BatchItemResult(index=index, error=validation_message(e)))
+            continue
+        except HTTPException as e:
+            errors.append(BatchItemResult(index=index, error=e.detail))
+            continue
+        docs.append(model(**data).dict())
+        indexes.append(index)
+
+    failed = set()
+    if docs:
+        try:
+            await collection.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            for write_error in e.details.get("writeErrors", []):
+                failed.add(write_error["index"])
+                errors.append(BatchItemResult(index=indexes[write_error["index"]], error=write_error["errmsg"]))
+
+    inserted_docs = [doc for n, doc in enumerate(docs) if n not in failed]
+    inserted = [
+        BatchItemResult(index=indexes[n], id=doc["id"]) for n, doc in enumerate(docs) if n not in failed
+    ]
+    if inserted:
+        catalog_changed(collection.name, inserted_docs)
+    errors.sort(key=lambda result: result.index)
+    return BatchInsertResult(inserted=inserted, errors=errors), inserted_docs
+
+async def blob_referenced(blob_hash: str) -> bool:
+    """Whether any artwork uses the blob as its image or thumbnail, queued saves included."""
+    if queued_artwork_blobs[blob_hash]:
+        return True
+    query = {"$or": [{"image_hash": blob_hash}, {"thumbnail": THUMBNAIL_URL_PREFIX + blob_hash}]}
+    return await db.user_artworks.find_one(query, {"_id": 1}) is not None
+
+async def release_artwork_blobs(artworks: List[dict]) -> None:
+    """Schedule image and thumbnail blobs no remaining artwork refers to for deletion.
+
+    Blobs are shared by content hash, so they can only go once unreferenced;
+    blob_collector deletes them after BLOB_GC_DELAY if that is still the case.
+    """
+    blob_hashes = {a["image_hash"] for a in artworks if a.get("image_hash")}
+    blob_hashes |= {a["thumbnail"][len(THUMBNAIL_URL_PREFIX):] for a in artworks if a.get("thumbnail")}
+    await blob_collector.schedule([h for h in blob_hashes if not await blob_referenced(h)])
+
+async def check_artwork_blobs(artwork_obj: UserArtwork, restore_image: Callable[[], Awaitable]) -> None:
+    """Undo a blob sweep that raced with this save, now that the artwork is visible.
+
+    The image is put back with ``restore_image()``; a reused thumbnail that
+    is gone is rendered again.
+    """
+    if not await blob_store.exists(artwork_obj.image_hash):
+        await restore_image()
+    thumbnail = artwork_obj.thumbnail
+    if thumbnail and not await blob_store.exists(thumbnail[len(THUMBNAIL_URL_PREFIX):]):
+        await db.user_artworks.update_one({"id": artwork_obj.id}, {"$unset": {"thumbnail": ""}})
+        artwork_obj.thumbnail = None
+
+async def store_artwork(
+    artwork_obj: UserArtwork, idempotency_key: Optional[str], restore_image: Callable[[], Awaitable],
+) -> UserArtwork:
+    """Insert an artwork whose image is already in the blob store.
+
+    A retry carrying an Idempotency-Key we have seen for this user returns
+    the artwork the first request created instead of inserting another.
+    Identical images share one blob, and an existing thumbnail for the same
+    image is reused rather than rendered again. ``restore_image()`` stores
+    the image again if the blob GC removed it before the insert.
+    """
+    if idempotency_key:
+        original = await claim_idempotency_key(artwork_obj, idempotency_key)
+        if original is not None:
+            return original
+
+    twin = await db.user_artworks.find_one(
+        {"image_hash": artwork_obj.image_hash, "thumbnail": {"$ne": None}}, {"_id": 0, "thumbnail": 1}
+    )
+    if twin is not None:
+        artwork_obj.thumbnail = twin["thumbnail"]
+    if WRITE_BEHIND:
+        # Thumbnail jobs are submitted by artworks_flushed once the document exists
+        doc = artwork_obj.dict()
+        queued_artwork_blobs.update(artwork_blob_hashes(doc))
+        queued_artworks[doc["id"]] = doc
+        try:
+            await artwork_writer.put(doc)
+        except BaseException:
+            unqueue_artwork_blobs(doc)
+            raise
+        return artwork_obj
+    try:
+        await db.user_artworks.insert_one(artwork_obj.dict())
+    except Exception:
+        if idempotency_key:
+            await db.idempotency_keys.delete_one({"user_id": artwork_obj.user_id, "key": idempotency_key})
+        raise
+    await check_artwork_blobs(artwork_obj, restore_image)
+    if artwork_obj.thumbnail is None:
+        thumbnail_worker.submit(ThumbnailJob("artwork", artwork_obj.id, image_hash=artwork_obj.image_hash))
+    return artwork_obj
+
+def artwork_blob_hashes(doc: dict) -> List[str]:
+    hashes = [doc["image_hash"]] if doc.get("image_hash") else []
+    if doc.get("thumbnail"):
+        hashes.append(doc["thumbnail"][len(THUMBNAIL_URL_PREFIX):])
+    return hashes
+
+def unqueue_artwork_blobs(doc: dict) -> None:
+    queued_artworks.pop(doc["id"], None)
+    for blob_hash in artwork_blob_hashes(doc):
+        queued_artwork_blobs[blob_hash] -= 1
+        if queued_artwork_blobs[blob_hash] <= 0:
+            del queued_artwork_blobs[blob_hash]
+
+def artworks_flushed(docs: List[dict], duration: float, lag: float) -> None:
+    metrics.write_behind_flush_duration.observe((), duration)
+    metrics.write_behind_lag.observe((), lag)
+    for doc in docs:
+        unqueue_artwork_blobs(doc)
+        if doc.get("thumbnail") is None:
+            thumbnail_worker.submit(ThumbnailJob("artwork", doc["id"], image_hash=doc.get("image_hash")))
+
+async def artworks_failed(docs: List[dict]) -> None:
+    """Undo queued saves that were never written.
+
+    Their Idempotency-Keys are released so a retry is not told the save is
+    still in progress, and their blobs are released like a delete's.
+    """
+    for doc in docs:
+        unqueue_artwork_blobs(doc)
+    await db.idempotency_keys.delete_many({"artwork_id": {"$in": [doc["id"] for doc in docs]}})
+    await release_artwork_blobs(docs)
+
+async def claim_idempotency_key(artwork_obj: UserArtwork, idempotency_key: str) -> Optional[UserArtwork]:
+    """Claim the key for this save, or return the artwork an earlier request saved with it.
+
+    A claim whose artwork is neither stored nor queued here answers 409
+    "in progress" for IDEMPOTENCY_LEASE seconds. After that the first
+    retry takes it over, so a request that died between claiming the key
+    and inserting its artwork does not block the key until its TTL.
+    """
+    now = datetime.utcnow()
+    lease_until = now + timedelta(seconds=IDEMPOTENCY_LEASE)
+    claim = {
+        "user_id": artwork_obj.user_id,
+        "key": idempotency_key,
+        "artwork_id": artwork_obj.id,
+        "image_hash": artwork_obj.image_hash,
+        "created_at": now,
+        "lease_until": lease_until,
+    }
+    try:
+        await db.idempotency_keys.insert_one(claim)
+        return None
+    except DuplicateKeyError:
+        pass
+
+    query = {"user_id": artwork_obj.user_id, "key": idempotency_key}
+    existing = await db.idempotency_keys.find_one(query, {"_id": 0})
+    if existing is None:
+        # The first request failed and released the key in the meantime
+        raise HTTPException(status_code=409, detail="Request with this Idempotency-Key failed, retry it")
+    if existing["image_hash"] != artwork_obj.image_hash:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different artwork")
+    original = queued_artworks.get(existing["artwork_id"])
+    if original is None:
+        original = await db.user_artworks.find_one({"id": existing["artwork_id"]}, {"_id": 0})
+    if original is not None:
+        return UserArtwork(**original)
+
+    in_progress = HTTPException(
+        status_code=409,
+        detail="Request with this Idempotency-Key is still in progress",
+        headers={"Retry-After": "1"},
+    )
+    # Claims from before leases existed expire one lease after creation
+    if (existing.get("lease_until") or existing["created_at"] + timedelta(seconds=IDEMPOTENCY_LEASE)) > now:
+        raise in_progress
+    # Matching on the old artwork id lets only one retry take the key over
+    taken = await db.idempotency_keys.find_one_and_update(
+        {**query, "artwork_id": existing["artwork_id"]},
+        {"$set": {"artwork_id": artwork_obj.id, "created_at": now, "lease_until": lease_until}},
+    )
+    if taken is None:
+        raise in_progress
+    return None
+
+def pack_strokes(strokes: List[Stroke]) -> List[dict]:
+    return [{"color": stroke.color, "width": stroke.width, "points": pack_points(stroke.points)} for stroke in strokes]
+
+async def render_stroke_artwork(artwork_id: str, artwork: dict) -> dict:
+    """Make sure a stroke artwork's cached PNG matches its current strokes.
+
+    The PNG lives in the blob store like an uploaded image; rendered_version
+    records which strokes version it was drawn from, so it is only redrawn
+    after a PATCH.
+    """
+    state = await db.artwork_strokes.find_one({"id": artwork_id}, {"_id": 0, "version": 1})
+    if state is None or (artwork.get("image_hash") and artwork.get("rendered_version") == state["version"]):
+        return artwork
+    state = await db.artwork_strokes.find_one({"id": artwork_id}, {"_id": 0})
+    data = await thumbnail_worker.render(
+        rasterize_strokes, state["strokes"], artwork.get("width") or 500, artwork.get("height") or 350
+    )
+    if data is None:
+        raise HTTPException(status_code=503, detail="Stroke rendering is not available")
+    blob = await blob_store.put_bytes(data)
+
+    # Newer renders win when two requests render concurrently
+    previous = await db.user_artworks.find_one_and_update(
+        {"id": artwork_id, "$or": [{"rendered_version": None}, {"rendered_version": {"$lt": state["version"]}}]},
+        {"$set": {"image_hash": blob.hash, "image_size": blob.size, "rendered_version": state["version"]}},
+        {"_id": 0, "image_hash": 1, "thumbnail": 1},
+    )
+    if previous is None:
+        # A newer render won (or the artwork is gone), so ours is not used
+        await release_artwork_blobs([{"image_hash": blob.hash}])
+        current = await db.user_artworks.find_one({"id": artwork_id}, {"_id": 0, "image_hash": 1, "rendered_version": 1})
+        return {**artwork, **(current or {})}
+    if not await blob_store.exists(blob.hash):
+        await blob_store.put_bytes(data)
+    if previous.get("image_hash") != blob.hash:
+        await db.user_artworks.update_one({"id": artwork_id, "image_hash": blob.hash}, {"$unset": {"thumbnail": ""}})
+        await release_artwork_blobs([previous])
+        thumbnail_worker.submit(ThumbnailJob("artwork", artwork_id, image_hash=blob.hash))
+    return {**artwork, "image_hash": blob.hash, "rendered_version": state["version"]}
+
+# Gallery export
+EXPORT_BATCH_SIZE = 16  # legacy artworks carry their image inline, so keep batches small
+EXPORT_EXTENSIONS = {"image/png": "png", "image/webp": "webp", "image/jpeg": "jpg", "image/svg+xml": "svg"}
+
+def export_file_name(artwork: dict) -> str:
+    extension = EXPORT_EXTENSIONS.get(artwork.get("content_type") or "image/png", "png")
+    return f"artworks/{artwork['completed_at']:%Y%m%d-%H%M%S}-{artwork['id'][:8]}.{extension}"
+
+async def export_artwork_images(artwork: dict):
+    """Yield an artwork's image bytes in chunks, or None if it has no image."""
+    if artwork.get("format") == "strokes":
+        try:
+            artwork = await render_stroke_artwork(artwork["id"], artwork)
+        except HTTPException:
+            return None
+    if artwork.get("image_hash"):
+        return await blob_store.open(artwork["image_hash"])
+    try:
+        data = base64.b64decode(artwork.get("artwork_data") or "", validate=True)
+    except binascii.Error:
+        return None
+
+    async def single():
+        yield data
+    return single() if data else None
+
+async def stream_artwork_export(user_id: str):
+    """Stream a user's gallery as a ZIP of images followed by manifest.json.
+
+    Artworks are read lazily from the cursor and each image is written to
+    the archive as its chunks arrive. The manifest comes from a second,
+    metadata-only pass so only the ids of artworks without an image are
+    kept in between; those are listed with "missing": true and no file.
+    Both passes stop at the export start time.
+    """
+    started = datetime.utcnow()
+    query = {"user_id": user_id, "completed_at": {"$lte": started}}
+    sort = [("completed_at", DESCENDING), ("id", DESCENDING)]
+    writer = ZipStreamWriter()
+    missing = set()
+
+    cursor = db.user_artworks.find(query, {
+        "_id": 0, "id": 1, "completed_at": 1, "artwork_data": 1, "image_hash": 1, "content_type": 1,
+        "format": 1, "rendered_version": 1, "width": 1, "height": 1,
+    }).sort(sort).batch_size(EXPORT_BATCH_SIZE)
+    async for artwork in cursor:
+        chunks = await export_artwork_images(artwork)
+        if chunks is None:
+            missing.add(artwork["id"])
+            continue
+        with writer.entry(export_file_name(artwork), artwork["completed_at"], compress=False) as entry:
+            async for chunk in chunks:
+                entry.write(chunk)
+                data = writer.drain()
+                if data:
+                    yield data
+        yield writer.drain()
+
+    with writer.entry("manifest.json", started) as entry:
+        entry.write(json.dumps({"user_id": user_id, "exported_at": started.isoformat()})[:-1].encode())
+        entry.write(b', "artworks": [')
+        separator = b""
+        cursor = db.user_artworks.find(query, {"_id": 0, "artwork_data": 0}).sort(sort)
+        async for artwork in cursor:
+            item = jsonable_encoder(UserArtwork(**artwork), exclude={"artwork_data"})
+            if artwork["id"] in missing:
+                item["missing"] = True
+            else:
+                item["file"] = export_file_name(artwork)
+            entry.write(separator + json.dumps(item, ensure_ascii=False).encode())
+            separator = b", "
+            data = writer.drain()
+            if data:
+                yield data
+        entry.write(b"]}")
+    writer.close()
+    yield writer.drain()
+
 # Coloring Pages Routes
-@api_router.get("/coloring-pages", response_model=List[ColoringPage])
-async def get_coloring_pages(category: Optional[str] = None):
-    query = {}
-    if category:
-        query['category'] = category
-    
-    pages = await db.coloring_pages.find(query).to_list(100)
-    return [ColoringPage(**page) for page in pages]
+@api_router.get("/coloring-pages", response_model=List[Union[ColoringPage, ColoringPageSummary]])
+async def get_coloring_pages(
+    request: Request,
+    category: Optional[str] = None,
+    fields: Optional[str] = Query(None, pattern="^summary$"),
+    limit: int = Query(DEFAULT_PAGE_LIMIT, ge=1, le=MAX_PAGE_LIMIT),
+    after: Optional[str] = None,
+):
+    async def build():
+        query = {}
+        if category:
+            query['category'] = category
+        
+        summary = fields == "summary"
+        pages, next_cursor = await find_page(db.coloring_pages, query, "created_at", 1, limit, after, summary)
+        model = ColoringPageSummary if summary else ColoringPage
+        headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+        return to_models(model, pages), headers
+    return await cached_catalog_response(request, build)
 
 @api_router.post("/coloring-pages", response_model=ColoringPage)
 async def create_coloring_page(page: ColoringPageCreate):
     page_dict = page.dict()
+    page_dict['svg_content'] = normalize_svg(page_dict['svg_content'])
     page_obj = ColoringPage(**page_dict)
     await db.coloring_pages.insert_one(page_obj.dict())
+    catalog_changed("coloring_pages", [page_obj.dict()])
+    thumbnail_worker.submit(ThumbnailJob("page", page_obj.id, svg_content=page_obj.svg_content))
     return page_obj
 
 @api_router.get("/coloring-pages/{page_id}", response_model=ColoringPage)
-async def get_coloring_page(page_id: str):
-    page = await db.coloring_pages.find_one({"id": page_id})
-    if not page:
-        raise HTTPException(status_code=404, detail="Coloring page not found")
-    return ColoringPage(**page)
+async def get_coloring_page(page_id: str, request: Request):
+    async def build():
+        page = await db.coloring_pages.find_one({"id": page_id}, {"_id": 0})
+        if not page:
+            raise HTTPException(status_code=404, detail="Coloring page not found")
+        return to_models(ColoringPage, [page])[0], {}
+    return await cached_catalog_response(request, build)
+
+@api_router.get("/coloring-pages/{page_id}/svg")
+async def get_coloring_page_svg(
+    page_id: str,
+    request: Request,
+    w: int = Query(500, ge=16, le=4096),
+    h: int = Query(350, ge=16, le=4096),
+):
+    # Variants are rendered lazily and memoized per (page_id, w, h) in catalog_cache
+    async def build():
+        page = await db.coloring_pages.find_one({"id": page_id}, {"_id": 0, "svg_content": 1})
+        if page is None:
+            raise HTTPException(status_code=404, detail="Coloring page not found")
+        try:
+            return render_variant(page["svg_content"], w, h), {}
+        except (ET.ParseError, ValueError):
+            raise HTTPException(status_code=422, detail="Stored svg_content cannot be rendered")
+    return await cached_catalog_response(request, build, media_type="image/svg+xml")
+
+@api_router.post("/coloring-pages:batch", response_model=BatchInsertResult)
+async def create_coloring_pages_batch(items: List[Dict[str, Any]]):
+    result, pages = await insert_batch(db.coloring_pages, items, ColoringPageCreate, ColoringPage)
+    for page in pages:
+        thumbnail_worker.submit(ThumbnailJob("page", page["id"], svg_content=page["svg_content"]))
+    return result
 
 # User Artwork Routes
 @api_router.get("/artworks", response_model=List[UserArtwork])
-async def get_user_artworks(user_id: Optional[str] = None):
+async def get_user_artworks(
+    user_id: Optional[str] = None,
+    fields: Optional[str] = Query(None, pattern="^summary$"),
+    limit: int = Query(DEFAULT_PAGE_LIMIT, ge=1, le=MAX_PAGE_LIMIT),
+    after: Optional[str] = None,
+):
     query = {}
     if user_id:
         query['user_id'] = user_id
     
-    artworks = await db.user_artworks.find(query).sort("completed_at", -1).to_list(100)
-    return [UserArtwork(**artwork) for artwork in artworks]
+    artworks, next_cursor = await find_page(
+        db.user_artworks, query, "completed_at", -1, limit, after, fields == "summary"
+    )
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    body = encode_json(to_models(UserArtwork, artworks))
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@api_router.get("/artworks/export")
+async def export_user_artworks(user_id: str = Query(..., min_length=1)):
+    return StreamingResponse(
+        stream_artwork_export(user_id),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="artworks.zip"'},
+    )
 
 @api_router.post("/artworks", response_model=UserArtwork)
-async def save_user_artwork(artwork: UserArtworkCreate):
-    artwork_dict = artwork.dict()
-    artwork_obj = UserArtwork(**artwork_dict)
+async def save_user_artwork(
+    artwork: UserArtworkCreate,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+):
+    # Decoded into the blob store, so repeated saves of one drawing share storage
+    try:
+        data = base64.b64decode(artwork.artwork_data, validate=True)
+    except binascii.Error:
+        raise HTTPException(status_code=422, detail="artwork_data is not valid base64")
+    blob = await blob_store.put_bytes(data)
+    artwork_obj = UserArtwork(
+        user_id=artwork.user_id,
+        coloring_page_id=artwork.coloring_page_id,
+        title=artwork.title,
+        image_hash=blob.hash,
+        image_size=blob.size,
+        content_type="image/png",
+    )
+    return await store_artwork(artwork_obj, idempotency_key, lambda: blob_store.put_bytes(data))
+
+@api_router.post("/artworks/upload", response_model=UserArtwork)
+async def upload_user_artwork(
+    coloring_page_id: str = Form(...),
+    user_id: Optional[str] = Form(None),
+    title: Optional[str] = Form(None),
+    file: UploadFile = File(...),
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+):
+    content_type = file.content_type or "image/png"
+    if not content_type.startswith("image/"):
+        raise HTTPException(status_code=415, detail="Artwork must be an image")
+
+    blob = await blob_store.put_stream(iter_upload(file))
+    artwork_obj = UserArtwork(
+        user_id=user_id,
+        coloring_page_id=coloring_page_id,
+        title=title,
+        image_hash=blob.hash,
+        image_size=blob.size,
+        content_type=content_type,
+    )
+
+    async def restore_image():
+        await file.seek(0)
+        await blob_store.put_stream(iter_upload(file))
+    return await store_artwork(artwork_obj, idempotency_key, restore_image)
+
+@api_router.post("/artworks/strokes", response_model=UserArtwork)
+async def create_stroke_artwork(artwork: StrokeArtworkCreate):
+    artwork_obj = UserArtwork(
+        user_id=artwork.user_id,
+        coloring_page_id=artwork.coloring_page_id,
+        title=artwork.title,
+        content_type="image/png",
+        format="strokes",
+        width=artwork.width,
+        height=artwork.height,
+    )
+    await db.artwork_strokes.insert_one({
+        "id": artwork_obj.id,
+        "count": len(artwork.strokes),
+        "version": 1,
+        "strokes": pack_strokes(artwork.strokes),
+    })
     await db.user_artworks.insert_one(artwork_obj.dict())
     return artwork_obj
 
+@api_router.patch("/artworks/{artwork_id}/strokes", response_model=StrokesPatchResult)
+async def append_artwork_strokes(artwork_id: str, patch: StrokesPatch):
+    """Append strokes drawn since the last save.
+
+    ``offset`` is how many strokes the client already has on the server.
+    An offset below the stored count drops the strokes from there on before
+    appending (undo, or a retried patch); one above it is a gap and gets 409
+    with the stored count so the client can resend from there.
+    """
+    state = await db.artwork_strokes.find_one({"id": artwork_id}, {"_id": 0, "count": 1, "version": 1})
+    if state is None:
+        raise HTTPException(status_code=404, detail="Stroke artwork not found")
+    if patch.offset > state["count"]:
+        raise HTTPException(
+            status_code=409, detail=f"Server has {state['count']} strokes, resend from offset {state['count']}"
+        )
+    new_count = patch.offset + len(patch.strokes)
+    if new_count > MAX_ARTWORK_STROKES:
+        raise HTTPException(status_code=413, detail=f"An artwork can have at most {MAX_ARTWORK_STROKES} strokes")
+
+    version = state["version"]
+    if patch.strokes or new_count != state["count"]:
+        # $position + $slice replaces everything from offset on in one atomic update
+        result = await db.artwork_strokes.update_one(
+            {"id": artwork_id, "version": version},
+            {
+                "$push": {"strokes": {"$each": pack_strokes(patch.strokes), "$position": patch.offset, "$slice": new_count}},
+                "$set": {"count": new_count},
+                "$inc": {"version": 1},
+            },
+        )
+        if result.matched_count == 0:
+            raise HTTPException(status_code=409, detail="Strokes were changed concurrently, retry")
+        version += 1
+    if patch.title is not None:
+        await db.user_artworks.update_one({"id": artwork_id}, {"$set": {"title": patch.title}})
+    return StrokesPatchResult(id=artwork_id, stroke_count=new_count, version=version)
+
+@api_router.get("/artworks/{artwork_id}/image")
+async def get_user_artwork_image(artwork_id: str, request: Request):
+    artwork = await db.user_artworks.find_one(
+        {"id": artwork_id},
+        {"_id": 0, "artwork_data": 1, "image_hash": 1, "content_type": 1, "format": 1,
+         "rendered_version": 1, "width": 1, "height": 1},
+    )
+    if artwork is None:
+        raise HTTPException(status_code=404, detail="Artwork not found")
+    if artwork.get("format") == "strokes":
+        artwork = await render_stroke_artwork(artwork_id, artwork)
+    media_type = artwork.get("content_type") or "image/png"
+
+    if not artwork.get("image_hash"):
+        # Legacy artwork saved inline as base64
+        try:
+            data = base64.b64decode(artwork.get("artwork_data") or "", validate=True)
+        except binascii.Error:
+            raise HTTPException(status_code=422, detail="Stored artwork data is not valid base64")
+        return Response(content=data, media_type=media_type)
+
+    # Blobs are immutable, so the content hash doubles as a strong ETag
+    etag = f'"{artwork["image_hash"]}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    chunks = await blob_store.open(artwork["image_hash"])
+    if chunks is None:
+        raise HTTPException(status_code=404, detail="Artwork image not found")
+    return StreamingResponse(chunks, media_type=media_type, headers=headers)
+
 @api_router.delete("/artworks/{artwork_id}")
 async def delete_user_artwork(artwork_id: str):
-    result = await db.user_artworks.delete_one({"id": artwork_id})
-    if result.deleted_count == 0:
+    artwork = await db.user_artworks.find_one_and_delete(
+        {"id": artwork_id}, {"_id": 0, "image_hash": 1, "thumbnail": 1}
+    )
+    if artwork is None:
         raise HTTPException(status_code=404, detail="Artwork not found")
+    await db.artwork_strokes.delete_one({"id": artwork_id})
+    await release_artwork_blobs([artwork])
     return {"message": "Artwork deleted successfully"}
 
+@api_router.delete("/artworks:batch", response_model=BatchDeleteResult)
+async def delete_user_artworks_batch(batch: ArtworkBatchDelete):
+    ids = list(dict.fromkeys(batch.ids))
+    artworks = await db.user_artworks.find(
+        {"id": {"$in": ids}}, {"_id": 0, "id": 1, "image_hash": 1, "thumbnail": 1}
+    ).to_list(len(ids))
+    found = {artwork["id"] for artwork in artworks}
+    if found:
+        await db.user_artworks.delete_many({"id": {"$in": list(found)}})
+        await db.artwork_strokes.delete_many({"id": {"$in": list(found)}})
+        await release_artwork_blobs(artworks)
+    return BatchDeleteResult(
+        deleted=[i for i in ids if i in found],
+        not_found=[i for i in ids if i not in found],
+    )
+
+@api_router.get("/thumbnails/{thumbnail_hash}")
+async def get_thumbnail(thumbnail_hash: str, request: Request):
+    etag = f'"{thumbnail_hash}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    chunks = await blob_store.open(thumbnail_hash)
+    if chunks is None:
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
+    data = b"".join([chunk async for chunk in chunks])
+    return Response(content=data, media_type=sniff_content_type(data), headers=headers)
+
+# Search Routes
+@api_router.get("/search", response_model=List[SearchResult])
+async def search_catalog(
+    q: str = Query(..., min_length=1, max_length=100),
+    kind: Optional[str] = Query(None, alias="type", pattern="^(page|sticker)$"),
+    limit: int = Query(10, ge=1, le=MAX_SEARCH_RESULTS),
+):
+    """Autocomplete coloring page and sticker names from the in-memory index.
+
+    Every word of ``q`` must prefix a word of the name; matching ignores
+    case (with Turkish İ/ı rules) and accents.
+    """
+    return [
+        SearchResult(type=entry.kind, id=entry.id, name=entry.name, category=entry.category)
+        for entry in search_index.search(q, kind, limit)
+    ]
+
 # Stickers Routes
-@api_router.get("/stickers", response_model=List[Sticker])
-async def get_stickers(category: Optional[str] = None):
-    query = {}
-    if category:
-        query['category'] = category
-    
-    stickers = await db.stickers.find(query).to_list(100)
-    return [Sticker(**sticker) for sticker in stickers]
+@api_router.get("/stickers", response_model=List[Union[Sticker, StickerSummary]])
+async def get_stickers(
+    request: Request,
+    category: Optional[str] = None,
+    fields: Optional[str] = Query(None, pattern="^summary$"),
+    limit: int = Query(DEFAULT_PAGE_LIMIT, ge=1, le=MAX_PAGE_LIMIT),
+    after: Optional[str] = None,
+):
+    async def build():
+        query = {}
+        if category:
+            query['category'] = category
+        
+        summary = fields == "summary"
+        stickers, next_cursor = await find_page(db.stickers, query, "created_at", 1, limit, after, summary)
+        model = StickerSummary if summary else Sticker
+        headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+        return to_models(model, stickers), headers
+    return await cached_catalog_response(request, build)
+
+@api_router.get("/stickers/sprite")
+async def get_sticker_sprite(request: Request, category: Optional[str] = None):
+    """All stickers (optionally of one category) as a single SVG <symbol> sprite.
+
+    Symbols are drawn with <use href="#sticker-..."/>; which sticker each
+    symbol is comes from the JSON index in the sprite's
+    <metadata id="sprite-index">. Cached in catalog_cache like the other
+    catalog routes, so a sticker change invalidates it.
+    """
+    async def build():
+        query = {"category": category} if category else {}
+        projection = {"_id": 0, "id": 1, "name": 1, "category": 1, "svg_content": 1}
+        taken = set()
+        items = []
+        async for sticker in db.stickers.find(query, projection).sort([("created_at", ASCENDING), ("id", ASCENDING)]):
+            entry = {"id": sticker["id"], "name": sticker["name"], "category": sticker["category"]}
+            items.append((symbol_id("sticker", sticker["id"], taken), sticker["svg_content"], entry))
+        try:
+            sprite = await asyncio.to_thread(build_sprite, items)
+        except (ET.ParseError, ValueError):
+            raise HTTPException(status_code=422, detail="Stored svg_content cannot be combined into a sprite")
+        return sprite, {}
+    return await cached_catalog_response(request, build, media_type="image/svg+xml")
+
+@api_router.post("/stickers:batch", response_model=BatchInsertResult)
+async def create_stickers_batch(items: List[Dict[str, Any]]):
+    result, _ = await insert_batch(db.stickers, items, StickerCreate, Sticker)
+    return result
+
+# Catalog import from NDJSON bundles (see catalog_import.py)
+# record "type" -> (collection, create model, stored model)
+IMPORT_KINDS = {
+    "page": ("coloring_pages", ColoringPageCreate, ColoringPage),
+    "sticker": ("stickers", StickerCreate, Sticker),
+}
+
+# Fields that tell id-less records apart; same-named records in another
+# category or difficulty are different records, not updates of each other
+CATALOG_ID_FIELDS = ("category", "difficulty", "name")
+
+def catalog_id(collection_name: str, record: Dict[str, Any]) -> str:
+    """Stable id for catalog records that come without one, so re-imports update them."""
+    # JSON keeps the fields apart however they are spelled ("a/b" + "c" vs "a" + "b/c")
+    key = json.dumps([record.get(field) for field in CATALOG_ID_FIELDS], ensure_ascii=False)
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"coloring-game/catalog/{collection_name}/{key}"))
+
+def legacy_catalog_id(collection_name: str, name: str) -> str:
+    """The id catalog_id derived from the name alone, which earlier imports stored."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"coloring-game/seed/{collection_name}/{name}"))
+
+def adopt_legacy_ids(collection_name: str, docs: Dict[str, tuple], existing: Dict[str, dict]) -> None:
+    """Point derived ids in ``docs`` at documents stored under their legacy id.
+
+    A stored document is taken over by the record with the same category,
+    difficulty and name, so re-importing an older catalog updates it
+    instead of inserting every record a second time.
+    """
+    for doc_id, (line, doc) in list(docs.items()):
+        if doc_id in existing or doc_id != catalog_id(collection_name, doc):
+            continue
+        legacy_id = legacy_catalog_id(collection_name, doc["name"])
+        current = existing.get(legacy_id)
+        if legacy_id in docs or current is None:
+            continue
+        if all(current.get(field) == doc.get(field) for field in CATALOG_ID_FIELDS):
+            del docs[doc_id]
+            docs[legacy_id] = (line, {**doc, "id": legacy_id})
+
+async def upsert_catalog_batch(collection, create_model, model, batch, overwrite: bool, result, counts) -> None:
+    """Upsert one batch of ``(line, doc)`` pairs, tallying them in ``counts``.
+
+    Existing documents are read first (one indexed $in query) so unchanged
+    records cost no write at all, which keeps re-importing a content pack
+    cheap. created_at and generated thumbnails survive updates, except that
+    a page whose svg_content changed loses its now stale thumbnail.
+    """
+    docs = {doc["id"]: (line, doc) for line, doc in batch}  # ids are unique, see import_catalog
+    content_fields = [name for name in create_model.model_fields if name != "thumbnail"]
+    projection = {"_id": 0, "id": 1, "created_at": 1, "thumbnail": 1, **{name: 1 for name in content_fields}}
+    legacy_ids = [
+        legacy_catalog_id(collection.name, doc["name"])
+        for doc_id, (_, doc) in docs.items() if doc_id == catalog_id(collection.name, doc)
+    ]
+    existing = {}
+    async for doc in collection.find({"id": {"$in": list(docs) + legacy_ids}}, projection):
+        existing[doc["id"]] = doc
+    adopt_legacy_ids(collection.name, docs, existing)
+
+    operations, pending = [], []
+    for doc_id, (line, doc) in docs.items():
+        current = existing.get(doc_id)
+        if current is None:
+            operations.append(UpdateOne({"id": doc_id}, {"$setOnInsert": doc}, upsert=True))
+            pending.append((line, "insert", doc))
+            continue
+        changes = {name: doc[name] for name in content_fields if current.get(name) != doc[name]}
+        if doc.get("thumbnail") is not None and doc["thumbnail"] != current.get("thumbnail"):
+            changes["thumbnail"] = doc["thumbnail"]
+        elif "svg_content" in changes and "thumbnail" in model.model_fields:
+            changes["thumbnail"] = None
+        if not changes or not overwrite:
+            counts.unchanged += 1
+            continue
+        operations.append(UpdateOne({"id": doc_id}, {"$set": changes}))
+        pending.append((line, "update", {**current, **changes}))
+
+    failed = set()
+    if operations:
+        try:
+            await collection.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                failed.add(error["index"])
+                if error["code"] == 11000:
+                    # A concurrent import inserted it first
+                    counts.unchanged += 1
+                else:
+                    result.add_error(pending[error["index"]][0], error["errmsg"])
+
+    written = {"insert": [], "update": []}
+    for index, (line, op, doc) in enumerate(pending):
+        if index in failed:
+            continue
+        written[op].append(doc)
+        if collection.name == "coloring_pages" and doc.get("thumbnail") is None:
+            thumbnail_worker.submit(ThumbnailJob("page", doc["id"], svg_content=doc["svg_content"]))
+    counts.inserted += len(written["insert"])
+    counts.updated += len(written["update"])
+    for op, changed in written.items():
+        if changed:
+            catalog_changed(collection.name, changed, op)
+
+async def import_catalog(database, records, overwrite: bool = True, on_progress=None) -> CatalogImportResult:
+    """Validate and upsert ``(line, record)`` pairs from catalog_import.read_ndjson.
+
+    Records are buffered per type and written IMPORT_BATCH_SIZE at a time,
+    so memory stays bounded by one batch plus the ids seen so far. Invalid
+    records are reported by line and skipped, as are repeats of an id
+    already imported (the first record wins). With ``overwrite`` off,
+    records whose id already exists are left alone. ``on_progress(progress)``
+    runs after each batch.
+    """
+    result = CatalogImportResult()
+    batches = {kind: [] for kind in IMPORT_KINDS}
+    seen = {kind: {} for kind in IMPORT_KINDS}  # id -> line it was first imported from
+
+    async def flush(kind: str) -> None:
+        collection_name, create_model, model = IMPORT_KINDS[kind]
+        batch, batches[kind] = batches[kind], []
+        counts = result.pages if kind == "page" else result.stickers
+        await upsert_catalog_batch(database[collection_name], create_model, model, batch, overwrite, result, counts)
+        if on_progress is not None:
+            on_progress(result.progress())
+
+    async for line, record in records:
+        result.lines = line
+        if isinstance(record, str):
+            result.add_error(line, record)
+            continue
+        kind = record.get("type")
+        if kind not in IMPORT_KINDS:
+            result.add_error(line, "type: must be 'page' or 'sticker'")
+            continue
+        collection_name, create_model, model = IMPORT_KINDS[kind]
+        doc_id = record.get("id")
+        if doc_id is not None and (not isinstance(doc_id, str) or not doc_id.strip()):
+            result.add_error(line, "id: must be a non-empty string")
+            continue
+        try:
+            data = create_model(**record).dict()
+            data["svg_content"] = normalize_svg(data["svg_content"])
+        except ValidationError as e:
+            result.add_error(line, validation_message(e))
+            continue
+        except HTTPException as e:
+            result.add_error(line, e.detail)
+            continue
+        data["id"] = doc_id or catalog_id(collection_name, data)
+        first_line = seen[kind].setdefault(data["id"], line)
+        if first_line != line:
+            (result.pages if kind == "page" else result.stickers).skipped += 1
+            result.add_error(line, f"id: {data['id']} conflicts with line {first_line}, skipped")
+            continue
+        batches[kind].append((line, model(**data).dict()))
+        if len(batches[kind]) >= IMPORT_BATCH_SIZE:
+            await flush(kind)
+
+    for kind, batch in batches.items():
+        if batch:
+            await flush(kind)
+    return result
+
+@api_router.post("/catalog/import", response_model=CatalogImportResult)
+async def import_catalog_bundle(request: Request, keep_existing: bool = False):
+    """Import an NDJSON bundle (plain or gzipped) of coloring pages and stickers.
+
+    The body is parsed while it streams in; see catalog_import.py for the
+    format. Returns per-type counts and the first invalid lines.
+    """
+    def log_progress(progress: dict) -> None:
+        logger.info("Catalog import at line %d: %s", progress["lines"], progress)
+
+    result = await import_catalog(
+        db, read_ndjson(request.stream()), overwrite=not keep_existing, on_progress=log_progress,
+    )
+    logger.info("Catalog import finished: %s", result.progress())
+    return result
+
+# Initialize default coloring pages and stickers from the bundled starter catalog
+SEED_CATALOG_PATH = ROOT_DIR / 'seed_catalog.ndjson'
 
-# Initialize default coloring pages and stickers
 @api_router.post("/initialize-data")
 async def initialize_default_data():
-    # Check if data already exists
-    existing_pages = await db.coloring_pages.count_documents({})
+    # Catalogs seeded before seed ids were deterministic (collection metadata, no scan)
+    existing_pages = await db.coloring_pages.estimated_document_count()
     if existing_pages > 0:
         return {"message": "Data already initialized"}
     
-    # Sample coloring pages
-    sample_pages = [
-        {
-            "name": "Sevimli Kedi",
-            "category": "animals",
-            "difficulty": "medium",
-            "svg_content": "<svg viewBox='0 0 300 300' xmlns='http://www.w3.org/2000/svg'><circle cx='150' cy='120' r='60' fill='none' stroke='black' stroke-width='3'/><circle cx='130' cy='110' r='5' fill='black'/><circle cx='170' cy='110' r='5' fill='black'/><path d='M140 130 Q150 140 160 130' stroke='black' stroke-width='2' fill='none'/><circle cx='120' cy='80' r='15' fill='none' stroke='black' stroke-width='3'/><circle cx='180' cy='80' r='15' fill='none' stroke='black' stroke-width='3'/><rect x='140' y='180' width='20' height='40' fill='none' stroke='black' stroke-width='3'/><ellipse cx='100' cy='200' rx='15' ry='8' fill='none' stroke='black' stroke-width='3'/><ellipse cx='200' cy='200' rx='15' ry='8' fill='none' stroke='black' stroke-width='3'/><path d='M145 260 Q150 280 155 260' stroke='black' stroke-width='3' fill='none'/></svg>"
-        },
-        {
-            "name": "Hızlı Araba",
-            "category": "vehicles",
-            "difficulty": "medium",
-            "svg_content": "<svg viewBox='0 0 300 200' xmlns='http://www.w3.org/2000/svg'><rect x='50' y='80' width='200' height='60' rx='10' fill='none' stroke='black' stroke-width='3'/><rect x='80' y='60' width='140' height='30' rx='5' fill='none' stroke='black' stroke-width='3'/><circle cx='100' cy='160' r='20' fill='none' stroke='black' stroke-width='3'/><circle cx='200' cy='160' r='20' fill='none' stroke='black' stroke-width='3'/><rect x='60' y='100' width='30' height='20' rx='3' fill='none' stroke='black' stroke-width='2'/><rect x='210' y='100' width='30' height='20' rx='3' fill='none' stroke='black' stroke-width='2'/></svg>"
-        },
-        {
-            "name": "Güzel Çiçek",
-            "category": "nature",
-            "difficulty": "medium",
-            "svg_content": "<svg viewBox='0 0 300 300' xmlns='http://www.w3.org/2000/svg'><circle cx='150' cy='150' r='20' fill='none' stroke='black' stroke-width='3'/><ellipse cx='150' cy='100' rx='15' ry='30' fill='none' stroke='black' stroke-width='3'/><ellipse cx='150' cy='200' rx='15' ry='30' fill='none' stroke='black' stroke-width='3'/><ellipse cx='100' cy='150' rx='30' ry='15' fill='none' stroke='black' stroke-width='3'/><ellipse cx='200' cy='150' rx='30' ry='15' fill='none' stroke='black' stroke-width='3'/><ellipse cx='115' cy='115' rx='20' ry='20' fill='none' stroke='black' stroke-width='3' transform='rotate(-45 115 115)'/><ellipse cx='185' cy='115' rx='20' ry='20' fill='none' stroke='black' stroke-width='3' transform='rotate(45 185 115)'/><ellipse cx='185' cy='185' rx='20' ry='20' fill='none' stroke='black' stroke-width='3' transform='rotate(-45 185 185)'/><ellipse cx='115' cy='185' rx='20' ry='20' fill='none' stroke='black' stroke-width='3' transform='rotate(45 115 185)'/><line x1='150' y1='250' x2='150' y2='200' stroke='black' stroke-width='4'/><path d='M130 220 Q140 210 150 220' stroke='black' stroke-width='2' fill='none'/><path d='M170 220 Q160 210 150 220' stroke='black' stroke-width='2' fill='none'/></svg>"
-        }
-    ]
-    
-    # Sample stickers
-    sample_stickers = [
-        {
-            "name": "Yıldız",
-            "category": "shapes",
-            "svg_content": "<svg viewBox='0 0 60 60' xmlns='http://www.w3.org/2000/svg'><polygon points='30,5 35,20 50,20 38,30 42,45 30,37 18,45 22,30 10,20 25,20' fill='yellow' stroke='orange' stroke-width='2'/></svg>"
-        },
-        {
-            "name": "Kalp",
-            "category": "shapes",
-            "svg_content": "<svg viewBox='0 0 60 60' xmlns='http://www.w3.org/2000/svg'><path d='M30,45 C20,35 5,25 15,15 C25,5 30,15 30,15 C30,15 35,5 45,15 C55,25 40,35 30,45z' fill='red' stroke='darkred' stroke-width='2'/></svg>"
-        },
-        {
-            "name": "Gülen Yüz",
-            "category": "emoji",
-            "svg_content": "<svg viewBox='0 0 60 60' xmlns='http://www.w3.org/2000/svg'><circle cx='30' cy='30' r='25' fill='yellow' stroke='orange' stroke-width='2'/><circle cx='22' cy='25' r='3' fill='black'/><circle cx='38' cy='25' r='3' fill='black'/><path d='M20 35 Q30 45 40 35' stroke='black' stroke-width='3' fill='none'/></svg>"
-        }
-    ]
-    
-    # Insert sample data
-    for page_data in sample_pages:
-        page_obj = ColoringPage(**page_data)
-        await db.coloring_pages.insert_one(page_obj.dict())
-    
-    for sticker_data in sample_stickers:
-        sticker_obj = Sticker(**sticker_data)
-        await db.stickers.insert_one(sticker_obj.dict())
+    # Seed ids are derived from the records' contents, so concurrent calls
+    # converge on the same documents instead of racing
+    result = await import_catalog(db, read_ndjson(iter_file(SEED_CATALOG_PATH)), overwrite=False)
+    if result.error_count:
+        logger.error("Seed catalog has invalid lines: %s", result.errors)
     
+    if not result.pages.inserted and not result.stickers.inserted:
+        return {"message": "Data already initialized"}
     return {"message": "Default data initialized successfully"}
 
+@api_router.get("/catalog/stream")
+async def stream_catalog_changes(last_event_id: Optional[str] = Header(None)):
+    """Server-Sent Events feed of coloring page and sticker changes.
+
+    Events are named "page" or "sticker" with {"op", "doc"} as data; a
+    "reset" event means events were missed and the catalog should be
+    reloaded. Comment lines keep idle connections open through proxies.
+    """
+    queue, missed = catalog_feed.subscribe(last_event_id)
+
+    def frame(event) -> str:
+        number, kind, data = event
+        return f"id: {catalog_feed.event_id(number)}\nevent: {kind}\ndata: {data}\n\n"
+
+    async def events():
+        try:
+            # An id-only frame sets the client's Last-Event-ID before any event arrives
+            yield f"retry: 3000\nid: {catalog_feed.event_id(catalog_feed.last_id)}\n\n"
+            if missed is None:
+                yield "event: reset\ndata: {}\n\n"
+            for event in missed or []:
+                yield frame(event)
+            deadline = time.monotonic() + SSE_MAX_STREAM_SECONDS
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    event = await asyncio.wait_for(queue.get(), min(SSE_HEARTBEAT_SECONDS, remaining))
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if event is None:
+                    break
+                yield frame(event)
+        finally:
+            catalog_feed.unsubscribe(queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@api_router.get("/cache-stats")
+async def get_cache_stats():
+    return {"catalog": catalog_cache.stats()}
+
+@api_router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    cache = catalog_cache.stats()
+    thumbnails = thumbnail_worker.stats()
+    uploads = upload_limiter.stats()
+    writes = artwork_writer.stats()
+    feed = catalog_feed.stats()
+    search = search_index.stats()
+    blobs = blob_collector.stats()
+    extra = [
+        *gauge("catalog_cache_hits_total", "Catalog cache hits.", cache["hits"], "counter"),
+        *gauge("catalog_cache_misses_total", "Catalog cache misses.", cache["misses"], "counter"),
+        *gauge("catalog_cache_entries", "Rendered catalog bodies held in the cache.", cache["entries"]),
+        *gauge("thumbnail_queue_depth", "Thumbnail jobs waiting for a worker.", thumbnails["queued"]),
+        *gauge("thumbnail_jobs_failed_total", "Thumbnail jobs that raised.", thumbnails["failed"], "counter"),
+        *gauge("thumbnail_jobs_dropped_total", "Thumbnail jobs dropped on a full queue.", thumbnails["dropped"], "counter"),
+        *gauge("upload_requests_in_flight", "Upload requests being processed.", uploads["in_flight"]),
+        *gauge("upload_requests_waiting", "Upload requests queued for a slot.", uploads["waiting"]),
+        *gauge("upload_requests_rejected_total", "Uploads refused with 429 on a full queue.", uploads["rejected"], "counter"),
+        *gauge("upload_requests_timed_out_total", "Uploads refused with 503 after queueing.", uploads["timed_out"], "counter"),
+        *gauge("catalog_stream_clients", "Connected /api/catalog/stream clients.", feed["clients"]),
+        *gauge("search_index_documents", "Pages and stickers in the search index.", search["documents"]),
+        *gauge("search_index_terms", "Distinct words in the search index.", search["terms"]),
+        *gauge("search_cache_hits_total", "Searches answered from the ranked result cache.", search["hits"], "counter"),
+        *gauge("search_cache_misses_total", "Searches ranked from the index.", search["misses"], "counter"),
+        *gauge("blob_gc_deleted_total", "Unreferenced blobs deleted by the sweeper.", blobs["deleted"], "counter"),
+        *gauge("blob_gc_restored_total", "Blobs put back after a save raced the sweep.", blobs["restored"], "counter"),
+        *gauge("write_behind_queue_depth", "Artwork saves acknowledged but not yet written.", writes["queued"]),
+        *gauge("write_behind_failed_total", "Queued artwork saves that could not be written.", writes["failed"], "counter"),
+    ]
+    return PlainTextResponse(metrics.render(extra), media_type="text/plain; version=0.0.4")
+
 # Health check
 @api_router.get("/")
 async def root():
     return {"message": "Coloring Game API is running"}
 
+@api_router.get("/health/live")
+async def liveness():
+    # The process is up and serving; says nothing about its dependencies
+    return {"status": "alive"}
+
+@api_router.get("/health/ready")
+async def readiness():
+    if request_tracker.draining:
+        return JSONResponse({"status": "draining"}, status_code=503)
+    if db is None or (deferred_startup is not None and not deferred_startup.done()):
+        return JSONResponse({"status": "starting"}, status_code=503)
+    try:
+        await asyncio.wait_for(db.command("ping"), READINESS_TIMEOUT)
+    except Exception as e:
+        logger.warning("Readiness ping failed: %r", e)
+        return JSONResponse({"status": "unavailable", "detail": "database ping failed"}, status_code=503)
+    return {"status": "ready"}
+
 # Include the router in the main app
 app.include_router(api_router)
 
+# Inside CORS, so rejections still carry the CORS headers browsers need to read them
+app.add_middleware(ConcurrencyLimitMiddleware, limiter=upload_limiter, routes=UPLOAD_ROUTES)
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    default_limit=MAX_REQUEST_BODY_BYTES,
+    route_limits={
+        **{route: MAX_UPLOAD_BODY_BYTES for route in UPLOAD_ROUTES},
+        ("POST", "/api/catalog/import"): MAX_IMPORT_BODY_BYTES,
+    },
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
+app.add_middleware(RequestTrackerMiddleware, tracker=request_tracker)
+
+# Outermost, so latency covers CORS and error handling too
+app.add_middleware(MetricsMiddleware, metrics=metrics)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -207,6 +1522,76 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def watch_shutdown_signals():
+    install_drain_signal_handlers(request_tracker, SHUTDOWN_READINESS_DELAY)
+
+@app.on_event("startup")
+async def connect_db():
+    global client, db, blob_store, mongo_reachable
+    client = create_client()
+    db = client[db_name]
+    blob_store = create_blob_store(db)
+    # Keep starting either way: readiness stays red until Mongo answers
+    mongo_reachable = await ping_mongo(client)
+    if mongo_reachable:
+        try:
+            await warm_up_pool(client)
+        except Exception as e:
+            logger.warning("Mongo warm-up failed: %s", e)
+
+@app.on_event("startup")
+async def create_db_indexes():
+    if mongo_reachable:
+        await ensure_indexes(db)
+
+@app.on_event("startup")
+async def start_thumbnail_worker():
+    thumbnail_worker.start(db, blob_store, on_page_updated=catalog_cache.invalidate)
+
+@app.on_event("startup")
+async def start_catalog_feed():
+    catalog_feed.start(db, on_change=catalog_stream_changed, stopping=request_tracker.stopping)
+
+@app.on_event("startup")
+async def build_search_index():
+    await search_index.start(load_search_documents, SEARCH_INDEX_REFRESH, build_now=mongo_reachable)
+
+@app.on_event("startup")
+async def start_blob_collector():
+    blob_collector.start(db.blob_gc, blob_store, blob_referenced)
+
+@app.on_event("startup")
+async def start_artwork_writer():
+    if WRITE_BEHIND:
+        artwork_writer.start(db.user_artworks, on_flushed=artworks_flushed, on_failed=artworks_failed)
+
+async def finish_startup() -> None:
+    """Create indexes and build the search index once Mongo answers."""
+    while not await ping_mongo(client):
+        await asyncio.sleep(STARTUP_RETRY_INTERVAL)
+    logger.info("Mongo is reachable, finishing startup")
+    await ensure_indexes(db)
+    try:
+        await search_index.rebuild(load_search_documents)
+    except Exception:
+        logger.exception("Could not build the search index")
+
+@app.on_event("startup")
+async def finish_startup_in_background():
+    global deferred_startup
+    if not mongo_reachable:
+        deferred_startup = asyncio.create_task(finish_startup())
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    if deferred_startup is not None:
+        deferred_startup.cancel()
+    await catalog_feed.stop()
+    await search_index.stop()
+    await blob_collector.stop()
+    await request_tracker.drain(SHUTDOWN_DRAIN_TIMEOUT)
+    await artwork_writer.stop()
+    await thumbnail_worker.stop()
+    if client is not None:
+        client.close()
\ No newline at end of file
@@ -0,0 +1,66 @@
+"""Vector storage and rasterization for stroke-based artworks.
+
+A stroke artwork is saved as the brush strokes that drew it rather than as
+a PNG: each stroke keeps its color, width and points, with the points
+packed as little-endian int16 x/y pairs (4 bytes a point). Clients append
+strokes as they draw, so autosave only sends what changed, and the PNG is
+rendered on demand and cached in the blob store.
+"""
+
+import array
+import io
+import sys
+from typing import List, Optional
+
+try:
+    from PIL import Image, ImageDraw
+except ImportError:  # pragma: no cover - optional dependency
+    Image = None
+
+# Strokes are drawn at this multiple of the canvas size and scaled down,
+# which gives the antialiased edges the browser canvas has
+SUPERSAMPLE = 2
+
+COORDINATE_MIN = -32768
+COORDINATE_MAX = 32767
+
+
+def pack_points(points: List[float]) -> bytes:
+    values = array.array('h', (round(value) for value in points))
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values.tobytes()
+
+
+def unpack_points(data: bytes) -> List[int]:
+    values = array.array('h')
+    values.frombytes(data)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values.tolist()
+
+
+# Runs in the thumbnail worker processes, so it must stay importable at top level
+
+def rasterize_strokes(strokes: List[dict], width: int, height: int) -> Optional[bytes]:
+    """Draw packed strokes onto a transparent canvas and return a PNG."""
+    if Image is None:
+        return None
+    image = Image.new('RGBA', (width * SUPERSAMPLE, height * SUPERSAMPLE), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    for stroke in strokes:
+        values = [value * SUPERSAMPLE for value in unpack_points(stroke['points'])]
+        points = list(zip(values[0::2], values[1::2]))
+        if not points:
+            continue
+        size = stroke['width'] * SUPERSAMPLE
+        if len(points) > 1:
+            draw.line(points, fill=stroke['color'], width=size, joint='curve')
+        # Round caps, as the canvas draws with lineCap = 'round'
+        radius = size / 2
+        for x, y in {points[0], points[-1]}:
+            draw.ellipse((x - radius, y - radius, x + radius, y + radius), fill=stroke['color'])
+    image = image.resize((width, height), Image.LANCZOS)
+    out = io.BytesIO()
+    image.save(out, format='PNG')
+    return out.getvalue()
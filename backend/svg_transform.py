@@ -0,0 +1,300 @@
+"""SVG normalization for coloring page templates.
+
+Templates are minified once on write and can be re-rendered for a target
+canvas size with the scale and centering offset baked into the geometry,
+so clients no longer rewrite numbers with regexes on every load. Stickers
+can also be combined into one <symbol> sprite.
+"""
+
+import json
+import re
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Tuple
+
+SVG_NS = 'http://www.w3.org/2000/svg'
+ET.register_namespace('', SVG_NS)
+ET.register_namespace('xlink', 'http://www.w3.org/1999/xlink')
+
+PATH_TOKEN_RE = re.compile(r'[MmLlHhVvCcSsQqTtAaZz]|[-+]?(?:\d*\.\d+|\d+\.?)(?:[eE][-+]?\d+)?')
+NUMBER_RE = re.compile(r'[-+]?(?:\d*\.\d+|\d+\.?)(?:[eE][-+]?\d+)?')
+ROTATE_RE = re.compile(r'^\s*rotate\(\s*([^,\s)]+)(?:[\s,]+([^,\s)]+)[\s,]+([^,\s)]+))?\s*\)\s*$')
+
+# Number of parameters per path command
+PATH_ARITY = {'M': 2, 'L': 2, 'H': 1, 'V': 1, 'C': 6, 'S': 4, 'Q': 4, 'T': 2, 'A': 7, 'Z': 0}
+
+# Attributes that are plain x / y coordinates or lengths
+X_ATTRS = ('x', 'cx', 'x1', 'x2')
+Y_ATTRS = ('y', 'cy', 'y1', 'y2')
+LENGTH_ATTRS = ('r', 'rx', 'ry', 'width', 'height', 'stroke-width', 'font-size')
+# Attributes holding lengths that are not rewritten; they need the wrapping group
+UNBAKED_ATTRS = (
+    'style', 'font', 'stroke-dasharray', 'stroke-dashoffset', 'letter-spacing', 'word-spacing', 'dx', 'dy',
+)
+# Lengths the root <svg> can pass on to its children
+INHERITED_LENGTH_ATTRS = ('stroke-width', 'font-size')
+
+# Decimal places kept in baked coordinates; a tenth of a pixel is invisible
+PRECISION = 1
+
+XLINK_HREF = '{http://www.w3.org/1999/xlink}href'
+URL_REF_RE = re.compile(r'url\(\s*#([^)\s]+)\s*\)')
+# Root <svg> attributes that are not inherited by a <symbol>'s content
+ROOT_ONLY_ATTRS = ('width', 'height', 'viewBox', 'x', 'y', 'version', 'preserveAspectRatio')
+SYMBOL_ID_RE = re.compile(r'[^A-Za-z0-9_-]')
+
+
+class Transform:
+    """Uniform scale followed by a translation."""
+
+    def __init__(self, scale: float, tx: float, ty: float):
+        self.scale = scale
+        self.tx = tx
+        self.ty = ty
+
+    def x(self, value: float) -> float:
+        return value * self.scale + self.tx
+
+    def y(self, value: float) -> float:
+        return value * self.scale + self.ty
+
+    def length(self, value: float) -> float:
+        return value * self.scale
+
+
+def fmt(value: float) -> str:
+    text = f'{value:.{PRECISION}f}'.rstrip('0').rstrip('.')
+    return '0' if text == '-0' else text
+
+
+def parse_svg(svg_content: str) -> ET.Element:
+    root = ET.fromstring(svg_content)
+    if local_name(root.tag) != 'svg':
+        raise ValueError('Root element is not <svg>')
+    return root
+
+
+def local_name(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def minify_svg(svg_content: str) -> str:
+    """Drop comments and insignificant whitespace, keeping the geometry as is."""
+    root = parse_svg(svg_content)
+    strip_whitespace(root)
+    return ET.tostring(root, encoding='unicode', short_empty_elements=True).replace(' />', '/>')
+
+
+def strip_whitespace(element: ET.Element) -> None:
+    for el in element.iter():
+        if el.text is not None and not el.text.strip():
+            el.text = None
+        if el.tail is not None and not el.tail.strip():
+            el.tail = None
+
+
+def view_box(root: ET.Element) -> Tuple[float, float, float, float]:
+    if 'viewBox' in root.attrib:
+        values = [float(v) for v in NUMBER_RE.findall(root.attrib['viewBox'])]
+        if len(values) == 4 and values[2] > 0 and values[3] > 0:
+            return tuple(values)
+    width = float(NUMBER_RE.match(root.attrib.get('width', '300')).group())
+    height = float(NUMBER_RE.match(root.attrib.get('height', '300')).group())
+    return 0.0, 0.0, width, height
+
+
+def fit_transform(box: Tuple[float, float, float, float], width: int, height: int) -> Transform:
+    """Scale to fit inside width x height and center, like preserveAspectRatio='xMidYMid meet'."""
+    min_x, min_y, box_w, box_h = box
+    scale = min(width / box_w, height / box_h)
+    tx = (width - box_w * scale) / 2 - min_x * scale
+    ty = (height - box_h * scale) / 2 - min_y * scale
+    return Transform(scale, tx, ty)
+
+
+def transform_path(d: str, t: Transform) -> str:
+    tokens = PATH_TOKEN_RE.findall(d)
+    out: List[str] = []
+    command = None
+    i = 0
+    first = True
+    while i < len(tokens):
+        token = tokens[i]
+        if token.isalpha():
+            command = token
+            out.append(command)
+            i += 1
+            if command in 'Zz':
+                continue
+        elif command is None:
+            raise ValueError('Path data does not start with a command')
+        upper = command.upper()
+        arity = PATH_ARITY[upper]
+        args = tokens[i:i + arity]
+        if len(args) < arity or any(a.isalpha() for a in args):
+            raise ValueError(f'Malformed path segment for {command!r}')
+        values = [float(a) for a in args]
+        # A leading relative moveto is measured from the origin, i.e. absolute
+        relative = command.islower() and not (first and command == 'm')
+        first = False
+        out.append(' '.join(fmt(v) for v in transform_segment(upper, values, t, relative)))
+        out.append(' ')
+        i += arity
+        # Extra coordinate pairs after a moveto are implicit linetos
+        if command == 'M':
+            command = 'L'
+        elif command == 'm':
+            command = 'l'
+    return ''.join(out).strip()
+
+
+def transform_segment(command: str, values: List[float], t: Transform, relative: bool) -> List[float]:
+    if relative:
+        if command == 'A':
+            rx, ry, rotation, large_arc, sweep, x, y = values
+            return [t.length(rx), t.length(ry), rotation, large_arc, sweep, t.length(x), t.length(y)]
+        return [t.length(v) for v in values]
+    if command == 'H':
+        return [t.x(values[0])]
+    if command == 'V':
+        return [t.y(values[0])]
+    if command == 'A':
+        rx, ry, rotation, large_arc, sweep, x, y = values
+        return [t.length(rx), t.length(ry), rotation, large_arc, sweep, t.x(x), t.y(y)]
+    return [t.x(v) if n % 2 == 0 else t.y(v) for n, v in enumerate(values)]
+
+
+def transform_element(el: ET.Element, t: Transform) -> None:
+    attrs = el.attrib
+    if local_name(el.tag) == 'style':
+        raise ValueError('Cannot bake a <style> sheet')
+    for name in UNBAKED_ATTRS:
+        if name in attrs:
+            raise ValueError(f'Cannot bake {name!r}')
+    for name in X_ATTRS:
+        if name in attrs:
+            attrs[name] = fmt(t.x(float(attrs[name])))
+    for name in Y_ATTRS:
+        if name in attrs:
+            attrs[name] = fmt(t.y(float(attrs[name])))
+    for name in LENGTH_ATTRS:
+        if name in attrs:
+            attrs[name] = fmt(t.length(float(attrs[name])))
+    if 'points' in attrs:
+        values = [float(v) for v in NUMBER_RE.findall(attrs['points'])]
+        if len(values) % 2:
+            raise ValueError('Odd number of coordinates in points')
+        attrs['points'] = ' '.join(
+            f'{fmt(t.x(values[n]))},{fmt(t.y(values[n + 1]))}' for n in range(0, len(values), 2)
+        )
+    if 'd' in attrs:
+        attrs['d'] = transform_path(attrs['d'], t)
+    if 'transform' in attrs:
+        # Only rotations can be carried over by moving their center
+        match = ROTATE_RE.match(attrs['transform'])
+        if not match:
+            raise ValueError(f'Unsupported transform {attrs["transform"]!r}')
+        angle, cx, cy = match.groups()
+        if cx is None:
+            attrs['transform'] = f'rotate({angle} {fmt(t.tx)} {fmt(t.ty)})'
+        else:
+            attrs['transform'] = f'rotate({angle} {fmt(t.x(float(cx)))} {fmt(t.y(float(cy)))})'
+
+
+def render_variant(svg_content: str, width: int, height: int) -> str:
+    """Return the template redrawn for a width x height canvas.
+
+    Geometry is rewritten in place when every element is understood;
+    otherwise the content is wrapped in a single transformed group, which
+    is still correct, just not pre-baked.
+    """
+    root = parse_svg(svg_content)
+    strip_whitespace(root)
+    t = fit_transform(view_box(root), width, height)
+    children = list(root)
+
+    baked = ET.fromstring(ET.tostring(root))
+    try:
+        # Children inherit presentation attributes of the root, which stays unscaled
+        for name in INHERITED_LENGTH_ATTRS + UNBAKED_ATTRS:
+            if name in root.attrib:
+                raise ValueError(f'Cannot bake inherited {name!r}')
+        for child in baked:
+            for el in child.iter():
+                transform_element(el, t)
+        root = baked
+    except ValueError:
+        group = ET.Element(f'{{{SVG_NS}}}g', {
+            'transform': f'translate({fmt(t.tx)} {fmt(t.ty)}) scale({fmt(t.scale)})',
+        })
+        for child in children:
+            root.remove(child)
+            group.append(child)
+        root.append(group)
+
+    for name in ('width', 'height', 'preserveAspectRatio'):
+        root.attrib.pop(name, None)
+    root.set('viewBox', f'0 0 {width} {height}')
+    root.set('width', str(width))
+    root.set('height', str(height))
+    return ET.tostring(root, encoding='unicode', short_empty_elements=True).replace(' />', '/>')
+
+
+def symbol_id(prefix: str, doc_id: str, taken: set) -> str:
+    """An XML-safe, unique symbol id derived from a document id."""
+    base = f'{prefix}-{SYMBOL_ID_RE.sub("_", doc_id)}'
+    candidate, n = base, 1
+    while candidate in taken:
+        n += 1
+        candidate = f'{base}-{n}'
+    taken.add(candidate)
+    return candidate
+
+
+def namespace_ids(root: ET.Element, prefix: str) -> None:
+    """Prefix every id inside ``root`` and the references to it.
+
+    Keeps gradients and clip paths of different stickers from colliding
+    once they share a document.
+    """
+    ids: Dict[str, str] = {}
+    for el in root.iter():
+        if 'id' in el.attrib:
+            ids[el.attrib['id']] = f'{prefix}-{el.attrib["id"]}'
+            el.attrib['id'] = ids[el.attrib['id']]
+    if not ids:
+        return
+    for el in root.iter():
+        for name, value in el.attrib.items():
+            if name in ('href', XLINK_HREF) and value.startswith('#') and value[1:] in ids:
+                el.attrib[name] = '#' + ids[value[1:]]
+            elif 'url(' in value:
+                el.attrib[name] = URL_REF_RE.sub(
+                    lambda m: f'url(#{ids.get(m.group(1), m.group(1))})', value
+                )
+
+
+def build_sprite(items: List[Tuple[str, str, dict]]) -> str:
+    """Combine ``(symbol_id, svg_content, index_entry)`` items into one sprite.
+
+    Each SVG becomes a <symbol> with its own viewBox, to be drawn with
+    <use href="#symbol_id"/>. The index entries are embedded as JSON in
+    <metadata id="sprite-index">, so the sprite is self-describing and a
+    palette needs nothing else. Raises ET.ParseError or ValueError on the
+    first SVG that cannot be parsed.
+    """
+    # Zero-sized so an inlined sprite takes no room; <use> still draws its symbols
+    sprite = ET.Element(f'{{{SVG_NS}}}svg', {'width': '0', 'height': '0'})
+    metadata = ET.SubElement(sprite, f'{{{SVG_NS}}}metadata', {'id': 'sprite-index'})
+    index = []
+    for sid, svg_content, entry in items:
+        root = parse_svg(svg_content)
+        strip_whitespace(root)
+        namespace_ids(root, sid)
+        attrs = {name: value for name, value in root.attrib.items() if name not in ROOT_ONLY_ATTRS}
+        attrs['id'] = sid
+        attrs['viewBox'] = ' '.join(fmt(v) for v in view_box(root))
+        symbol = ET.SubElement(sprite, f'{{{SVG_NS}}}symbol', attrs)
+        symbol.extend(list(root))
+        index.append({'symbol': sid, **entry})
+    metadata.text = json.dumps(index, ensure_ascii=False, separators=(',', ':'))
+    return ET.tostring(sprite, encoding='unicode', short_empty_elements=True).replace(' />', '/>')
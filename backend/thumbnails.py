@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""Background thumbnail generation for coloring pages and artworks.
+
+Rendering runs in a process pool so it never blocks the event loop, and
+jobs go through a bounded queue: when it is full the job is dropped rather
+than slowing the request down, and the backfill command picks it up later:
+
+    python thumbnails.py backfill
+"""
+
+import asyncio
+import base64
+import binascii
+import io
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple, Optional
+
+from svg_transform import render_variant
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover - optional dependency
+    Image = None
+
+try:
+    import cairosvg
+except (ImportError, OSError):  # pragma: no cover - needs the system cairo library
+    cairosvg = None
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_WIDTH = int(os.environ.get('THUMBNAIL_WIDTH', '200'))
+THUMBNAIL_HEIGHT = int(os.environ.get('THUMBNAIL_HEIGHT', '140'))
+THUMBNAIL_WORKERS = int(os.environ.get('THUMBNAIL_WORKERS', '2'))
+THUMBNAIL_QUEUE_SIZE = int(os.environ.get('THUMBNAIL_QUEUE_SIZE', '256'))
+
+THUMBNAIL_URL_PREFIX = '/api/thumbnails/'
+
+
+class ThumbnailJob(NamedTuple):
+    kind: str  # "page" or "artwork"
+    doc_id: str
+    svg_content: Optional[str] = None
+    artwork_data: Optional[str] = None
+    image_hash: Optional[str] = None
+
+
+def sniff_content_type(data: bytes) -> str:
+    if data.startswith(b'RIFF') and data[8:12] == b'WEBP':
+        return 'image/webp'
+    if data.startswith(b'\x89PNG'):
+        return 'image/png'
+    return 'image/svg+xml'
+
+
+# Functions below run in worker processes and must stay importable at top level
+
+def downscale_image(data: bytes) -> Optional[bytes]:
+    """Shrink an artwork image into the thumbnail box as WebP."""
+    if Image is None:
+        return None
+    with Image.open(io.BytesIO(data)) as image:
+        image.thumbnail((THUMBNAIL_WIDTH, THUMBNAIL_HEIGHT))
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        out = io.BytesIO()
+        image.save(out, format='WEBP', quality=80, method=4)
+    return out.getvalue()
+
+
+def rasterize_svg(svg_content: str) -> bytes:
+    """Render a coloring page template as a thumbnail.
+
+    Without cairo the template is returned as an SVG fitted to the
+    thumbnail box, which browsers draw just as well at that size.
+    """
+    svg = render_variant(svg_content, THUMBNAIL_WIDTH, THUMBNAIL_HEIGHT)
+    if cairosvg is None:
+        return svg.encode('utf-8')
+    png = cairosvg.svg2png(bytestring=svg.encode('utf-8'), background_color='white')
+    if Image is None:
+        return png
+    with Image.open(io.BytesIO(png)) as image:
+        out = io.BytesIO()
+        image.save(out, format='WEBP', quality=80, method=4)
+    return out.getvalue()
+
+
+class ThumbnailWorker:
+    def __init__(self, queue_size: int = THUMBNAIL_QUEUE_SIZE, workers: int = THUMBNAIL_WORKERS):
+        self.queue_size = queue_size
+        self.workers = workers
+        self.queue: Optional[asyncio.Queue] = None
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.task: Optional[asyncio.Task] = None
+        self.in_flight = set()
+        self.dropped = 0
+        self.completed = 0
+        self.failed = 0
+
+    def start(self, db, blob_store, on_page_updated=None) -> None:
+        self.db = db
+        self.blob_store = blob_store
+        self.on_page_updated = on_page_updated
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        # spawn, not fork: the API process has Motor threads and a running loop
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+        )
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        for task in list(self.in_flight):
+            task.cancel()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def submit(self, job: ThumbnailJob) -> bool:
+        """Queue a job without waiting; returns False if it was dropped."""
+        if self.queue is None:
+            return False
+        try:
+            self.queue.put_nowait(job)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning("Thumbnail queue full, dropped %s %s", job.kind, job.doc_id)
+            return False
+
+    async def render(self, func, *args):
+        """Run a rendering function in the pool and wait for its result.
+
+        For renders a request is waiting on; falls back to a thread when the
+        pool has not been started, as in the CLI tools.
+        """
+        if self.executor is None:
+            return await asyncio.to_thread(func, *args)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def _run(self) -> None:
+        # One job per worker process in flight at a time
+        semaphore = asyncio.Semaphore(self.workers)
+        while True:
+            job = await self.queue.get()
+            await semaphore.acquire()
+            task = asyncio.create_task(self._process_logged(job))
+            self.in_flight.add(task)
+            task.add_done_callback(self.in_flight.discard)
+            task.add_done_callback(lambda _: semaphore.release())
+
+    async def _process_logged(self, job: ThumbnailJob) -> None:
+        try:
+            await self.process(job)
+            self.completed += 1
+        except Exception:
+            self.failed += 1
+            logger.exception("Thumbnail generation failed for %s %s", job.kind, job.doc_id)
+        finally:
+            self.queue.task_done()
+
+    async def process(self, job: ThumbnailJob) -> Optional[str]:
+        """Render, store and attach one thumbnail, returning its URL."""
+        loop = asyncio.get_running_loop()
+        if job.kind == 'page':
+            data = await loop.run_in_executor(self.executor, rasterize_svg, job.svg_content)
+            collection = self.db.coloring_pages
+        else:
+            source = await self._artwork_bytes(job)
+            if source is None:
+                return None
+            data = await loop.run_in_executor(self.executor, downscale_image, source)
+            collection = self.db.user_artworks
+        if data is None:
+            return None
+
+        blob = await self.blob_store.put_bytes(data)
+        url = THUMBNAIL_URL_PREFIX + blob.hash
+        query = {"id": job.doc_id}
+        if job.image_hash:
+            # Stroke artworks are re-rendered as they change; skip stale renders
+            query["image_hash"] = job.image_hash
+        await collection.update_one(query, {"$set": {"thumbnail": url}})
+        # An identical thumbnail may have been swept by the blob GC since the put
+        if not await self.blob_store.exists(blob.hash):
+            await self.blob_store.put_bytes(data)
+        if job.kind == 'page' and self.on_page_updated is not None:
+            self.on_page_updated()
+        return url
+
+    async def _artwork_bytes(self, job: ThumbnailJob) -> Optional[bytes]:
+        if job.image_hash:
+            chunks = await self.blob_store.open(job.image_hash)
+            if chunks is None:
+                return None
+            return b''.join([chunk async for chunk in chunks])
+        try:
+            return base64.b64decode(job.artwork_data or '', validate=True) or None
+        except binascii.Error:
+            return None
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+            "queue_size": self.queue_size,
+            "completed": self.completed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+        }
+
+
+async def backfill(worker: ThumbnailWorker) -> dict:
+    """Generate thumbnails for every document that does not have one yet.
+
+    Jobs bypass the queue but keep one job in flight per worker process.
+    """
+    counts = {"page": 0, "artwork": 0}
+    semaphore = asyncio.Semaphore(worker.workers)
+    pending = set()
+
+    async def run(job):
+        try:
+            if await worker.process(job):
+                counts[job.kind] += 1
+        except Exception:
+            logger.exception("Thumbnail generation failed for %s %s", job.kind, job.doc_id)
+        finally:
+            semaphore.release()
+
+    async def jobs():
+        missing = {"thumbnail": None}
+        async for page in worker.db.coloring_pages.find(missing, {"_id": 0, "id": 1, "svg_content": 1}):
+            yield ThumbnailJob('page', page["id"], svg_content=page["svg_content"])
+        projection = {"_id": 0, "id": 1, "artwork_data": 1, "image_hash": 1}
+        # Stroke artworks that were never rendered have no image yet
+        has_image = {"$or": [{"image_hash": {"$ne": None}}, {"artwork_data": {"$nin": [None, ""]}}]}
+        async for artwork in worker.db.user_artworks.find({**missing, **has_image}, projection):
+            yield ThumbnailJob(
+                'artwork', artwork["id"],
+                artwork_data=artwork.get("artwork_data"), image_hash=artwork.get("image_hash"),
+            )
+
+    async for job in jobs():
+        await semaphore.acquire()
+        task = asyncio.create_task(run(job))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+    if pending:
+        await asyncio.wait(pending)
+    return counts
+
+
+def main():
+    import sys
+    import server
+    from blob_store import create_blob_store
+
+    if sys.argv[1:] != ['backfill']:
+        print("usage: python thumbnails.py backfill")
+        sys.exit(2)
+
+    async def run():
+        client = server.create_client()
+        db = client[server.db_name]
+        worker = ThumbnailWorker()
+        worker.start(db, create_blob_store(db))
+        try:
+            counts = await backfill(worker)
+        finally:
+            await worker.stop()
+            client.close()
+        print(f"🖼️  Backfilled {counts['page']} page and {counts['artwork']} artwork thumbnails")
+
+    asyncio.run(run())
+
+
+if __name__ == '__main__':
+    main()
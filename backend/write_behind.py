@@ -0,0 +1,170 @@
+"""Write-behind batching for artwork inserts.
+
+With WRITE_BEHIND=1 a save is acknowledged once its document is validated
+and queued in memory; a background task writes queued documents with one
+insert_many per batch, flushing when max_batch documents are waiting or
+the oldest has waited max_delay seconds. The trade-off is durability: a
+crash loses whatever is still queued (at most one batch window), and a
+saved artwork shows up in listings only after its batch is flushed.
+Shutdown flushes everything that is left. Documents that cannot be
+written are handed to on_failed so the caller can undo what it did on
+their behalf.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Callable, Optional
+
+from pymongo.errors import BulkWriteError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# Failed batches are retried this many times, with growing pauses, before being dropped
+MAX_FLUSH_ATTEMPTS = 3
+
+# Queued by stop() behind the pending documents
+_STOP = object()
+
+
+class WriteBehindQueue:
+    def __init__(self, max_batch: int = 100, max_delay: float = 0.2, max_queue: int = 5000):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_queue = max_queue
+        self.collection = None
+        self.on_flushed: Optional[Callable] = None
+        self.on_failed: Optional[Callable] = None
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+        self.flushed = 0
+        self.batches = 0
+        self.failed = 0
+        self.last_flush_seconds = 0.0
+
+    def start(
+        self, collection, on_flushed: Optional[Callable] = None, on_failed: Optional[Callable] = None,
+    ) -> None:
+        """Start flushing into ``collection``.
+
+        ``on_flushed(docs, duration, lag)`` is called after each batch with
+        the inserted documents, the insert_many time and how long the oldest
+        document waited in the queue. ``await on_failed(docs)`` gets the
+        documents that were rejected or dropped.
+        """
+        self.collection = collection
+        self.on_flushed = on_flushed
+        self.on_failed = on_failed
+        self.queue = asyncio.Queue(maxsize=self.max_queue)
+        self.task = asyncio.create_task(self._run())
+
+    async def put(self, doc: dict) -> None:
+        """Queue a document; waits only when the queue is full (backpressure)."""
+        await self.queue.put((time.monotonic(), doc))
+
+    async def stop(self) -> None:
+        """Flush everything still queued, then stop the flush task."""
+        if self.task is None:
+            return
+        await self.queue.put(_STOP)
+        await self.task
+        self.task = None
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            first = await self.queue.get()
+            if first is _STOP:
+                break
+            batch = [first]
+            deadline = first[0] + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+        # Saves that raced with shutdown and landed behind the marker
+        leftovers = []
+        while not self.queue.empty():
+            item = self.queue.get_nowait()
+            if item is not _STOP:
+                leftovers.append(item)
+        for offset in range(0, len(leftovers), self.max_batch):
+            await self._flush(leftovers[offset:offset + self.max_batch])
+
+    async def _flush(self, batch: list) -> None:
+        docs = [doc for _, doc in batch]
+        lag = time.monotonic() - batch[0][0]
+        inserted, rejected = docs, []
+        for attempt in range(1, MAX_FLUSH_ATTEMPTS + 1):
+            start = time.perf_counter()
+            try:
+                await self.collection.insert_many(docs, ordered=False)
+                break
+            except BulkWriteError as e:
+                # Per-document failures (duplicate ids) are not worth retrying
+                errors = e.details.get("writeErrors", [])
+                failed_indexes = {error["index"] for error in errors}
+                if attempt > 1:
+                    # Ids are unique to this batch, so a duplicate on a retry
+                    # is a document the interrupted attempt already wrote
+                    failed_indexes -= {error["index"] for error in errors if error["code"] == 11000}
+                inserted = [doc for index, doc in enumerate(docs) if index not in failed_indexes]
+                rejected = [doc for index, doc in enumerate(docs) if index in failed_indexes]
+                break
+            except PyMongoError:
+                if attempt == MAX_FLUSH_ATTEMPTS:
+                    written = await self._written(docs)
+                    inserted = [doc for doc in docs if doc.get("_id") in written]
+                    rejected = [doc for doc in docs if doc.get("_id") not in written]
+                    logger.exception("Dropping %d of a write-behind batch of %d documents", len(rejected), len(docs))
+                    break
+                logger.warning("Write-behind flush failed, retrying (attempt %d)", attempt)
+                await asyncio.sleep(0.5 * attempt)
+        if rejected:
+            self.failed += len(rejected)
+            logger.error("Write-behind batch had %d failed documents", len(rejected))
+            await self._failed(rejected)
+        self.last_flush_seconds = time.perf_counter() - start
+        self.flushed += len(inserted)
+        self.batches += 1
+        if self.on_flushed is not None and inserted:
+            self.on_flushed(inserted, self.last_flush_seconds, lag)
+
+    async def _written(self, docs: list) -> set:
+        """The _ids of ``docs`` that failed attempts wrote before erroring out."""
+        # insert_many sets _id on each document before sending it
+        ids = [doc["_id"] for doc in docs if "_id" in doc]
+        try:
+            return {doc["_id"] async for doc in self.collection.find({"_id": {"$in": ids}}, {"_id": 1})}
+        except PyMongoError:
+            logger.warning("Could not check which write-behind documents were written")
+            return set()
+
+    async def _failed(self, docs: list) -> None:
+        if self.on_failed is None or not docs:
+            return
+        try:
+            await self.on_failed(docs)
+        except Exception:
+            # Keep flushing the batches behind this one
+            logger.exception("Write-behind failure handler raised")
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+            "max_queue": self.max_queue,
+            "flushed": self.flushed,
+            "batches": self.batches,
+            "failed": self.failed,
+            "last_flush_seconds": round(self.last_flush_seconds, 6),
+        }
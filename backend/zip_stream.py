@@ -0,0 +1,50 @@
+"""Write a ZIP archive as a stream of byte chunks.
+
+zipfile normally wants a seekable file so it can go back and fill in each
+entry's sizes and CRC. Given a write-only sink it puts them in a data
+descriptor after the entry instead, which lets us hand every chunk to the
+client as soon as it is written and keep nothing but the central directory
+(a few dozen bytes per entry) in memory.
+"""
+
+import io
+import zipfile
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterator, List
+
+
+class _Sink(io.RawIOBase):
+    def __init__(self):
+        self.chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+
+class ZipStreamWriter:
+    def __init__(self):
+        self._sink = _Sink()
+        self._zip = zipfile.ZipFile(self._sink, mode='w')
+
+    @contextmanager
+    def entry(self, name: str, modified: datetime, compress: bool = True) -> Iterator:
+        """Open an entry for writing; call drain() between writes to stream it."""
+        info = zipfile.ZipInfo(name, date_time=modified.timetuple()[:6])
+        # Images are already compressed, deflating them again only costs CPU
+        info.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+        with self._zip.open(info, mode='w') as handle:
+            yield handle
+
+    def close(self) -> None:
+        """Write the central directory; drain() afterwards for the last bytes."""
+        self._zip.close()
+
+    def drain(self) -> bytes:
+        data = b''.join(self._sink.chunks)
+        self._sink.chunks.clear()
+        return data
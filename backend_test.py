@@ -6,10 +6,15 @@ Tests all backend endpoints with realistic data
 
 import requests
 import json
+import xml.etree.ElementTree as ET
 import sys
 import os
 from datetime import datetime
 import base64
+import gzip
+import io
+import uuid
+import zipfile
 
 # Get backend URL from frontend .env file
 def get_backend_url():
@@ -129,6 +134,38 @@ def test_get_coloring_pages_by_category():
         log_test("Get Coloring Pages by Category (animals)", False, f"Error: {str(e)}")
         return False
 
+def test_get_coloring_pages_summary_paginated():
+    """Test GET /api/coloring-pages?fields=summary&limit=1 with cursor pagination"""
+    try:
+        response = requests.get(f"{API_BASE}/coloring-pages", params={"fields": "summary", "limit": 1}, timeout=10)
+        if response.status_code != 200:
+            log_test("Get Coloring Pages Summary", False, f"Status {response.status_code}: {response.text}")
+            return False
+        
+        data = response.json()
+        if any("svg_content" in page for page in data):
+            log_test("Get Coloring Pages Summary", False, "Summary response still contains svg_content")
+            return False
+        
+        seen = [page["id"] for page in data]
+        cursor = response.headers.get("X-Next-Cursor")
+        while cursor:
+            response = requests.get(f"{API_BASE}/coloring-pages",
+                                    params={"fields": "summary", "limit": 1, "after": cursor},
+                                    timeout=10)
+            seen += [page["id"] for page in response.json()]
+            cursor = response.headers.get("X-Next-Cursor")
+        
+        if len(seen) == len(set(seen)):
+            log_test("Get Coloring Pages Summary", True, f"Paged through {len(seen)} pages")
+            return True
+        else:
+            log_test("Get Coloring Pages Summary", False, f"Duplicate pages across cursors: {seen}")
+            return False
+    except Exception as e:
+        log_test("Get Coloring Pages Summary", False, f"Error: {str(e)}")
+        return False
+
 def test_get_specific_coloring_page(pages):
     """Test GET /api/coloring-pages/{page_id} endpoint"""
     if not pages:
@@ -240,6 +277,121 @@ def test_save_artwork(pages):
         log_test("Save Artwork", False, f"Error: {str(e)}")
         return None
 
+def test_upload_artwork(pages):
+    """Test POST /api/artworks/upload and GET /api/artworks/{artwork_id}/image endpoints"""
+    if not pages:
+        log_test("Upload Artwork", False, "No coloring pages available to create artwork")
+        return None
+    
+    try:
+        sample_png = b"\x89PNG\r\n\x1a\n" + b"sample_colored_image_data" * 100
+        
+        response = requests.post(f"{API_BASE}/artworks/upload",
+                               data={"user_id": "çocuk_123", "coloring_page_id": pages[0]["id"], "title": "Yüklenen Kedi"},
+                               files={"file": ("artwork.png", sample_png, "image/png")},
+                               timeout=10)
+        
+        if response.status_code != 200:
+            log_test("Upload Artwork", False, f"Status {response.status_code}: {response.text}")
+            return None
+        
+        data = response.json()
+        if not data.get("image_hash") or data.get("artwork_data"):
+            log_test("Upload Artwork", False, f"Expected blob reference only, got: {data}")
+            return None
+        
+        image = requests.get(f"{API_BASE}/artworks/{data['id']}/image", timeout=10)
+        if image.status_code == 200 and image.content == sample_png:
+            log_test("Upload Artwork", True, f"Uploaded {data.get('image_size')} bytes as {data['image_hash'][:12]}")
+            return data
+        else:
+            log_test("Upload Artwork", False, f"Image fetch returned {image.status_code}, {len(image.content)} bytes")
+            return None
+    except Exception as e:
+        log_test("Upload Artwork", False, f"Error: {str(e)}")
+        return None
+
+def test_save_artwork_idempotent(pages):
+    """Test that retrying POST /api/artworks with an Idempotency-Key returns the original artwork"""
+    if not pages:
+        log_test("Idempotent Save", False, "No coloring pages available to create artwork")
+        return None
+    
+    try:
+        new_artwork = {
+            "user_id": "çocuk_123",
+            "coloring_page_id": pages[0]["id"],
+            "artwork_data": base64.b64encode(b"retried_colored_image_data").decode('utf-8'),
+            "title": "Tekrar Gönderilen Kedi"
+        }
+        headers = {"Idempotency-Key": str(uuid.uuid4())}
+        
+        first = requests.post(f"{API_BASE}/artworks", json=new_artwork, headers=headers, timeout=10)
+        retry = requests.post(f"{API_BASE}/artworks", json=new_artwork, headers=headers, timeout=10)
+        
+        if first.status_code == 200 and retry.status_code == 200:
+            if first.json()["id"] == retry.json()["id"]:
+                log_test("Idempotent Save", True, "Retry returned the original artwork")
+                return first.json()
+            log_test("Idempotent Save", False, "Retry created a second artwork")
+            return first.json()
+        else:
+            log_test("Idempotent Save", False, f"Status {first.status_code}/{retry.status_code}: {retry.text}")
+            return None
+    except Exception as e:
+        log_test("Idempotent Save", False, f"Error: {str(e)}")
+        return None
+
+def test_stroke_artwork(pages):
+    """Test POST /api/artworks/strokes, PATCH /api/artworks/{artwork_id}/strokes and the rendered image"""
+    if not pages:
+        log_test("Stroke Artwork", False, "No coloring pages available to create artwork")
+        return None
+    
+    try:
+        response = requests.post(f"{API_BASE}/artworks/strokes",
+                               json={"user_id": "çocuk_123", "coloring_page_id": pages[0]["id"], "title": "Çizgili Kedi"},
+                               timeout=10)
+        if response.status_code != 200:
+            log_test("Stroke Artwork", False, f"Create status {response.status_code}: {response.text}")
+            return None
+        artwork = response.json()
+        
+        stroke = {"color": "#FF0000", "width": 10, "points": [10, 10, 120, 80, 240, 40]}
+        response = requests.patch(f"{API_BASE}/artworks/{artwork['id']}/strokes",
+                                json={"offset": 0, "strokes": [stroke, stroke]},
+                                timeout=10)
+        if response.status_code != 200 or response.json().get("stroke_count") != 2:
+            log_test("Stroke Artwork", False, f"Patch status {response.status_code}: {response.text}")
+            return artwork
+        
+        image = requests.get(f"{API_BASE}/artworks/{artwork['id']}/image", timeout=10)
+        if image.status_code == 200 and image.content.startswith(b"\x89PNG"):
+            log_test("Stroke Artwork", True, f"Rendered {len(image.content)} byte PNG from 2 strokes")
+        else:
+            log_test("Stroke Artwork", False, f"Image status {image.status_code}")
+        return artwork
+    except Exception as e:
+        log_test("Stroke Artwork", False, f"Error: {str(e)}")
+        return None
+
+def test_export_artworks():
+    """Test GET /api/artworks/export returns a ZIP with a manifest"""
+    try:
+        response = requests.get(f"{API_BASE}/artworks/export", params={"user_id": "çocuk_123"}, timeout=30)
+        if response.status_code == 200:
+            archive = zipfile.ZipFile(io.BytesIO(response.content))
+            manifest = json.loads(archive.read("manifest.json"))
+            images = [name for name in archive.namelist() if name != "manifest.json"]
+            log_test("Export Artworks", True, f"{len(images)} images, {len(manifest['artworks'])} manifest entries")
+            return True
+        else:
+            log_test("Export Artworks", False, f"Status {response.status_code}: {response.text}")
+            return False
+    except Exception as e:
+        log_test("Export Artworks", False, f"Error: {str(e)}")
+        return False
+
 def test_delete_artwork(artwork):
     """Test DELETE /api/artworks/{artwork_id} endpoint"""
     if not artwork:
@@ -284,6 +436,74 @@ def test_get_stickers():
         log_test("Get Stickers", False, f"Error: {str(e)}")
         return []
 
+def test_import_catalog():
+    """Test POST /api/catalog/import with a gzipped NDJSON bundle"""
+    try:
+        records = [
+            {"type": "page", "id": "test-import-balik", "name": "Test Balık", "category": "animals", "difficulty": "easy",
+             "svg_content": "<svg viewBox='0 0 100 100' xmlns='http://www.w3.org/2000/svg'><ellipse cx='50' cy='50' rx='30' ry='15' fill='none' stroke='black'/></svg>"},
+            {"type": "page", "name": "Eksik Sayfa"},
+        ]
+        bundle = gzip.compress("\n".join(json.dumps(record) for record in records).encode())
+        response = requests.post(f"{API_BASE}/catalog/import", data=bundle,
+                                 headers={"Content-Type": "application/x-ndjson"}, timeout=30)
+        if response.status_code == 200:
+            data = response.json()
+            imported = data["pages"]["inserted"] + data["pages"]["updated"] + data["pages"]["unchanged"]
+            if imported == 1 and data["error_count"] == 1 and data["errors"][0]["line"] == 2:
+                log_test("Import Catalog", True, f"Pages: {data['pages']}, rejected line 2")
+                return True
+            else:
+                log_test("Import Catalog", False, f"Unexpected result: {data}")
+                return False
+        else:
+            log_test("Import Catalog", False, f"Status {response.status_code}: {response.text}")
+            return False
+    except Exception as e:
+        log_test("Import Catalog", False, f"Error: {str(e)}")
+        return False
+
+def test_search_catalog():
+    """Test GET /api/search with Turkish case and accent folding"""
+    try:
+        response = requests.get(f"{API_BASE}/search", params={"q": "HIZLI ar"}, timeout=10)
+        if response.status_code == 200:
+            data = response.json()
+            names = [result["name"] for result in data]
+            if "Hızlı Araba" in names:
+                log_test("Search Catalog", True, f"'HIZLI ar' matched {names}")
+                return True
+            else:
+                log_test("Search Catalog", False, f"'Hızlı Araba' not in results: {data}")
+                return False
+        else:
+            log_test("Search Catalog", False, f"Status {response.status_code}: {response.text}")
+            return False
+    except Exception as e:
+        log_test("Search Catalog", False, f"Error: {str(e)}")
+        return False
+
+def test_sticker_sprite():
+    """Test GET /api/stickers/sprite returns an SVG sprite with its index"""
+    try:
+        response = requests.get(f"{API_BASE}/stickers/sprite", params={"category": "shapes"}, timeout=10)
+        if response.status_code == 200 and response.headers.get("content-type", "").startswith("image/svg+xml"):
+            root = ET.fromstring(response.content)
+            index = json.loads(root.find("{http://www.w3.org/2000/svg}metadata").text)
+            symbols = root.findall("{http://www.w3.org/2000/svg}symbol")
+            if len(index) == len(symbols) and all(entry["category"] == "shapes" for entry in index):
+                log_test("Sticker Sprite", True, f"{len(symbols)} symbols, ETag {response.headers.get('etag')}")
+                return True
+            else:
+                log_test("Sticker Sprite", False, f"Index does not match symbols: {index}")
+                return False
+        else:
+            log_test("Sticker Sprite", False, f"Status {response.status_code}: {response.text[:200]}")
+            return False
+    except Exception as e:
+        log_test("Sticker Sprite", False, f"Error: {str(e)}")
+        return False
+
 def main():
     """Run all backend tests"""
     print("🎨 Starting Coloring Game Backend API Tests")
@@ -308,6 +528,11 @@ def main():
     # Test 4: Get Coloring Pages by Category
     print("\n4. Testing Get Coloring Pages by Category...")
     test_get_coloring_pages_by_category()
+    test_get_coloring_pages_summary_paginated()
+    
+    # Test 4b: Search and autocomplete
+    print("\n4b. Testing Catalog Search...")
+    test_search_catalog()
     
     # Test 5: Get Specific Coloring Page
     print("\n5. Testing Get Specific Coloring Page...")
@@ -317,6 +542,10 @@ def main():
     print("\n6. Testing Create Coloring Page...")
     new_page = test_create_coloring_page()
     
+    # Test 6b: Catalog import from an NDJSON bundle
+    print("\n6b. Testing Catalog Import...")
+    test_import_catalog()
+    
     # Test 7: Get Artworks
     print("\n7. Testing Get Artworks...")
     artworks = test_get_artworks()
@@ -329,9 +558,29 @@ def main():
     print("\n9. Testing Delete Artwork...")
     test_delete_artwork(saved_artwork)
     
+    # Test 9b: Upload Artwork as a file
+    print("\n9b. Testing Upload Artwork...")
+    uploaded_artwork = test_upload_artwork(pages)
+    test_delete_artwork(uploaded_artwork)
+    
+    # Test 9c: Retried save with an Idempotency-Key
+    print("\n9c. Testing Idempotent Artwork Save...")
+    idempotent_artwork = test_save_artwork_idempotent(pages)
+    test_delete_artwork(idempotent_artwork)
+    
+    # Test 9d: Stroke-based artwork
+    print("\n9d. Testing Stroke Artwork...")
+    stroke_artwork = test_stroke_artwork(pages)
+    
+    # Test 9e: Gallery export
+    print("\n9e. Testing Artwork Export...")
+    test_export_artworks()
+    test_delete_artwork(stroke_artwork)
+    
     # Test 10: Get Stickers
     print("\n10. Testing Get Stickers...")
     test_get_stickers()
+    test_sticker_sprite()
     
     # Print Summary
     print("\n" + "=" * 50)
@@ -0,0 +1,97 @@
+import asyncio
+
+import httpx
+import mongomock_motor
+
+import server
+
+SVG = "<svg xmlns='http://www.w3.org/2000/svg' viewBox='0 0 10 10'><circle cx='5' cy='5' r='4'/></svg>"
+
+
+async def with_client(scenario):
+    server.db = mongomock_motor.AsyncMongoMockClient()["bulk_test"]
+    await server.ensure_indexes(server.db)
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await scenario(client)
+
+
+def sticker(name: str, **overrides) -> dict:
+    return {"name": name, "category": "shapes", "svg_content": SVG, **overrides}
+
+
+def test_batch_insert_reports_invalid_items_by_index():
+    async def scenario(client):
+        response = await client.post("/api/stickers:batch", json=[
+            sticker("Daire"),
+            {"name": "Eksik"},
+            sticker("Bozuk", svg_content="<svg"),
+            sticker("Kare"),
+        ])
+        assert response.status_code == 200
+        result = response.json()
+        assert [item["index"] for item in result["inserted"]] == [0, 3]
+        assert [item["index"] for item in result["errors"]] == [1, 2]
+        assert "category" in result["errors"][0]["error"]
+        assert result["errors"][1]["error"] == "svg_content is not a valid SVG document"
+
+        stored = await server.db.stickers.find({}, {"_id": 0, "id": 1, "name": 1}).to_list(None)
+        assert {doc["name"]: doc["id"] for doc in stored} == {
+            "Daire": result["inserted"][0]["id"], "Kare": result["inserted"][1]["id"],
+        }
+
+    asyncio.run(with_client(scenario))
+
+
+def test_batch_insert_keeps_the_items_the_database_accepted():
+    async def scenario(client):
+        # Stand-in for any per-document write error the database reports
+        await server.db.stickers.create_index("name", unique=True)
+        await client.post("/api/stickers:batch", json=[sticker("Daire")])
+
+        response = await client.post("/api/stickers:batch", json=[
+            sticker("Kare"), sticker("Daire"), sticker("Yıldız"),
+        ])
+        assert response.status_code == 200
+        result = response.json()
+        assert [item["index"] for item in result["inserted"]] == [0, 2]
+        assert [item["index"] for item in result["errors"]] == [1]
+        assert "duplicate key" in result["errors"][0]["error"].lower()
+        assert await server.db.stickers.count_documents({}) == 3
+
+    asyncio.run(with_client(scenario))
+
+
+def test_batches_over_the_size_limit_are_rejected():
+    async def scenario(client):
+        items = [sticker(f"Sticker {n}") for n in range(server.MAX_BATCH_SIZE + 1)]
+        response = await client.post("/api/stickers:batch", json=items)
+        assert response.status_code == 413
+        assert response.json() == {"detail": f"At most {server.MAX_BATCH_SIZE} items per batch"}
+        assert await server.db.stickers.count_documents({}) == 0
+
+        ids = [f"id-{n}" for n in range(server.MAX_BATCH_SIZE + 1)]
+        response = await client.request("DELETE", "/api/artworks:batch", json={"ids": ids})
+        assert response.status_code == 422
+        response = await client.request("DELETE", "/api/artworks:batch", json={"ids": []})
+        assert response.status_code == 422
+
+    asyncio.run(with_client(scenario))
+
+
+def test_batch_delete_reports_ids_that_were_not_found():
+    async def scenario(client):
+        server.blob_collector.collection = server.db.blob_gc
+        await server.db.user_artworks.insert_many([
+            {"id": artwork_id, "user_id": "u", "coloring_page_id": "p", "artwork_data": "aGk="}
+            for artwork_id in ("a", "b", "c")
+        ])
+        response = await client.request(
+            "DELETE", "/api/artworks:batch", json={"ids": ["c", "missing", "a", "c"]},
+        )
+        assert response.status_code == 200
+        assert response.json() == {"deleted": ["c", "a"], "not_found": ["missing"]}
+        remaining = await server.db.user_artworks.find({}, {"_id": 0, "id": 1}).to_list(None)
+        assert remaining == [{"id": "b"}]
+
+    asyncio.run(with_client(scenario))
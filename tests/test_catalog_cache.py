@@ -0,0 +1,129 @@
+import asyncio
+import gzip
+
+import brotli
+import httpx
+import mongomock_motor
+
+import server
+from catalog_cache import CatalogCache, negotiate_encoding
+
+SVG = "<svg xmlns='http://www.w3.org/2000/svg' viewBox='0 0 10 10'><circle cx='5' cy='5' r='4'/></svg>"
+
+
+def page(name: str) -> dict:
+    return {"name": name, "category": "animals", "difficulty": "easy", "svg_content": SVG}
+
+
+async def with_client(scenario):
+    server.db = mongomock_motor.AsyncMongoMockClient()["catalog_cache_test"]
+    server.catalog_cache.invalidate()
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        for n in range(20):
+            await client.post("/api/coloring-pages", json=page(f"Sayfa {n}"))
+        return await scenario(client)
+
+
+def test_matching_etag_gets_304():
+    async def scenario(client):
+        first = await client.get("/api/coloring-pages", headers={"Accept-Encoding": "identity"})
+        etag = first.headers["etag"]
+        assert first.headers["cache-control"] == "no-cache"
+
+        response = await client.get(
+            "/api/coloring-pages", headers={"Accept-Encoding": "identity", "If-None-Match": etag},
+        )
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+
+        response = await client.get(
+            "/api/coloring-pages", headers={"Accept-Encoding": "identity", "If-None-Match": '"stale"'},
+        )
+        assert response.status_code == 200
+        assert response.content == first.content
+
+    asyncio.run(with_client(scenario))
+
+
+def test_writes_invalidate_cached_bodies():
+    async def scenario(client):
+        before = await client.get("/api/coloring-pages")
+        # Written behind the API's back: the cached body is still served
+        await server.db.coloring_pages.insert_one({**page("Gizli"), "id": "hidden"})
+        assert (await client.get("/api/coloring-pages")).content == before.content
+
+        await client.post("/api/coloring-pages", json=page("Yeni"))
+        after = await client.get("/api/coloring-pages", headers={"If-None-Match": before.headers["etag"]})
+        assert after.status_code == 200
+        assert after.headers["etag"] != before.headers["etag"]
+        assert {"Gizli", "Yeni"} <= {item["name"] for item in after.json()}
+
+    asyncio.run(with_client(scenario))
+
+
+def test_cached_bodies_expire_after_the_ttl():
+    async def scenario(client):
+        ttl = server.catalog_cache.ttl
+        server.catalog_cache.ttl = 0.1
+        try:
+            server.catalog_cache.invalidate()
+            before = await client.get("/api/coloring-pages")
+            await server.db.coloring_pages.insert_one({**page("Gizli"), "id": "hidden"})
+            await asyncio.sleep(0.15)
+            after = await client.get("/api/coloring-pages")
+        finally:
+            server.catalog_cache.ttl = ttl
+        assert len(after.json()) == len(before.json()) + 1
+
+    asyncio.run(with_client(scenario))
+
+
+def test_bodies_are_compressed_per_accept_encoding():
+    async def scenario(client):
+        plain = await client.get("/api/coloring-pages", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in plain.headers
+        assert plain.headers["vary"] == "Accept-Encoding"
+
+        etags = {plain.headers["etag"]}
+        for accept, encoding, decompress in [
+            ("gzip, br", "br", brotli.decompress),
+            ("br;q=0, gzip", "gzip", gzip.decompress),
+            ("*", "br", brotli.decompress),
+        ]:
+            async with client.stream("GET", "/api/coloring-pages", headers={"Accept-Encoding": accept}) as response:
+                raw = b"".join([chunk async for chunk in response.aiter_raw()])
+            assert response.headers["content-encoding"] == encoding
+            assert decompress(raw) == plain.content
+            etags.add(response.headers["etag"])
+
+            revalidated = await client.get(
+                "/api/coloring-pages", headers={"Accept-Encoding": accept, "If-None-Match": response.headers["etag"]},
+            )
+            assert revalidated.status_code == 304
+        # One ETag per representation
+        assert len(etags) == 3
+
+    asyncio.run(with_client(scenario))
+
+
+def test_negotiation_skips_small_bodies_and_refused_encodings():
+    assert negotiate_encoding("gzip, br", 100) is None
+    assert negotiate_encoding("br;q=0.5, gzip;q=0.8", 5000) == "gzip"
+    assert negotiate_encoding("identity", 5000) is None
+    assert negotiate_encoding("*;q=0", 5000) is None
+    assert negotiate_encoding(None, 5000) is None
+
+
+def test_fills_that_raced_with_an_invalidation_are_dropped():
+    cache = CatalogCache(max_entries=2, ttl=60)
+    version = cache.version
+    cache.invalidate()
+    cache.set("pages", "stale", version)
+    assert cache.get("pages") is None
+
+    for key in ("a", "b", "c"):
+        cache.set(key, key, cache.version)
+    assert cache.get("a") is None
+    assert cache.stats()["evictions"] == 1
@@ -0,0 +1,29 @@
+import asyncio
+
+from catalog_feed import CatalogFeed
+
+
+class NoChangeStreams:
+    def watch(self, *args, **kwargs):
+        raise RuntimeError("change streams unavailable")
+
+
+def test_streams_end_when_draining_starts():
+    async def scenario():
+        feed = CatalogFeed()
+        stopping = asyncio.Event()
+        feed.start(NoChangeStreams(), stopping=stopping)
+        queue, missed = feed.subscribe()
+        assert missed == []
+
+        stopping.set()
+        assert await asyncio.wait_for(queue.get(), 1) is None
+        assert feed.stats()["clients"] == 0
+
+        # Streams opened while draining end straight away
+        late, _ = feed.subscribe()
+        assert late.get_nowait() is None
+        assert feed.stats()["clients"] == 0
+        await feed.stop()
+
+    asyncio.run(scenario())
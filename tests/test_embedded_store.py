@@ -0,0 +1,75 @@
+import asyncio
+import base64
+
+import httpx
+import pytest
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+import server
+from blob_store import create_blob_store
+from embedded_store import EmbeddedClient
+
+
+def test_unique_index_treats_null_keys_as_equal(tmp_path):
+    async def scenario():
+        client = EmbeddedClient(tmp_path)
+        keys = client["test"].idempotency_keys
+        await keys.create_indexes([IndexModel([("user_id", ASCENDING), ("key", ASCENDING)], unique=True)])
+        await keys.insert_one({"user_id": None, "key": "k", "artwork_id": "a"})
+        with pytest.raises(DuplicateKeyError):
+            await keys.insert_one({"user_id": None, "key": "k", "artwork_id": "b"})
+        # A missing field is null too
+        with pytest.raises(DuplicateKeyError):
+            await keys.insert_one({"key": "k", "artwork_id": "c"})
+        await keys.insert_one({"user_id": None, "key": "other", "artwork_id": "d"})
+        await keys.insert_one({"user_id": "u", "key": "k", "artwork_id": "e"})
+        with pytest.raises(DuplicateKeyError):
+            await keys.insert_one({"user_id": "u", "key": "k", "artwork_id": "f"})
+        assert await keys.count_documents({}) == 3
+        assert (await keys.find_one({"user_id": None, "key": "k"}, {"_id": 0}))["artwork_id"] == "a"
+        client.close()
+
+    asyncio.run(scenario())
+
+
+def test_anonymous_idempotency_key_reused_for_another_image(tmp_path, monkeypatch):
+    async def scenario():
+        client = EmbeddedClient(tmp_path / "db")
+        monkeypatch.setattr(server, "db", client["test"])
+        monkeypatch.setenv("BLOB_STORE_PATH", str(tmp_path / "blobs"))
+        monkeypatch.setattr(server, "blob_store", create_blob_store(server.db))
+        await server.ensure_indexes(server.db)
+
+        def body(image: bytes) -> dict:
+            return {"coloring_page_id": "p", "artwork_data": base64.b64encode(image).decode()}
+
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            headers = {"Idempotency-Key": "anon-key"}
+            first = await http.post("/api/artworks", json=body(b"\x89PNG first"), headers=headers)
+            retry = await http.post("/api/artworks", json=body(b"\x89PNG first"), headers=headers)
+            other = await http.post("/api/artworks", json=body(b"\x89PNG second"), headers=headers)
+        assert first.status_code == 200 and first.json()["user_id"] is None
+        assert retry.json()["id"] == first.json()["id"]
+        assert other.status_code == 422
+        assert await server.db.user_artworks.count_documents({}) == 1
+        client.close()
+
+    asyncio.run(scenario())
+
+
+def test_unsupported_queries_raise_operation_failure(tmp_path):
+    async def scenario():
+        client = EmbeddedClient(tmp_path)
+        pages = client["test"].coloring_pages
+        await pages.insert_one({"id": "a", "tags": ["x"]})
+        with pytest.raises(OperationFailure):
+            await pages.find_one({"id": {"$regex": "a"}})
+        with pytest.raises(OperationFailure):
+            await pages.update_one({"id": "a"}, {"$addToSet": {"tags": "y"}})
+        with pytest.raises(OperationFailure):
+            await client["test"].command("dbStats")
+        client.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,19 @@
+import json
+from datetime import datetime
+
+from fastapi.encoders import jsonable_encoder
+
+import fast_json
+from server import UserArtwork
+
+
+def test_fast_path_matches_the_model_path():
+    # A legacy artwork: no format field, plus fields the API never returns
+    doc = {
+        "_id": "mongo-id", "id": "a1", "coloring_page_id": "p1", "image_hash": "abc",
+        "completed_at": datetime(2024, 1, 2, 3, 4, 5, 678000), "rendered_version": 3,
+    }
+    fast = json.loads(fast_json.dumps(fast_json.project(UserArtwork, [dict(doc)])))
+    models = jsonable_encoder([UserArtwork(**doc)])
+    assert fast == models
+    assert fast[0]["format"] == "image" and "rendered_version" not in fast[0]
@@ -0,0 +1,126 @@
+import asyncio
+import signal
+import time
+
+import httpx
+import mongomock_motor
+
+import server
+from lifecycle import install_drain_signal_handlers
+
+
+def test_readiness_reports_draining_while_requests_are_in_flight():
+    tracker = server.request_tracker
+
+    async def scenario():
+        server.db = mongomock_motor.AsyncMongoMockClient()["lifecycle_test"]
+        handed_on = []
+        previous = signal.signal(signal.SIGTERM, lambda signum, frame: handed_on.append(signum))
+        try:
+            install_drain_signal_handlers(tracker, delay=0.3)
+            release = asyncio.Event()
+
+            async def slow_body():
+                await release.wait()
+                yield b"{}"
+
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                slow = asyncio.create_task(client.post(
+                    "/api/artworks", content=slow_body(), headers={"Content-Type": "application/json"},
+                ))
+                while tracker.in_flight == 0:
+                    await asyncio.sleep(0.01)
+                assert (await client.get("/api/health/ready")).status_code == 200
+
+                signal.raise_signal(signal.SIGTERM)
+                await asyncio.sleep(0.05)
+                response = await client.get("/api/health/ready")
+                assert response.status_code == 503
+                assert response.json() == {"status": "draining"}
+                assert tracker.in_flight == 1
+                # The server keeps listening until the readiness delay is over
+                assert handed_on == []
+
+                await asyncio.sleep(0.4)
+                assert handed_on == [signal.SIGTERM]
+                release.set()
+                assert (await slow).status_code == 422
+        finally:
+            signal.signal(signal.SIGTERM, previous)
+            tracker.draining = False
+            tracker.stopping.clear()
+
+    asyncio.run(scenario())
+
+
+def test_second_signal_is_handed_on_immediately():
+    tracker = server.request_tracker
+
+    async def scenario():
+        handed_on = []
+        previous = signal.signal(signal.SIGINT, lambda signum, frame: handed_on.append(signum))
+        try:
+            install_drain_signal_handlers(tracker, delay=60)
+            signal.raise_signal(signal.SIGINT)
+            await asyncio.sleep(0.05)
+            assert tracker.draining and handed_on == []
+            signal.raise_signal(signal.SIGINT)
+            await asyncio.sleep(0.05)
+            assert handed_on == [signal.SIGINT]
+        finally:
+            signal.signal(signal.SIGINT, previous)
+            tracker.draining = False
+            tracker.stopping.clear()
+
+    asyncio.run(scenario())
+
+
+def test_loop_signal_handlers_are_delayed_too():
+    # uvicorn before 0.29 installs its exit handler with loop.add_signal_handler
+    tracker = server.request_tracker
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        handed_on = []
+        loop.add_signal_handler(signal.SIGTERM, handed_on.append, signal.SIGTERM)
+        try:
+            install_drain_signal_handlers(tracker, delay=0.3)
+            signal.raise_signal(signal.SIGTERM)
+            await asyncio.sleep(0.05)
+            assert tracker.draining and handed_on == []
+            await asyncio.sleep(0.4)
+            assert handed_on == [signal.SIGTERM]
+        finally:
+            loop.remove_signal_handler(signal.SIGTERM)
+            tracker.draining = False
+            tracker.stopping.clear()
+
+    asyncio.run(scenario())
+
+
+def test_startup_does_not_wait_on_an_unreachable_mongo(monkeypatch):
+    monkeypatch.setattr(server, "mongo_url", "mongodb://127.0.0.1:1/")
+    monkeypatch.setattr(server, "STARTUP_PING_TIMEOUT", 0.2)
+    monkeypatch.setattr(server, "STARTUP_RETRY_INTERVAL", 60)
+
+    async def scenario():
+        started = time.monotonic()
+        await server.connect_db()
+        await server.create_db_indexes()
+        await server.build_search_index()
+        await server.finish_startup_in_background()
+        try:
+            assert time.monotonic() - started < 2
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                response = await client.get("/api/health/ready")
+            assert response.status_code == 503
+            assert response.json() == {"status": "starting"}
+        finally:
+            server.deferred_startup.cancel()
+            server.deferred_startup = None
+            await server.search_index.stop()
+            server.client.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,95 @@
+import asyncio
+import math
+import re
+
+import httpx
+import mongomock_motor
+
+import server
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})? (\S+)$')
+LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"(?:,|$)')
+SVG = "<svg xmlns='http://www.w3.org/2000/svg' viewBox='0 0 10 10'><circle cx='5' cy='5' r='4'/></svg>"
+
+
+def parse(text: str) -> dict:
+    """Check the Prometheus text format; return {(name, labels): value}."""
+    assert text.endswith("\n")
+    types, samples = {}, {}
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            continue
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ")
+            assert name not in types, f"{name} declared twice"
+            assert kind in ("counter", "gauge", "histogram")
+            types[name] = kind
+            continue
+        match = SAMPLE.match(line)
+        assert match, f"malformed sample: {line!r}"
+        name, labels, value = match.groups()
+        family = re.sub(r"_(bucket|sum|count)$", "", name) if name not in types else name
+        assert family in types, f"{name} has no TYPE line"
+        pairs = LABEL.findall(labels or "")
+        assert ",".join(f'{k}="{v}"' for k, v in pairs) == (labels or ""), f"malformed labels: {line!r}"
+        key = (name, tuple(sorted(pairs)))
+        assert key not in samples, f"duplicate sample: {line!r}"
+        samples[key] = float(value)
+        assert not math.isnan(samples[key])
+
+    # Histogram buckets are cumulative and end in +Inf == _count
+    for (name, labels), count in samples.items():
+        if not name.endswith("_count") or types.get(name[:-6]) != "histogram":
+            continue
+        family = name[:-6]
+        buckets = sorted(
+            (float(dict(bucket_labels)["le"]), value)
+            for (bucket_name, bucket_labels), value in samples.items()
+            if bucket_name == f"{family}_bucket"
+            and tuple(pair for pair in bucket_labels if pair[0] != "le") == labels
+        )
+        assert buckets[-1] == (math.inf, count)
+        assert [value for _, value in buckets] == sorted(value for _, value in buckets)
+    return samples
+
+
+def route_sample(samples: dict, name: str, route: str, **labels) -> float:
+    key = (name, tuple(sorted({"method": "GET", "route": route, **labels}.items())))
+    return samples.get(key, 0.0)
+
+
+def test_metrics_are_well_formed_and_follow_requests():
+    async def scenario():
+        server.db = mongomock_motor.AsyncMongoMockClient()["metrics_test"]
+        server.catalog_cache.invalidate()
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await client.post("/api/coloring-pages", json={
+                "name": "Kedi", "category": "animals", "difficulty": "easy", "svg_content": SVG,
+            })
+            before = parse((await client.get("/api/metrics")).text)
+            for _ in range(2):
+                assert (await client.get("/api/coloring-pages")).status_code == 200
+            assert (await client.get("/api/coloring-pages/missing")).status_code == 404
+            response = await client.get("/api/metrics")
+            assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+            return before, parse(response.text)
+
+    before, after = asyncio.run(scenario())
+
+    def delta(name, route, **labels):
+        return route_sample(after, name, route, **labels) - route_sample(before, name, route, **labels)
+
+    pages = "/api/coloring-pages"
+    assert delta("http_responses_total", pages, status="200") == 2
+    assert delta("http_responses_total", "/api/coloring-pages/{page_id}", status="404") == 1
+    assert delta("http_request_duration_seconds_count", pages) == 2
+    assert delta("http_request_duration_seconds_sum", pages) > 0
+    assert delta("http_response_size_bytes_sum", pages) > 0
+    # The second request is a cache hit, so only the first one serializes
+    assert after[("catalog_cache_hits_total", ())] - before[("catalog_cache_hits_total", ())] == 1
+    encoded = [
+        after[key] - before.get(key, 0.0) for key in after
+        if key[0] == "response_serialization_seconds_count" and ("stage", "encode") in key[1]
+    ]
+    assert sum(encoded) >= 1
@@ -0,0 +1,34 @@
+import asyncio
+import os
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import PyMongoError
+
+import server
+from query_plan_check import check_query_plans
+
+
+async def reachable_client():
+    client = AsyncIOMotorClient(server.mongo_url, serverSelectionTimeoutMS=1000)
+    try:
+        await client.admin.command("ping")
+    except PyMongoError:
+        client.close()
+        return None
+    return client
+
+
+def test_every_route_query_is_index_backed():
+    async def scenario():
+        client = await reachable_client()
+        if client is None:
+            pytest.skip(f"no mongod at {server.mongo_url}")
+        name = f"query_plan_test_{os.getpid()}"
+        try:
+            return await check_query_plans(client[name])
+        finally:
+            await client.drop_database(name)
+            client.close()
+
+    assert asyncio.run(scenario()) == []
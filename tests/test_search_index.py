@@ -0,0 +1,31 @@
+import asyncio
+
+from search_index import SearchIndex
+
+
+def test_changes_during_a_rebuild_survive_the_swap():
+    index = SearchIndex()
+    index.add("page", {"id": "p1", "name": "Sevimli Kedi"})
+    index.add("page", {"id": "p2", "name": "Hızlı Araba"})
+
+    async def scenario():
+        loading = asyncio.Event()
+        release = asyncio.Event()
+
+        async def load():
+            # The snapshot was read before the changes below
+            loading.set()
+            await release.wait()
+            return [("page", {"id": "p1", "name": "Sevimli Kedi"}), ("page", {"id": "p2", "name": "Hızlı Araba"})]
+
+        rebuild = asyncio.create_task(index.rebuild(load))
+        await loading.wait()
+        index.add("sticker", {"id": "s1", "name": "Kedi Yüzü"})
+        index.remove("page", "p2")
+        release.set()
+        await rebuild
+
+    asyncio.run(scenario())
+    assert {(entry.kind, entry.id) for entry in index.search("kedi")} == {("page", "p1"), ("sticker", "s1")}
+    assert index.search("araba") == []
+    assert index.recorders == []
@@ -0,0 +1,36 @@
+import xml.etree.ElementTree as ET
+
+from svg_transform import SVG_NS, render_variant
+
+
+def rendered(svg_content, width=600, height=600):
+    return ET.fromstring(render_variant(svg_content, width, height))
+
+
+def test_baked_text_scales_font_size():
+    root = rendered(
+        "<svg xmlns='http://www.w3.org/2000/svg' viewBox='0 0 300 300'>"
+        "<text x='10' y='20' font-size='12'>Kedi</text></svg>"
+    )
+    text = root.find(f'{{{SVG_NS}}}text')
+    assert (text.get('x'), text.get('y'), text.get('font-size')) == ('20', '40', '24')
+
+
+def test_styled_elements_keep_the_wrapping_group():
+    root = rendered(
+        "<svg xmlns='http://www.w3.org/2000/svg' viewBox='0 0 300 300'>"
+        "<rect x='10' y='10' width='50' height='50' style='fill:none;stroke:#000;stroke-width:3'/></svg>"
+    )
+    group = root.find(f'{{{SVG_NS}}}g')
+    assert group is not None and group.get('transform') == 'translate(0 0) scale(2)'
+    # The rect is untouched, so its stroke scales along with it
+    rect = group.find(f'{{{SVG_NS}}}rect')
+    assert (rect.get('x'), rect.get('width')) == ('10', '50')
+
+
+def test_inherited_stroke_width_keeps_the_wrapping_group():
+    root = rendered(
+        "<svg xmlns='http://www.w3.org/2000/svg' viewBox='0 0 300 300' stroke-width='3'>"
+        "<circle cx='150' cy='150' r='60'/></svg>"
+    )
+    assert root.find(f'{{{SVG_NS}}}g') is not None
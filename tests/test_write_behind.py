@@ -0,0 +1,85 @@
+import asyncio
+
+import mongomock_motor
+from pymongo import ASCENDING
+from pymongo.errors import AutoReconnect
+
+import write_behind
+from write_behind import WriteBehindQueue
+
+
+class FlakyCollection:
+    """Fails ``failures`` insert_many calls, the first after writing ``partial`` documents."""
+
+    def __init__(self, collection, partial: int, failures: int = 1):
+        self.collection = collection
+        self.partial = partial
+        self.failures = failures
+
+    async def insert_many(self, docs, ordered=True):
+        if self.failures:
+            self.failures -= 1
+            if self.partial:
+                await self.collection.insert_many(docs[:self.partial])
+                self.partial = 0
+            raise AutoReconnect("connection closed")
+        return await self.collection.insert_many(docs, ordered=ordered)
+
+    def find(self, *args, **kwargs):
+        return self.collection.find(*args, **kwargs)
+
+
+real_sleep = asyncio.sleep
+
+
+def no_pause(seconds):
+    return real_sleep(0)
+
+
+def run_batch(collection, docs):
+    flushed, failed = [], []
+
+    async def on_failed(rejected):
+        failed.extend(rejected)
+
+    async def scenario():
+        queue = WriteBehindQueue(max_delay=0.01)
+        queue.start(collection, on_flushed=lambda docs, *_: flushed.extend(docs), on_failed=on_failed)
+        for doc in docs:
+            await queue.put(doc)
+        await queue.stop()
+        return queue
+
+    return asyncio.run(scenario()), flushed, failed
+
+
+def make_collection():
+    collection = mongomock_motor.AsyncMongoMockClient()["write_behind_test"].user_artworks
+    asyncio.run(collection.create_index([("id", ASCENDING)], unique=True))
+    return collection
+
+
+def test_retry_counts_documents_the_failed_attempt_wrote(monkeypatch):
+    monkeypatch.setattr(write_behind.asyncio, "sleep", no_pause)
+    collection = make_collection()
+    docs = [{"id": f"a{n}"} for n in range(4)]
+
+    queue, flushed, failed = run_batch(FlakyCollection(collection, partial=2), docs)
+
+    assert failed == []
+    assert sorted(doc["id"] for doc in flushed) == ["a0", "a1", "a2", "a3"]
+    assert queue.stats()["flushed"] == 4 and queue.stats()["failed"] == 0
+
+
+def test_dropped_batch_only_fails_unwritten_documents(monkeypatch):
+    monkeypatch.setattr(write_behind.asyncio, "sleep", no_pause)
+    collection = make_collection()
+    docs = [{"id": f"b{n}"} for n in range(3)]
+
+    queue, flushed, failed = run_batch(
+        FlakyCollection(collection, partial=1, failures=write_behind.MAX_FLUSH_ATTEMPTS), docs,
+    )
+
+    assert [doc["id"] for doc in flushed] == ["b0"]
+    assert sorted(doc["id"] for doc in failed) == ["b1", "b2"]
+    assert queue.stats()["failed"] == 2